@@ -0,0 +1,291 @@
+#!/apps/anaconda3/bin/python
+# instrumentation.py
+
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+# Part of every profile: bump if the record layout changes
+PROFILE_FORMAT = 1
+# A stage regresses when its throughput drops, or its peak RSS grows, by more than this fraction
+DEFAULT_TOLERANCE = 0.25
+# Stages faster than this are too noisy to compare
+MIN_COMPARE_SECONDS = 0.05
+MB = 1024 ** 2
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Process Counters -----------------------------------
+# --------------------------------------------------------------------------------
+
+def cpu_seconds():
+    """User + system CPU time of this process and of its reaped child processes (e.g. pool workers)."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def maxrss_bytes(who=resource.RUSAGE_SELF):
+    """getrusage's peak RSS in bytes (kilobytes on Linux, bytes on macOS)."""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def proc_status_bytes(field):
+    """A 'kB' field of /proc/self/status (VmRSS, VmHWM) in bytes, or None off Linux."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    """
+    Reset this process's RSS high-water mark (Linux: write 5 to /proc/self/clear_refs).
+    Returns False where that is not possible; peaks are then since process start.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def current_rss_bytes():
+    rss = proc_status_bytes('VmRSS')
+    return rss if rss is not None else maxrss_bytes()
+
+def peak_rss_bytes():
+    peak = proc_status_bytes('VmHWM')
+    return peak if peak is not None else maxrss_bytes()
+
+def host_info():
+    """What the numbers were measured on, for sizing hardware and comparing like with like."""
+    try:
+        total_memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        total_memory = None
+    return {
+        'hostname': platform.node(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'memory_gb': round(total_memory / 1024 ** 3, 1) if total_memory else None,
+    }
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Stage Profiler -------------------------------------
+# --------------------------------------------------------------------------------
+
+class StageProfiler:
+    """
+    Records one entry per pipeline stage run inside `with profiler.stage(name, unit=...)`:
+      - wall_s, cpu_s (this process plus reaped worker processes) and cpu_util = cpu_s / wall_s.
+      - peak_rss_mb: peak RSS during the stage where the high-water mark can be reset (Linux),
+        else since process start (rss_scope says which); rss_start_mb; children_peak_rss_mb.
+      - items, unit (articles, ticker-days, env steps, ...) and items_per_s.
+    Set record['items'] (and any extra fields) on the yielded record inside the block.
+    skip(name, reason) records a stage that could not run (status 'skipped'), so it still shows up.
+    save() writes the records, the host and the run's meta as JSON.
+    """
+
+    def __init__(self, meta=None, verbose=True):
+        self.meta = dict(meta or {})
+        self.verbose = verbose
+        self.records = []
+        self.started = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    @contextmanager
+    def stage(self, name, items=None, unit='items'):
+        record = {'stage': name, 'unit': unit, 'items': items, 'status': 'ok'}
+        gc.collect()
+        scope = 'stage' if reset_peak_rss() else 'process'
+        rss_start = current_rss_bytes()
+        cpu0 = cpu_seconds()
+        t0 = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record['status'] = 'failed'
+            raise
+        finally:
+            wall = time.perf_counter() - t0
+            cpu = cpu_seconds() - cpu0
+            record.update({
+                'wall_s': round(wall, 6),
+                'cpu_s': round(cpu, 6),
+                'cpu_util': round(cpu / wall, 3) if wall > 0 else None,
+                'peak_rss_mb': round(peak_rss_bytes() / MB, 1),
+                'rss_start_mb': round(rss_start / MB, 1),
+                'rss_scope': scope,
+                'children_peak_rss_mb': round(maxrss_bytes(resource.RUSAGE_CHILDREN) / MB, 1),
+            })
+            items = record.get('items')
+            record['items_per_s'] = round(items / wall, 3) if items is not None and wall > 0 else None
+            self.records.append(record)
+            if self.verbose:
+                print(f"[INFO] {format_record(record)}")
+
+    def skip(self, name, reason, unit='items'):
+        """Record a stage that could not run (e.g. a missing optional dependency)."""
+        record = {'stage': name, 'unit': unit, 'items': None, 'status': 'skipped', 'reason': str(reason)}
+        self.records.append(record)
+        if self.verbose:
+            print(f"[WARN] {format_record(record)}")
+
+    def profile(self, name, fn, *args, unit='items', count=None, **kwargs):
+        """Run fn(*args, **kwargs) as a stage; count(result), if given, is its number of items."""
+        with self.stage(name, unit=unit) as record:
+            result = fn(*args, **kwargs)
+            if count is not None:
+                record['items'] = count(result)
+        return result
+
+    def to_dict(self):
+        return {
+            'format': PROFILE_FORMAT,
+            'started': self.started,
+            'host': host_info(),
+            'meta': self.meta,
+            'stages': self.records,
+        }
+
+    def save(self, path):
+        """Write the profile as JSON (atomically: a half-written baseline is worse than none)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, '.' + os.path.basename(path) + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+        print(f"[INFO] Wrote profile of {len(self.records)} stages to {path}")
+
+def run_profiled(profile_path, name, fn, *args, unit='items', count=None, meta=None):
+    """
+    --profile for a stage script: run fn(*args) as one stage and write the profile (with the
+    command line in its meta) to profile_path, also when fn fails. Returns fn's result.
+    """
+    profiler = StageProfiler(meta=dict(meta or {}, argv=sys.argv))
+    try:
+        return profiler.profile(name, fn, *args, unit=unit, count=count)
+    finally:
+        profiler.save(profile_path)
+
+def best_of(profilers):
+    """
+    One profiler holding, per stage, the fastest of several runs of the same suite
+    (repeat runs damp scheduler and cache noise before comparing against a baseline).
+    """
+    best = StageProfiler(meta=profilers[0].meta, verbose=False)
+    best.started = profilers[0].started
+    by_stage = {}
+    for profiler in profilers:
+        for record in profiler.records:
+            current = by_stage.get(record['stage'])
+            if current is None or (record['status'] == 'ok' and (current['status'] != 'ok'
+                                                               or record['wall_s'] < current['wall_s'])):
+                by_stage[record['stage']] = record
+    best.records = [dict(record, repeats=len(profilers)) for record in by_stage.values()]
+    return best
+
+def format_record(record):
+    if record.get('status') == 'skipped':
+        return f"{record['stage']:<18} skipped: {record.get('reason')}"
+    rate = f", {record['items_per_s']:,.1f} {record['unit']}/s" if record.get('items_per_s') is not None else ""
+    items = f"{record['items']:,} {record['unit']}" if record.get('items') is not None else "-"
+    return (f"{record['stage']:<18} {record['wall_s']:>9.3f}s wall {record['cpu_s']:>9.3f}s cpu "
+            f"{record['peak_rss_mb']:>8.1f} MB peak  {items}{rate}")
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Baselines ------------------------------------------
+# --------------------------------------------------------------------------------
+
+def load_profile(path):
+    with open(path) as f:
+        profile = json.load(f)
+    if profile.get('format') != PROFILE_FORMAT:
+        print(f"[WARN] {path} has profile format {profile.get('format')}, expected {PROFILE_FORMAT}.")
+    return profile
+
+def compare_profiles(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Stage-by-stage comparison of two profiles (dicts as written by StageProfiler.save).
+    Throughput is items_per_s (1 / wall_s for stages without items); a stage regresses if its
+    throughput falls below (1 - tolerance) x the baseline's or its stage-scoped peak RSS grows
+    above (1 + tolerance) x. Stages under MIN_COMPARE_SECONDS in both runs are not judged on speed.
+    A baselined stage that was skipped in the current run gets a row with skipped=True.
+    Returns a list of dicts (stage, base/now throughput and peak, ratios, regressed, skipped).
+    """
+    base_stages = {r['stage']: r for r in baseline['stages'] if r.get('status') == 'ok'}
+    rows = []
+    for record in current['stages']:
+        base = base_stages.get(record['stage'])
+        if base is not None and record.get('status') == 'skipped':
+            rows.append({'stage': record['stage'], 'unit': record['unit'], 'base_rate': None, 'rate': None,
+                         'speed_ratio': None, 'base_peak_rss_mb': base['peak_rss_mb'], 'peak_rss_mb': None,
+                         'memory_ratio': None, 'regressed': False, 'skipped': True})
+            continue
+        if base is None or record.get('status') != 'ok':
+            continue
+
+        def throughput(r):
+            if r.get('items_per_s'):
+                return r['items_per_s']
+            return 1.0 / r['wall_s'] if r['wall_s'] > 0 else None
+        now_rate, base_rate = throughput(record), throughput(base)
+        speed = now_rate / base_rate if now_rate and base_rate else None
+        memory = (record['peak_rss_mb'] / base['peak_rss_mb']
+                  if record.get('rss_scope') == base.get('rss_scope') == 'stage' and base['peak_rss_mb'] else None)
+        timed = max(record['wall_s'], base['wall_s']) >= MIN_COMPARE_SECONDS
+        slower = timed and speed is not None and speed < 1.0 - tolerance
+        bigger = memory is not None and memory > 1.0 + tolerance
+        rows.append({'stage': record['stage'], 'unit': record['unit'],
+                     'base_rate': base_rate, 'rate': now_rate, 'speed_ratio': speed,
+                     'base_peak_rss_mb': base['peak_rss_mb'], 'peak_rss_mb': record['peak_rss_mb'],
+                     'memory_ratio': memory, 'regressed': bool(slower or bigger), 'skipped': False})
+    return rows
+
+def print_comparison(rows):
+    print("[INFO] ---------------- Against baseline ----------------")
+    for row in rows:
+        speed = f"{row['speed_ratio']:.2f}x speed" if row['speed_ratio'] is not None else "-"
+        memory = f"{row['memory_ratio']:.2f}x peak RSS" if row['memory_ratio'] is not None else "-"
+        flag = "REGRESSED" if row['regressed'] else "SKIPPED" if row.get('skipped') else "ok"
+        level = "[WARN]" if row['regressed'] or row.get('skipped') else "[INFO]"
+        print(f"{level} {row['stage']:<18} {speed:>14} {memory:>18}  {flag}")
+
+def main():
+    """
+    Print a saved profile, and (--baseline) compare it stage by stage against another one.
+    Exits with status 1 if any stage regressed beyond --tolerance.
+    """
+    parser = argparse.ArgumentParser(description="Print a stage profile and compare it against a baseline.")
+    parser.add_argument("profile", help="Profile JSON written by StageProfiler.save (e.g. by run_benchmarks.py).")
+    parser.add_argument("--baseline", default=None, help="Baseline profile JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed fractional throughput drop / peak RSS growth per stage.")
+    args = parser.parse_args()
+
+    profile = load_profile(args.profile)
+    host = profile['host']
+    print(f"[INFO] {args.profile}: {host['hostname']} ({host['cpu_count']} CPUs, {host['memory_gb']} GB), "
+          f"Python {host['python']}, started {profile['started']}")
+    for record in profile['stages']:
+        print(f"[INFO] {format_record(record)}")
+
+    if args.baseline:
+        rows = compare_profiles(profile, load_profile(args.baseline), args.tolerance)
+        print_comparison(rows)
+        if any(row['regressed'] for row in rows):
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/apps/anaconda3/bin/python
+# run_benchmarks.py
+
+import os
+import sys
+import shutil
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+# The stage scripts import their siblings directly, so their folders go on the path before importing them
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGE_DIRS = ('data_preprocessing', 'sentiment_analysis', 'trading_strategy', 'models')
+for _sub in STAGE_DIRS:
+    if os.path.join(SRC_DIR, _sub) not in sys.path:
+        sys.path.insert(0, os.path.join(SRC_DIR, _sub))
+
+from instrumentation import (StageProfiler, best_of, load_profile, compare_profiles, print_comparison,
+                             format_record, DEFAULT_TOLERANCE)
+from synthetic_data import (write_tr_months, synthetic_price_panel, synthetic_sentiment_frames,
+                            write_sentiment_frames, write_news_frames, universe_tickers)
+from tr_data_pipeline import process_pipeline
+from combine_parquets import combine_parquet_files
+from llm_client import AsyncLLMClient, MockBackend, synthetic_news, run_stage, TICKER_INDUSTRY_MAP
+from technicals import calculate_technicals
+from param_sweep import load_sentiment
+from portfolio_data import prepare_data
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Suite Configuration --------------------------------
+# --------------------------------------------------------------------------------
+
+STAGES = ('tr_pipeline', 'combine_parquets', 'summarize', 'sentiment', 'technicals',
+          'load_sentiment', 'prepare_data', 'env_step')
+
+# Stages whose input is another stage's output
+DEPENDS = {
+    'combine_parquets': ['tr_pipeline'],
+    'sentiment': ['summarize'],
+    'prepare_data': ['technicals', 'load_sentiment'],
+    'env_step': ['prepare_data'],
+}
+
+# Sizes of the synthetic inputs; 'large' is about one year of the TR archive and the full
+# 2018-2024 price / sentiment panel for the 45-ticker universe
+SIZES = {
+    'small': dict(n_months=1, articles_per_month=1000, n_tickers=10, n_days=500,
+                  news_tickers=4, news_days=30, llm_latency=0.005, env_steps=2000),
+    'medium': dict(n_months=2, articles_per_month=5000, n_tickers=45, n_days=1760,
+                   news_tickers=10, news_days=120, llm_latency=0.02, env_steps=20000),
+    'large': dict(n_months=12, articles_per_month=20000, n_tickers=45, n_days=1760,
+                  news_tickers=45, news_days=250, llm_latency=0.05, env_steps=100000),
+}
+
+def with_dependencies(stages):
+    """The requested stages plus everything they read from, in suite order."""
+    needed = set()
+    def add(stage):
+        if stage not in needed:
+            needed.add(stage)
+            for dep in DEPENDS.get(stage, []):
+                add(dep)
+    for stage in stages:
+        add(stage)
+    return [s for s in STAGES if s in needed]
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Stages ---------------------------------------------
+# --------------------------------------------------------------------------------
+
+def bench_tr_pipeline(profiler, cfg, workdir, state):
+    """process_pipeline (load, filter, mask, dedup, pivot, write) over the monthly JSON files."""
+    paths = write_tr_months(os.path.join(workdir, 'tr_json'), cfg['n_months'], cfg['articles_per_month'],
+                            seed=cfg['seed'])
+    parquet_dir = os.path.join(workdir, 'tr_parquet')
+    os.makedirs(parquet_dir, exist_ok=True)
+    with profiler.stage('tr_pipeline', unit='articles') as record:
+        pivots = [process_pipeline(path, do_mask=True, output_dir=parquet_dir) for path in paths]
+        record['items'] = cfg['n_months'] * cfg['articles_per_month']
+        record['files'] = len(paths)
+    state['parquet_dir'] = parquet_dir
+    state['news_cells'] = int(sum(df.notna().to_numpy().sum() for df in pivots if not df.empty))
+
+def bench_combine_parquets(profiler, cfg, workdir, state):
+    """combine_parquet_files over the pipeline's per-file outputs."""
+    output_file = os.path.join(workdir, 'combined_news.parquet')
+    with profiler.stage('combine_parquets', items=state['news_cells'], unit='ticker-days'):
+        combine_parquet_files(state['parquet_dir'], output_file)
+
+def run_llm_stage(stage, cfg, input_dir, output_dir, tickers):
+    """One run_stage through the async client with an offline MockBackend; returns the backend's calls."""
+    backend = MockBackend(latency=cfg['llm_latency'], per_item=cfg['llm_latency'] / 25)
+    async def run():
+        async with AsyncLLMClient(backend, seed=cfg['seed']) as client:
+            await run_stage(client, stage, tickers, input_dir, output_dir, overwrite=True)
+    asyncio.run(run())
+    return backend.calls
+
+def bench_summarize(profiler, cfg, workdir, state):
+    """Daily digests for every (ticker, day) of synthetic news (mock model)."""
+    n_tickers = min(cfg['news_tickers'], len(TICKER_INDUSTRY_MAP))
+    news = synthetic_news(n_tickers, cfg['news_days'], seed=cfg['seed'])
+    news_dir, summary_dir = os.path.join(workdir, 'news'), os.path.join(workdir, 'summaries')
+    n_days = write_news_frames(news, news_dir)
+    with profiler.stage('summarize', items=n_days, unit='ticker-days') as record:
+        record['llm_calls'] = run_llm_stage('summarize', cfg, news_dir, summary_dir, list(news))
+    state.update(summary_dir=summary_dir, news_tickers=list(news), news_ticker_days=n_days)
+
+def bench_sentiment(profiler, cfg, workdir, state):
+    """Sentiment label and confidence for every digest (mock model)."""
+    output_dir = os.path.join(workdir, 'llm_sentiment')
+    with profiler.stage('sentiment', items=state['news_ticker_days'], unit='ticker-days') as record:
+        record['llm_calls'] = run_llm_stage('sentiment', cfg, state['summary_dir'], output_dir,
+                                            state['news_tickers'])
+
+def bench_technicals(profiler, cfg, workdir, state):
+    """calculate_technicals over the long-format price panel."""
+    prices = synthetic_price_panel(cfg['n_tickers'], cfg['n_days'], seed=cfg['seed'])
+    with profiler.stage('technicals', items=len(prices), unit='ticker-days'):
+        tech_df = calculate_technicals(prices)
+    state['tech_df'] = tech_df
+
+def bench_load_sentiment(profiler, cfg, workdir, state):
+    """Read and stack the per-ticker sentiment frames (param_sweep.load_sentiment)."""
+    dates = np.sort(state['tech_df']['date'].unique()) if 'tech_df' in state else \
+        pd.bdate_range('2018-01-02', periods=cfg['n_days'])
+    frames = synthetic_sentiment_frames(universe_tickers(cfg['n_tickers']), dates, seed=cfg['seed'])
+    sentiment_dir = os.path.join(workdir, 'sentiment')
+    write_sentiment_frames(frames, sentiment_dir)
+    with profiler.stage('load_sentiment', unit='ticker-days') as record:
+        sentiment_df = load_sentiment(sentiment_dir)
+        record['items'] = len(sentiment_df)
+    state['sentiment_df'] = sentiment_df
+
+def bench_prepare_data(profiler, cfg, workdir, state):
+    """prepare_data's [T, tickers, features] tensors from technicals + returns + sentiment."""
+    df = state['tech_df'].copy()
+    df['returns'] = df.groupby('ticker')['close'].pct_change().fillna(0.0)
+    df = df.merge(state['sentiment_df'][['date', 'ticker', 'sentiment_signal']], on=['date', 'ticker'], how='left')
+    feature_cols = [c for c in df.columns if c not in ('date', 'ticker', 'close', 'returns')]
+    df[feature_cols] = df[feature_cols].fillna(0.0)
+    tickers = universe_tickers(cfg['n_tickers'])
+    start, end = df['date'].min(), df['date'].max()
+    with profiler.stage('prepare_data', unit='ticker-days') as record:
+        dates, features, returns = prepare_data(df, start, end, tickers, feature_cols)
+        record['items'] = int(features.shape[0] * features.shape[1])
+    state['arrays'] = (dates, features, returns)
+
+def bench_env_step(profiler, cfg, workdir, state):
+    """PortfolioEnv.step (history on, as in run_backtest) with random actions over the prepared tensors."""
+    try:
+        from portfolio_env import PortfolioEnv
+    except ImportError as e:
+        profiler.skip('env_step', e, unit='env steps')
+        return
+    _, features, returns = state['arrays']
+    rf = np.full(len(features), 0.02 / 252)
+    env = PortfolioEnv(np.clip(features, -100, 100).astype(np.float32), returns.astype(np.float32), rf,
+                       transaction_cost=0.001)
+    rng = np.random.default_rng(cfg['seed'])
+    actions = rng.uniform(0.0, 10.0, size=(1024, env.n_stocks + 1)).astype(np.float32)
+    with profiler.stage('env_step', items=cfg['env_steps'], unit='env steps'):
+        env.reset()
+        for i in range(cfg['env_steps']):
+            _, _, done, _, _ = env.step(actions[i % len(actions)])
+            if done:
+                env.reset()
+
+BENCHES = {
+    'tr_pipeline': bench_tr_pipeline,
+    'combine_parquets': bench_combine_parquets,
+    'summarize': bench_summarize,
+    'sentiment': bench_sentiment,
+    'technicals': bench_technicals,
+    'load_sentiment': bench_load_sentiment,
+    'prepare_data': bench_prepare_data,
+    'env_step': bench_env_step,
+}
+
+def run_suite(stages, cfg, workdir):
+    """Run the stages (with their dependencies) on fresh synthetic inputs; returns the StageProfiler."""
+    stages = with_dependencies(stages)
+    profiler = StageProfiler(meta={'config': cfg, 'stages': stages})
+    state = {}
+    for stage in stages:
+        BENCHES[stage](profiler, cfg, workdir, state)
+    return profiler
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Main -----------------------------------------------
+# --------------------------------------------------------------------------------
+
+def main():
+    """
+    Generate synthetic inputs of the chosen size, run each pipeline stage offline under the
+    StageProfiler and write the per-stage profile as JSON. If a baseline for the same size exists
+    (or --baseline is given), compare against it and exit with status 1 on a regression;
+    --update_baseline stores this run as the new baseline. A stage that could not run (e.g. env_step
+    without gymnasium) is reported as skipped, is never stored in a baseline, and also exits with status 1.
+    """
+    parser = argparse.ArgumentParser(description="Reproducible offline benchmark suite for the pipeline stages.")
+    parser.add_argument("--size", choices=sorted(SIZES), default='small', help="Preset input sizes.")
+    parser.add_argument("--stages", nargs="*", choices=STAGES, default=list(STAGES),
+                        help="Stages to run (their input stages run too).")
+    for key, value in SIZES['small'].items():
+        parser.add_argument(f"--{key}", type=type(value), default=None, help=f"Override the preset {key}.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic inputs.")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Run the suite this many times and keep each stage's fastest run.")
+    parser.add_argument("--output", default=None, help="Write this run's profile JSON here.")
+    parser.add_argument("--baseline", default=None,
+                        help="Baseline profile to compare against (default: baselines/<size>.json if present).")
+    parser.add_argument("--update_baseline", action="store_true", help="Save this run as the baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed fractional throughput drop / peak RSS growth per stage.")
+    parser.add_argument("--workdir", default=None,
+                        help="Directory for the synthetic inputs and outputs (default: a temporary one, removed).")
+    args = parser.parse_args()
+
+    cfg = dict(SIZES[args.size], seed=args.seed)
+    for key in SIZES['small']:
+        if getattr(args, key) is not None:
+            cfg[key] = getattr(args, key)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='gr5293_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    print(f"[INFO] Size '{args.size}': {cfg}")
+
+    try:
+        runs = [run_suite(args.stages, cfg, workdir) for _ in range(max(args.repeat, 1))]
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    profiler = best_of(runs) if len(runs) > 1 else runs[0]
+    profiler.meta.update(size=args.size, repeat=len(runs))
+    if len(runs) > 1:
+        print(f"[INFO] ---------------- Best of {len(runs)} ----------------")
+        for record in profiler.records:
+            print(f"[INFO] {format_record(record)}")
+    if args.output:
+        profiler.save(args.output)
+
+    skipped = [record['stage'] for record in profiler.records if record['status'] == 'skipped']
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.size}.json")
+    regressed = False
+    if os.path.isfile(baseline_path) and not (args.update_baseline and args.baseline is None):
+        baseline = load_profile(baseline_path)
+        if baseline['meta'].get('config') != cfg:
+            print(f"[WARN] {baseline_path} was run with {baseline['meta'].get('config')}; rates may not compare.")
+        if baseline['host'].get('hostname') != profiler.to_dict()['host']['hostname']:
+            print(f"[WARN] {baseline_path} was recorded on {baseline['host'].get('hostname')}.")
+        rows = compare_profiles(profiler.to_dict(), baseline, args.tolerance)
+        print_comparison(rows)
+        regressed = any(row['regressed'] for row in rows)
+    elif not args.update_baseline:
+        print(f"[INFO] No baseline at {baseline_path}; run with --update_baseline to store one.")
+    if args.update_baseline and skipped:
+        print(f"[ERROR] Not updating {baseline_path}: skipped stages {skipped}.")
+    elif args.update_baseline:
+        profiler.save(baseline_path)
+    if skipped:
+        print(f"[ERROR] Requested stages were skipped: {skipped} (install their dependencies or leave them "
+              f"out of --stages).")
+        raise SystemExit(1)
+    if regressed:
+        print("[ERROR] At least one stage regressed against the baseline.")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
+
+#### python run_benchmarks.py --size small --repeat 3 --output profile.json
+#### python run_benchmarks.py --size medium --stages tr_pipeline combine_parquets --update_baseline
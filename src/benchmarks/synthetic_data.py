@@ -0,0 +1,177 @@
+#!/apps/anaconda3/bin/python
+# synthetic_data.py
+
+import os
+import sys
+import json
+import random
+import argparse
+import numpy as np
+import pandas as pd
+
+# Run as a script, put the stage folders on the path for the imports below; importers
+# (run_benchmarks.py) set up the path themselves, so importing this module has no side effect
+if __name__ == "__main__":
+    SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for _sub in ('data_preprocessing', 'sentiment_analysis', 'trading_strategy', 'models'):
+        sys.path.insert(0, os.path.join(SRC_DIR, _sub))
+
+from tr_data_pipeline import TICKER_UNIVERSE
+from bench_masking import synthetic_corpus
+from technicals import synthetic_prices
+from llm_client import synthetic_news, TICKER_INDUSTRY_MAP
+
+# Subject codes that are not universe tickers (topics, regions, other RICs)
+OTHER_SUBJECTS = ['N2:US', 'N2:LEN', 'M:1QD', 'N2:RESF', 'N2:TECH', 'R:SIEGn.DE', 'R:7203.T', 'R:BRKa.N']
+RIC_SUFFIXES = ['.O', '.OQ', '.N', '']
+SENTIMENT_LABELS = ['Positive', 'Negative', 'Neutral']
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. TR News JSON ---------------------------------------
+# --------------------------------------------------------------------------------
+
+def synthetic_tr_items(n_articles, year, month, seed=0):
+    """
+    Thomson Reuters-format items for one month, shaped like the archives tr_data_pipeline reads:
+    guid, data (language, headline, body, subjects) and UTC timestamps. Bodies mix filler,
+    date and company/product words (bench_masking's corpus). About 8% are filtered out
+    (non-English, empty body, no universe ticker) and 5% re-send an earlier story.
+    """
+    rng = random.Random(seed)
+    corpus = synthetic_corpus(n_articles, seed=seed)
+    start = pd.Timestamp(year=year, month=month, day=1, tz='UTC')
+    seconds = int(((start + pd.offsets.MonthBegin(1)) - start).total_seconds())
+    items = []
+    for i, (body, tickers) in enumerate(corpus):
+        if items and rng.random() < 0.05:
+            items.append(json.loads(json.dumps(rng.choice(items))))
+            continue
+        subjects = [f"R:{t}{rng.choice(RIC_SUFFIXES)}" for t in tickers] + rng.sample(OTHER_SUBJECTS, 3)
+        roll = rng.random()
+        if roll < 0.03:
+            subjects = rng.sample(OTHER_SUBJECTS, 3)
+        stamp = start + pd.Timedelta(seconds=rng.randrange(seconds))
+        items.append({
+            'guid': f"tag:reuters.com,{year}:newsml_SYN{year}{month:02d}{i:07d}",
+            'data': {
+                'id': f"SYN{year}{month:02d}{i:07d}",
+                'language': 'de' if 0.03 <= roll < 0.05 else 'en',
+                'headline': ' '.join(body.split()[:12]),
+                'body': '' if 0.05 <= roll < 0.08 else body,
+                'subjects': subjects,
+            },
+            'timestamps': [{'name': 'firstCreated', 'timestamp': stamp.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'}],
+        })
+    return items
+
+def write_tr_months(output_dir, n_months, articles_per_month, start_year=2018, seed=0):
+    """
+    One News.RTRS.YYYYMM.0214.txt file per month under output_dir/YYYY/ (the layout
+    collect_input_files walks). Returns the list of file paths.
+    """
+    paths = []
+    for m in range(n_months):
+        year, month = start_year + m // 12, m % 12 + 1
+        items = synthetic_tr_items(articles_per_month, year, month, seed=seed + m)
+        os.makedirs(os.path.join(output_dir, str(year)), exist_ok=True)
+        path = os.path.join(output_dir, str(year), f"News.RTRS.{year}{month:02d}.0214.txt")
+        with open(path, 'w') as f:
+            json.dump({'Items': items}, f)
+        paths.append(path)
+    return paths
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Prices & Sentiment ---------------------------------
+# --------------------------------------------------------------------------------
+
+def universe_tickers(n_tickers):
+    """The first n tickers of the universe, then T045, T046, ... beyond its 45."""
+    return [TICKER_UNIVERSE[i] if i < len(TICKER_UNIVERSE) else f"T{i:03d}" for i in range(n_tickers)]
+
+def synthetic_price_panel(n_tickers, n_days, seed=0):
+    """
+    Long-format (ticker, date, close) daily prices for universe tickers: technicals.py's random walks
+    (late listings, missing days, NaN closes, flat stretches), sorted by ticker and date.
+    """
+    prices = synthetic_prices(n_days, n_tickers, seed=seed)
+    names = dict(zip([f"T{i:03d}" for i in range(n_tickers)], universe_tickers(n_tickers)))
+    prices['ticker'] = prices['ticker'].map(names)
+    return prices.sort_values(['ticker', 'date'], kind='stable').reset_index(drop=True)
+
+def synthetic_sentiment_frames(tickers, dates, coverage=0.7, seed=0):
+    """
+    {ticker: DataFrame(date, sentiment, confidence, summary)} like the sentiment stage's
+    {ticker}_daily_sentiments.parquet, with a row on `coverage` of the dates.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.DatetimeIndex(dates)
+    frames = {}
+    for ticker in tickers:
+        days = dates[rng.random(len(dates)) < coverage]
+        labels = rng.choice(SENTIMENT_LABELS, len(days), p=[0.45, 0.25, 0.3])
+        frames[ticker] = pd.DataFrame({
+            'date': days.strftime('%Y-%m-%d'),
+            'sentiment': labels,
+            'confidence': np.round(rng.uniform(0.34, 1.0, len(days)), 4),
+            'summary': [f"{ticker} daily digest {d}" for d in days.strftime('%Y%m%d')],
+        })
+    return frames
+
+def write_sentiment_frames(frames, output_dir):
+    """
+    Write synthetic_sentiment_frames as {ticker}_daily_sentiments.parquet files, the layout
+    param_sweep.load_sentiment reads.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for ticker, df in frames.items():
+        df.to_parquet(os.path.join(output_dir, f"{ticker}_daily_sentiments.parquet"), index=False)
+
+def write_news_frames(news, output_dir, start_date='2018-01-02'):
+    """
+    llm_client.synthetic_news as the per-ticker {ticker}.parquet inputs of the summarization stage
+    (a column of article lists indexed by trading_day, as split from the combined pivot).
+    Returns the number of ticker-days.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    n_days = 0
+    for ticker, days in news.items():
+        trading_day = pd.bdate_range(start_date, periods=len(days)).strftime('%Y-%m-%d')
+        df = pd.DataFrame({ticker: days}, index=pd.Index(trading_day, name='trading_day'))
+        df.to_parquet(os.path.join(output_dir, f"{ticker}.parquet"))
+        n_days += len(days)
+    return n_days
+
+def main():
+    """
+    Write a synthetic dataset for offline runs of the pipeline: TR-format monthly JSON,
+    a long-format price panel, per-ticker sentiment frames and per-ticker news frames.
+    """
+    parser = argparse.ArgumentParser(description="Generate synthetic TR news, prices and sentiment frames.")
+    parser.add_argument("--output_dir", required=True, help="Directory to write the dataset to.")
+    parser.add_argument("--n_months", type=int, default=2, help="Monthly TR JSON files.")
+    parser.add_argument("--articles_per_month", type=int, default=2000, help="Articles per monthly file.")
+    parser.add_argument("--n_tickers", type=int, default=45, help="Tickers in the price and sentiment frames.")
+    parser.add_argument("--n_days", type=int, default=1760, help="Trading days of prices and sentiment.")
+    parser.add_argument("--news_days", type=int, default=60, help="Days of per-ticker news for the LLM stages.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    paths = write_tr_months(os.path.join(args.output_dir, 'tr_json'), args.n_months,
+                            args.articles_per_month, seed=args.seed)
+    print(f"[INFO] Wrote {len(paths)} TR JSON files ({args.articles_per_month} articles each).")
+
+    prices = synthetic_price_panel(args.n_tickers, args.n_days, seed=args.seed)
+    prices.to_parquet(os.path.join(args.output_dir, 'prices.parquet'), index=False)
+    print(f"[INFO] Wrote {len(prices)} price rows for {args.n_tickers} tickers.")
+
+    tickers = universe_tickers(args.n_tickers)
+    frames = synthetic_sentiment_frames(tickers, np.sort(prices['date'].unique()), seed=args.seed)
+    write_sentiment_frames(frames, os.path.join(args.output_dir, 'sentiment'))
+    print(f"[INFO] Wrote sentiment frames ({sum(len(df) for df in frames.values())} ticker-days).")
+
+    news = synthetic_news(min(args.n_tickers, len(TICKER_INDUSTRY_MAP)), args.news_days, seed=args.seed)
+    n_days = write_news_frames(news, os.path.join(args.output_dir, 'news'))
+    print(f"[INFO] Wrote news frames ({n_days} ticker-days).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/apps/anaconda3/bin/python
+# bench_masking.py
+
+import sys
+import time
+import random
+import argparse
+from tr_data_pipeline import (
+    TICKER_UNIVERSE,
+    COMPANY_MASK_PATTERNS,
+    PRODUCT_MASK_PATTERNS,
+    iter_json_items,
+    article_universe_tickers,
+    mask_text,
+    mask_text_reference
+)
+
+# Words that exercise every date rule plus the company/product vocabulary
+FILLER_WORDS = (
+    "the shares rose fell said on in at of and to a by after before analysts quarter results "
+    "guidance revenue profit investors market company sales demand data center cloud"
+).split()
+DATE_WORDS = (
+    "12/31/2020 2020-12-31 5/5/21 13:40 1:30:45 Jan January Feb March Sept December May "
+    "5 12th 3rd 21st first twenty-first fifth 1999 2019 2024"
+).split()
+
+def entity_words():
+    """
+    Collect literal-looking words from the company and product patterns.
+    """
+    words = set()
+    for pattern in list(COMPANY_MASK_PATTERNS.values()) + \
+            [pat for prods in PRODUCT_MASK_PATTERNS.values() for pat in prods]:
+        for piece in pattern.replace('\\s+', ' ').replace('\\s*', ' ').split():
+            word = ''.join(ch for ch in piece if ch.isalnum() or ch in "&+'-.")
+            if word:
+                words.add(word.strip('.'))
+    return sorted(w for w in words if w)
+
+def synthetic_corpus(n_docs, seed=0):
+    """
+    Generate (text, tickers) pairs mixing filler, date and entity words.
+    """
+    rng = random.Random(seed)
+    vocab = entity_words()
+    separators = [" ", " ", " ", ", ", ". ", "-", "/", ":", "+", "\n", ""]
+    docs = []
+    for _ in range(n_docs):
+        words = []
+        for _ in range(rng.randint(20, 400)):
+            pool = rng.choices([FILLER_WORDS, DATE_WORDS, vocab], weights=[6, 2, 2])[0]
+            words.append(rng.choice(pool) + rng.choice(separators))
+        docs.append((''.join(words), rng.sample(TICKER_UNIVERSE, rng.randint(1, 5))))
+    return docs
+
+def corpus_from_file(file_path, n_docs):
+    """
+    Take the first n_docs universe articles (headline and body) from a TR JSON file.
+    """
+    docs = []
+    for article in iter_json_items(file_path):
+        data = article.get('data', {})
+        tickers = article_universe_tickers(article)
+        if not tickers:
+            continue
+        docs.append((data.get('headline', ''), tickers))
+        docs.append((data.get('body', ''), tickers))
+        if len(docs) >= 2 * n_docs:
+            break
+    return docs
+
+def time_masking(func, docs, repeat):
+    """
+    Best-of-repeat wall time to mask every (text, ticker) pair with func.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text, tickers in docs:
+            for ticker in tickers:
+                func(text, ticker)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    """
+    Check the compiled masking engine against the reference passes on a golden corpus,
+    then time both. Exits with status 1 if any output differs.
+    """
+    parser = argparse.ArgumentParser(
+        description="Golden check and microbenchmark for the compiled masking engine."
+    )
+    parser.add_argument("--corpus", default=None,
+                        help="Optional TR JSON file to use as the corpus (default: synthetic).")
+    parser.add_argument("--n_docs", type=int, default=2000,
+                        help="Number of documents (articles for --corpus).")
+    parser.add_argument("--all_tickers", action="store_true", default=False,
+                        help="Mask every text for all 45 tickers, not just the tagged ones.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timing repetitions (best is reported).")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for the synthetic corpus.")
+
+    args = parser.parse_args()
+
+    if args.corpus:
+        docs = corpus_from_file(args.corpus, args.n_docs)
+    else:
+        docs = synthetic_corpus(args.n_docs, seed=args.seed)
+    if args.all_tickers:
+        docs = [(text, TICKER_UNIVERSE) for text, _ in docs]
+    n_pairs = sum(len(tickers) for _, tickers in docs)
+    print(f"[INFO] {len(docs)} texts, {n_pairs} (text, ticker) pairs.")
+
+    mismatches = 0
+    for text, tickers in docs:
+        for ticker in tickers:
+            if mask_text(text, ticker) != mask_text_reference(text, ticker):
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"[ERROR] Mismatch for {ticker}: {text[:120]!r}")
+    if mismatches:
+        print(f"[ERROR] {mismatches} of {n_pairs} outputs differ from the reference.")
+        sys.exit(1)
+    print("[INFO] Golden check passed: compiled engine matches the reference on every pair.")
+
+    t_ref = time_masking(mask_text_reference, docs, args.repeat)
+    t_new = time_masking(mask_text, docs, args.repeat)
+    print(f"[INFO] reference: {t_ref:.3f}s ({n_pairs / t_ref:,.0f} pairs/s)")
+    print(f"[INFO] compiled:  {t_new:.3f}s ({n_pairs / t_new:,.0f} pairs/s)")
+    print(f"[INFO] speedup:   {t_ref / t_new:.2f}x")
+
+if __name__ == "__main__":
+    main()
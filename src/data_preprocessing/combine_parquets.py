@@ -5,6 +5,16 @@ import os
 import sys
 import argparse
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from dedup_index import DedupIndex
+
+# Source name of the combine step in the dedup index report
+DEDUP_SOURCE = 'combine'
+
+# Rows read per batch in streaming mode
+STREAM_BATCH_ROWS = 256
 
 def combine_lists(series_of_lists):
     """
@@ -18,12 +28,22 @@ def combine_lists(series_of_lists):
     # If there's nothing, return None (or empty list if you prefer)
     return combined if combined else None
 
-def combine_parquet_files(input_folder, output_file):
+def dedup_cell(dedup_index, news, trading_day, ticker):
+    """
+    Drop the texts of one (trading_day, ticker) cell already kept elsewhere. None if nothing is left.
+    """
+    if news is None or len(news) == 0:
+        return None
+    kept = dedup_index.filter_texts(news, trading_day, ticker, DEDUP_SOURCE)
+    return kept if kept else None
+
+def combine_parquet_files(input_folder, output_file, dedup_index=None):
     """
     1. Reads all *.parquet files in input_folder.
     2. Concatenates them row-wise (stack).
     3. Groups by index (trading_day), merges overlapping rows.
     4. Sorts by date index and writes to output_file.
+    With a DedupIndex, texts kept earlier (in date order) are dropped before writing.
     """
     # Find all Parquet files
     parquet_files = [
@@ -57,6 +77,14 @@ def combine_parquet_files(input_folder, output_file):
     
     # Sort by index (chronological order)
     big_df = big_df.sort_index()
+
+    if dedup_index is not None:
+        # Day by day, so the first copy in date order is the one kept
+        cells = {ticker: [] for ticker in big_df.columns}
+        for day, row in zip(big_df.index, big_df.itertuples(index=False, name=None)):
+            for ticker, news in zip(big_df.columns, row):
+                cells[ticker].append(dedup_cell(dedup_index, news, day, ticker))
+        big_df = pd.DataFrame({t: pd.Series(v, index=big_df.index, dtype=object) for t, v in cells.items()})
     
     # Optionally ensure we only have 45 columns (the tickers),
     # e.g., if you want to drop any unexpected columns:
@@ -67,15 +95,159 @@ def combine_parquet_files(input_folder, output_file):
     big_df.to_parquet(output_file)
     print(f"[INFO] Wrote combined Parquet to {output_file}")
 
+def index_column_name(parquet_file):
+    """
+    Name of the column holding the pandas index (trading_day) in a pipeline Parquet file.
+    """
+    pandas_meta = parquet_file.schema_arrow.pandas_metadata or {}
+    for col in pandas_meta.get('index_columns', []):
+        if isinstance(col, str):
+            return col
+    return 'trading_day'
+
+def scan_parquet_file(path):
+    """
+    Read only the index column of a Parquet file.
+    Returns a dict with 'path', 'index_col', 'index_type', 'columns' (tickers) and 'min_day' (None if empty).
+    """
+    pf = pq.ParquetFile(path)
+    index_col = index_column_name(pf)
+    days = pf.read(columns=[index_col]).column(index_col)
+    return {
+        'path': path,
+        'index_col': index_col,
+        'index_type': pf.schema_arrow.field(index_col).type,
+        'columns': [name for name in pf.schema_arrow.names if name != index_col],
+        'min_day': pc.min(days).as_py() if len(days) else None
+    }
+
+def combine_parquet_files_streaming(input_folder, output_file, batch_rows=STREAM_BATCH_ROWS, dedup_index=None):
+    """
+    Streaming version of combine_parquet_files with the same output table:
+      1. Reads only the trading_day column of each file, and orders files by their first day.
+      2. Streams each file in row batches, merging the ticker lists of days seen in several files.
+      3. After each file, writes every day before the next file's first day: no later file can
+         add to it. Days come out in sorted order, through one ParquetWriter.
+    Memory holds one file's days plus the days that overlap the next file, not the whole history.
+    Lists for a day are concatenated in file order (first day, then file name), which makes the
+    result deterministic where the in-memory version follows os.listdir order.
+    With a DedupIndex, each written day is checked against it, in date order.
+    """
+    parquet_files = sorted(
+        os.path.join(input_folder, f)
+        for f in os.listdir(input_folder)
+        if f.endswith('.parquet')
+    )
+    if not parquet_files:
+        print(f"[WARN] No Parquet files found in {input_folder}. Exiting.")
+        return
+
+    scans = [scan_parquet_file(pf) for pf in parquet_files]
+    scans = [s for s in scans if s['min_day'] is not None]
+    if not scans:
+        print(f"[WARN] All Parquet files in {input_folder} are empty. Exiting.")
+        return
+    scans.sort(key=lambda s: (s['min_day'], s['path']))
+
+    # Output schema: union of ticker columns (first-seen order) plus the index
+    tickers = list(dict.fromkeys(col for s in scans for col in s['columns']))
+    index_col = scans[0]['index_col']
+    out_schema = pa.schema(
+        [pa.field(t, pa.list_(pa.string())) for t in tickers]
+        + [pa.field(index_col, scans[0]['index_type'])]
+    )
+
+    pending = {}
+    n_days = 0
+    writer = None
+
+    def flush(before=None):
+        nonlocal writer, n_days
+        days = sorted(d for d in pending if before is None or d < before)
+        if not days:
+            return
+        if dedup_index is not None:
+            for d in days:
+                pending[d] = {t: dedup_cell(dedup_index, pending[d].get(t), d, t) for t in tickers}
+        rows = pd.DataFrame(
+            [[pending[d].get(t) or None for t in tickers] for d in days],
+            index=pd.Index(days, name=index_col),
+            columns=tickers
+        )
+        for d in days:
+            del pending[d]
+        table = pa.Table.from_pandas(rows, schema=out_schema)
+        if writer is None:
+            writer = pq.ParquetWriter(output_file, table.schema)
+        writer.write_table(table)
+        n_days += len(days)
+
+    try:
+        for i, scan in enumerate(scans):
+            print(f"[INFO] Reading {scan['path']} ...")
+            pf = pq.ParquetFile(scan['path'])
+            for batch in pf.iter_batches(batch_size=batch_rows):
+                columns = {name: batch.column(name).to_pylist() for name in batch.schema.names}
+                for row, day in enumerate(columns.pop(scan['index_col'])):
+                    cells = pending.setdefault(day, {})
+                    for ticker, values in columns.items():
+                        news = values[row]
+                        if news is not None:
+                            cells.setdefault(ticker, []).extend(news)
+            # Days before the next file's first day are final
+            next_day = scans[i + 1]['min_day'] if i + 1 < len(scans) else None
+            if next_day is not None:
+                flush(before=next_day)
+        flush()
+    finally:
+        if writer is not None:
+            writer.close()
+    print(f"[INFO] Wrote combined Parquet ({n_days} trading days) to {output_file}")
+
 def main():
     parser = argparse.ArgumentParser(
         description="Combine all monthly Parquet files into one DataFrame."
     )
     parser.add_argument("--input_folder", default=".", help="Folder with .parquet files.")
     parser.add_argument("--output_file", default="combined.parquet", help="Output Parquet file.")
+    parser.add_argument("--stream", action="store_true", default=False,
+                        help="Merge files in date order with bounded memory instead of loading all of them.")
+    parser.add_argument("--batch_rows", type=int, default=STREAM_BATCH_ROWS,
+                        help="Rows read per batch in --stream mode.")
+    parser.add_argument("--dedup_index", default=None,
+                        help="SQLite dedup index (e.g. the one tr_data_pipeline.py used) to drop "
+                             "texts repeated across files and months.")
+    parser.add_argument("--near_dup", action="store_true", default=False,
+                        help="With --dedup_index, also drop near-duplicates (MinHash).")
+    parser.add_argument("--profile", default=None,
+                        help="Write a stage profile (wall/CPU time, peak RSS, throughput) of this run to this JSON file.")
     args = parser.parse_args()
-    
-    combine_parquet_files(args.input_folder, args.output_file)
+
+    if args.profile:
+        # benchmarks/instrumentation.py, imported only when profiling
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+        from instrumentation import run_profiled
+        run_profiled(args.profile, 'combine_parquets', run_cli, args, unit='files', count=int)
+    else:
+        run_cli(args)
+
+def run_cli(args):
+    """Combine the input folder for parsed command-line arguments. Returns the number of input files."""
+    n_files = sum(f.endswith('.parquet') for f in os.listdir(args.input_folder))
+    # Cells merge several files, so kept texts are matched on (trading_day, ticker) alone
+    dedup_index = DedupIndex(args.dedup_index, near_dup=args.near_dup, any_source=True) \
+        if args.dedup_index else None
+    try:
+        if args.stream:
+            combine_parquet_files_streaming(args.input_folder, args.output_file, batch_rows=args.batch_rows,
+                                            dedup_index=dedup_index)
+        else:
+            combine_parquet_files(args.input_folder, args.output_file, dedup_index=dedup_index)
+    finally:
+        if dedup_index is not None:
+            dedup_index.session_report()
+            dedup_index.close()
+    return n_files
 
 if __name__ == "__main__":
     main()
@@ -85,4 +257,5 @@ if __name__ == "__main__":
 #### python combine_parquets.py \
 #    --input_folder "/path/to/parquet_files" \
 #    --output_file "all_combined.parquet"
+#    (add --stream to merge in date order with bounded memory)
 
@@ -0,0 +1,233 @@
+#!/apps/anaconda3/bin/python
+# dedup_index.py
+
+import os
+import re
+import sqlite3
+import hashlib
+import argparse
+import numpy as np
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Configuration --------------------------------------
+# --------------------------------------------------------------------------------
+
+# Exact keys: BLAKE2b of the normalized text, 8 (64-bit) or 16 (128-bit) bytes
+DEFAULT_DIGEST_SIZE = 16
+# Near duplicates: MinHash over word shingles with LSH banding. Two texts become candidates
+# when all rows of one band agree; they are near duplicates when the signatures agree on at
+# least NEAR_DUP_JACCARD of their slots (estimated shingle Jaccard similarity).
+# MinHash rather than SimHash: a one-word update to a 50-word story moves a 64-bit SimHash
+# by more bits than a usable threshold, while its Jaccard stays near 0.9.
+SHINGLE_SIZE = 3
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4
+NEAR_DUP_JACCARD = 0.7
+# Rows inserted between commits
+COMMIT_EVERY = 5000
+
+WHITESPACE_RE = re.compile(r'\s+')
+WORD_RE = re.compile(r'\w+')
+MINHASH_PERM = MINHASH_BANDS * MINHASH_ROWS
+# Fixed seed: signatures stored in an index must stay comparable across runs
+MINHASH_MASKS = np.random.default_rng(5293).integers(0, 2**63, size=MINHASH_PERM, dtype=np.uint64)
+MINHASH_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Hashing --------------------------------------------
+# --------------------------------------------------------------------------------
+
+def normalize_text(text):
+    """
+    Case-fold and collapse whitespace, so re-sends that only differ in spacing/case share a key.
+    """
+    return WHITESPACE_RE.sub(' ', text.casefold()).strip()
+
+def text_key(normalized, digest_size=DEFAULT_DIGEST_SIZE):
+    """
+    Exact-duplicate key of a normalized text.
+    """
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=digest_size).digest()
+
+def minhash_signature(normalized, shingle_size=SHINGLE_SIZE):
+    """
+    MinHash signature (MINHASH_PERM uint32 slots) of a normalized text over word shingles.
+    Each slot is the minimum of one xor-multiply permutation of the 64-bit shingle hashes.
+    """
+    words = WORD_RE.findall(normalized)
+    if len(words) > shingle_size:
+        shingles = [' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    else:
+        shingles = [' '.join(words)]
+    hashes = np.frombuffer(
+        b''.join(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest() for s in shingles),
+        dtype=np.uint64
+    )
+    permuted = ((hashes[:, None] ^ MINHASH_MASKS) * MINHASH_MULT) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+def signature_bands(signature):
+    """
+    LSH band values of a signature: a signed 64-bit hash of each band's MINHASH_ROWS slots.
+    """
+    return [
+        int.from_bytes(hashlib.blake2b(signature[b * MINHASH_ROWS:(b + 1) * MINHASH_ROWS].tobytes(),
+                                       digest_size=8).digest(), 'little', signed=True)
+        for b in range(MINHASH_BANDS)
+    ]
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Persistent Index -----------------------------------
+# --------------------------------------------------------------------------------
+
+class DedupIndex:
+    """
+    SQLite-backed index of the news texts kept so far, shared by every file of a run and by
+    combine_parquets, so duplicates across files and months are dropped once.
+      - A text is a duplicate if its exact key was already seen in this session, or was kept
+        earlier for another (trading_day, ticker, source).
+      - With near_dup=True, it is also a duplicate if a kept text of the same ticker has an
+        estimated Jaccard similarity of at least NEAR_DUP_JACCARD (TR updates and re-sends).
+        Near-duplicates are only looked up per ticker: one article masked for two tickers
+        differs only in the masks and must be kept for both.
+    Only kept texts are stored. Meeting a kept text again where it was kept keeps it, so
+    rerunning an input file is idempotent. combine_parquets merges several files per cell, so
+    it opens the index with any_source=True and matches kept texts on (trading_day, ticker) only.
+    The counts of the latest session of each source are stored for report().
+    """
+
+    def __init__(self, path, near_dup=False, digest_size=DEFAULT_DIGEST_SIZE, any_source=False):
+        self.path = path
+        self.near_dup = near_dup
+        self.any_source = any_source
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS texts (
+                key BLOB PRIMARY KEY, trading_day TEXT, ticker TEXT, source TEXT, signature BLOB
+            );
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, value INTEGER, ticker TEXT, key BLOB);
+            CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, value);
+            CREATE TABLE IF NOT EXISTS stats (
+                source TEXT PRIMARY KEY, checked INTEGER, exact_dups INTEGER, near_dups INTEGER
+            );
+        """)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'digest_size'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta VALUES ('digest_size', ?)", (str(digest_size),))
+            self.digest_size = digest_size
+        else:
+            self.digest_size = int(row[0])
+        self.session_keys = set()
+        self.counts = {}
+        self.pending = 0
+
+    def is_duplicate(self, text, trading_day, ticker, source=''):
+        """
+        Check one text; record it as kept if it is not a duplicate. Returns True to drop it.
+        """
+        counts = self.counts.setdefault(source, [0, 0, 0])
+        counts[0] += 1
+        normalized = normalize_text(text)
+        key = text_key(normalized, self.digest_size)
+        # date, Timestamp and 'YYYY-MM-DD' strings all give the same day key
+        day = str(trading_day)[:10]
+
+        if key in self.session_keys:
+            counts[1] += 1
+            return True
+        row = self.conn.execute("SELECT trading_day, ticker, source FROM texts WHERE key = ?",
+                                (key,)).fetchone()
+        if row is not None:
+            if row[0] == day and row[1] == ticker and (self.any_source or row[2] == source):
+                self.session_keys.add(key)
+                return False
+            counts[1] += 1
+            return True
+
+        signature = None
+        if self.near_dup:
+            signature = minhash_signature(normalized)
+            bands = signature_bands(signature)
+            candidates = set()
+            for band, value in enumerate(bands):
+                candidates.update(k for (k,) in self.conn.execute(
+                    "SELECT key FROM bands WHERE band = ? AND value = ? AND ticker = ?", (band, value, ticker)))
+            for candidate in candidates:
+                (other,) = self.conn.execute("SELECT signature FROM texts WHERE key = ?", (candidate,)).fetchone()
+                if np.mean(np.frombuffer(other, dtype=np.uint32) == signature) >= NEAR_DUP_JACCARD:
+                    counts[2] += 1
+                    return True
+
+        self.conn.execute("INSERT INTO texts VALUES (?, ?, ?, ?, ?)",
+                          (key, day, ticker, source, signature.tobytes() if signature is not None else None))
+        if signature is not None:
+            self.conn.executemany("INSERT INTO bands VALUES (?, ?, ?, ?)",
+                                  [(band, value, ticker, key) for band, value in enumerate(bands)])
+        self.session_keys.add(key)
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+        return False
+
+    def filter_texts(self, texts, trading_day, ticker, source=''):
+        """
+        Keep the texts of one (trading_day, ticker) cell that are not duplicates, in order.
+        """
+        return [t for t in texts if not self.is_duplicate(t, trading_day, ticker, source)]
+
+    def commit(self):
+        """
+        Flush kept texts and the session counts so far to the database.
+        """
+        for source, (checked, exact, near) in self.counts.items():
+            self.conn.execute("INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?)",
+                              (source, checked, exact, near))
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def session_report(self):
+        """
+        Print this session's dedup rate (all sources) and return (checked, exact, near).
+        """
+        totals = [sum(c[i] for c in self.counts.values()) for i in range(3)]
+        print_dedup_line("this run", *totals)
+        return tuple(totals)
+
+def print_dedup_line(label, checked, exact, near):
+    """Print one dedup-rate line."""
+    rate = (exact + near) / checked if checked else 0.0
+    print(f"[INFO] Dedup {label}: {checked} checked, {exact} exact + {near} near duplicates "
+          f"dropped ({rate:.1%}).")
+
+def report(path):
+    """
+    Print per-source and total dedup rates stored in an index.
+    """
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT source, checked, exact_dups, near_dups FROM stats ORDER BY source").fetchall()
+    n_kept = conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0]
+    conn.close()
+    for source, checked, exact, near in rows:
+        print_dedup_line(source or '(unnamed)', checked, exact, near)
+    print_dedup_line("total", sum(r[1] for r in rows), sum(r[2] for r in rows), sum(r[3] for r in rows))
+    print(f"[INFO] {n_kept} distinct texts kept in {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the dedup report stored in a dedup index.")
+    parser.add_argument("--index", default="dedup_index.sqlite", help="Path of the dedup index.")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.index):
+        print(f"[ERROR] No dedup index at {args.index}.")
+        return
+    report(args.index)
+
+if __name__ == "__main__":
+    main()
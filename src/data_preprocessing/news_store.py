@@ -0,0 +1,188 @@
+#!/apps/anaconda3/bin/python
+# news_store.py
+
+import os
+import argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Store Layout ---------------------------------------
+# --------------------------------------------------------------------------------
+#
+# Long-format news store: one row per (article, ticker), Hive-partitioned as
+#   <root>/ticker=AAPL/year=2020/part-<input file>.parquet
+# Rows inside a part keep pipeline order, so the pivot can be rebuilt exactly.
+# The ticker and year partition keys are read back as dictionary-encoded columns.
+
+NEWS_STORE_SCHEMA = pa.schema([
+    ('trading_day', pa.date32()),
+    ('article_id', pa.string()),
+    ('headline', pa.string()),
+    ('body', pa.string())
+])
+STORE_PARTITIONING = ds.HivePartitioning.discover(infer_dictionary=True)
+# Rows per row group, so trading_day statistics can prune inside large parts
+STORE_ROW_GROUP_SIZE = 2000
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Writing --------------------------------------------
+# --------------------------------------------------------------------------------
+
+class NewsStoreWriter:
+    """
+    Append (trading_day, ticker, article_id, headline, body) rows for one input file.
+      - One part file per (ticker, year) partition, named after the input file, so
+        rerunning an input replaces its parts instead of adding duplicates.
+      - Parts are opened lazily and kept open until close(), so batches can be streamed in.
+    """
+
+    def __init__(self, root, part_name):
+        self.root = root
+        self.part_name = part_name
+        self.writers = {}
+        self.n_rows = 0
+
+    def part_path(self, ticker, year):
+        return os.path.join(self.root, f"ticker={ticker}", f"year={year}", f"part-{self.part_name}.parquet")
+
+    def write_rows(self, trading_days, tickers, article_ids, headlines, bodies):
+        """
+        Write rows given as parallel sequences, keeping their order within each partition.
+        """
+        partitions = {}
+        for i, (day, ticker) in enumerate(zip(trading_days, tickers)):
+            partitions.setdefault((ticker, day.year), []).append(i)
+
+        for (ticker, year), rows in partitions.items():
+            key = (ticker, year)
+            if key not in self.writers:
+                path = self.part_path(ticker, year)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.writers[key] = pq.ParquetWriter(path, NEWS_STORE_SCHEMA)
+            table = pa.table({
+                'trading_day': [trading_days[i] for i in rows],
+                'article_id': [article_ids[i] for i in rows],
+                'headline': [headlines[i] for i in rows],
+                'body': [bodies[i] for i in rows]
+            }, schema=NEWS_STORE_SCHEMA)
+            self.writers[key].write_table(table, row_group_size=STORE_ROW_GROUP_SIZE)
+        self.n_rows += len(trading_days)
+
+    def write_frame(self, df):
+        """
+        Write a DataFrame with 'trading_day', 'ticker', 'article_id', 'masked_headline', 'masked_body'.
+        """
+        self.write_rows(list(df['trading_day']), list(df['ticker']), list(df['article_id']),
+                        list(df['masked_headline']), list(df['masked_body']))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+def remove_parts(root, part_name):
+    """
+    Delete every part an earlier run wrote for this input file (all partitions).
+    """
+    if not os.path.isdir(root):
+        return
+    suffix = f"part-{part_name}.parquet"
+    for dirpath, _, filenames in os.walk(root):
+        if suffix in filenames:
+            os.remove(os.path.join(dirpath, suffix))
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Reading --------------------------------------------
+# --------------------------------------------------------------------------------
+
+def open_news_store(root):
+    """
+    Open the store as a pyarrow dataset (ticker/year partitions, dictionary-encoded).
+    """
+    return ds.dataset(root, format='parquet', partitioning=STORE_PARTITIONING)
+
+def store_filter(tickers=None, start_date=None, end_date=None):
+    """
+    Build a dataset filter. Ticker and year prune whole partitions; the trading_day
+    bounds are also checked against row-group statistics.
+    """
+    conditions = []
+    if tickers is not None:
+        conditions.append(ds.field('ticker').isin(list(tickers)))
+    if start_date is not None:
+        start_date = pd.to_datetime(start_date).date()
+        conditions.append(ds.field('year') >= start_date.year)
+        conditions.append(ds.field('trading_day') >= start_date)
+    if end_date is not None:
+        end_date = pd.to_datetime(end_date).date()
+        conditions.append(ds.field('year') <= end_date.year)
+        conditions.append(ds.field('trading_day') <= end_date)
+    if not conditions:
+        return None
+    expr = conditions[0]
+    for cond in conditions[1:]:
+        expr = expr & cond
+    return expr
+
+def read_news(root, tickers=None, start_date=None, end_date=None, columns=None):
+    """
+    Read the long table for some tickers and/or a trading-day range as a pyarrow Table.
+    Only the matching partitions and row groups are read. Within a partition, parts
+    (one per input file) follow file-name order.
+    """
+    dataset = open_news_store(root)
+    return dataset.to_table(columns=columns, filter=store_filter(tickers, start_date, end_date))
+
+def pivot_news_texts(df):
+    """
+    Pivot (trading_day, ticker, masked_text) rows into the wide trading_day x ticker frame
+    of lists that the pipeline has always written. Lists keep row order.
+    """
+    agg = df.groupby(['trading_day', 'ticker'])['masked_text'].apply(list).reset_index()
+    pivot_df = agg.pivot(index='trading_day', columns='ticker', values='masked_text')
+    return pivot_df
+
+def read_news_pivot(root, tickers=None, start_date=None, end_date=None):
+    """
+    Compatibility reader: rebuild today's pivot (cells are lists of "headline body" texts)
+    from the long store for the requested tickers / date range.
+    """
+    table = read_news(root, tickers, start_date, end_date,
+                      columns=['trading_day', 'ticker', 'headline', 'body'])
+    if table.num_rows == 0:
+        return pd.DataFrame()
+    df = pd.DataFrame({
+        'trading_day': table.column('trading_day').to_pylist(),
+        'ticker': table.column('ticker').cast(pa.string()).to_pylist(),
+        'headline': table.column('headline').to_pylist(),
+        'body': table.column('body').to_pylist()
+    })
+    df['masked_text'] = df['headline'] + " " + df['body']
+    return pivot_news_texts(df)
+
+def main():
+    """
+    Export a slice of the long news store as the legacy pivot Parquet (for the notebooks).
+    """
+    parser = argparse.ArgumentParser(
+        description="Rebuild the trading_day x ticker pivot Parquet from the long news store."
+    )
+    parser.add_argument("--store_dir", default="news_store", help="Root of the long news store.")
+    parser.add_argument("--output_file", default="combined.parquet", help="Output Parquet file.")
+    parser.add_argument("--tickers", nargs="*", default=None, help="Tickers to export (default: all).")
+    parser.add_argument("--start_date", default=None, help="First trading day (YYYY-MM-DD).")
+    parser.add_argument("--end_date", default=None, help="Last trading day (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    pivot_df = read_news_pivot(args.store_dir, args.tickers, args.start_date, args.end_date)
+    if pivot_df.empty:
+        print(f"[WARN] No rows in {args.store_dir} for the requested slice. Nothing written.")
+        return
+    pivot_df.to_parquet(args.output_file)
+    print(f"[INFO] Wrote {len(pivot_df)} trading days x {pivot_df.shape[1]} tickers to {args.output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+#!/apps/anaconda3/bin/python
+# price_store.py
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Store Layout ---------------------------------------
+# --------------------------------------------------------------------------------
+#
+# Local daily price store, Hive-partitioned as
+#   <root>/ticker=AAPL/year=2020/part-0.parquet
+# plus <root>/_coverage.json, the date ranges already requested for each ticker (ranges with no
+# rows, e.g. before a listing, count as covered), so a rebuild only fetches what is missing.
+
+TICKER_UNIVERSE = (
+    'AAPL', 'MSFT', 'NVDA', 'AVGO', 'ADBE', 'UNH', 'JNJ', 'PFE', 'MRK', 'ABBV',
+    'JPM', 'BAC', 'WFC', 'GS', 'MS', 'AMZN', 'TSLA', 'HD', 'MCD', 'NKE', 'GOOGL',
+    'META', 'DIS', 'VZ', 'CMCSA', 'PG', 'KO', 'PEP', 'WMT', 'COST', 'XOM', 'CVX',
+    'COP', 'BA', 'UNP', 'HON', 'NEE', 'DUK', 'SO', 'PLD', 'AMT', 'CCI', 'SHW', 'DOW'
+)
+START_DATE = '2017-01-01'
+END_DATE = '2025-02-28'
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+PRICE_STORE_SCHEMA = pa.schema([('date', pa.date32())] + [(name, pa.float64()) for name in PRICE_FIELDS])
+STORE_PARTITIONING = ds.HivePartitioning.discover(infer_dictionary=True)
+COVERAGE_FILE = '_coverage.json'
+PART_FILE = 'part-0.parquet'
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Fetchers -------------------------------------------
+# --------------------------------------------------------------------------------
+
+class PriceFetcher:
+    """
+    Source of daily prices. fetch(tickers, start_date, end_date) returns a DataFrame with
+    ticker, date, open, high, low, close, volume for those tickers between the two dates
+    (inclusive); rows sharing a (ticker, date) are allowed.
+    """
+
+    def fetch(self, tickers, start_date, end_date):
+        raise NotImplementedError
+
+class WRDSFetcher(PriceFetcher):
+    """The notebook's crsp.dsf x crsp.msenames pull (duplicates dropped), one query per call."""
+
+    SQL = """
+    SELECT
+        n.ticker,
+        a.date,
+        a.openprc AS open,
+        a.askhi AS high,
+        a.bidlo AS low,
+        a.prc AS close,
+        a.vol AS volume
+    FROM crsp.dsf a
+    JOIN crsp.msenames n
+        ON a.permno = n.permno
+    WHERE n.ticker IN ({tickers})
+    AND a.date BETWEEN '{start_date}' AND '{end_date}'
+    ORDER BY n.ticker, a.date;
+    """
+
+    def __init__(self, wrds_username):
+        self.wrds_username = wrds_username
+        self.db = None
+
+    def fetch(self, tickers, start_date, end_date):
+        if self.db is None:
+            import wrds
+            self.db = wrds.Connection(wrds_username=self.wrds_username)
+        sql_request = self.SQL.format(tickers=', '.join(f"'{t}'" for t in tickers),
+                                      start_date=start_date, end_date=end_date)
+        return self.db.raw_sql(sql_request).drop_duplicates()
+
+class FileFetcher(PriceFetcher):
+    """Stand-in for WRDS: slices of a local CSV / Parquet with the same columns."""
+
+    def __init__(self, path):
+        self.path = path
+        self.df = None
+
+    def fetch(self, tickers, start_date, end_date):
+        if self.df is None:
+            df = pd.read_parquet(self.path) if self.path.endswith('.parquet') else pd.read_csv(self.path)
+            df['date'] = pd.to_datetime(df['date'])
+            self.df = df[['ticker', 'date'] + PRICE_FIELDS]
+        df = self.df
+        keep = df['ticker'].isin(list(tickers)) & df['date'].between(pd.Timestamp(start_date), pd.Timestamp(end_date))
+        return df[keep].drop_duplicates()
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Coverage Ranges ------------------------------------
+# --------------------------------------------------------------------------------
+# Inclusive [start, end] ISO date ranges, kept sorted and merged (adjacent days join).
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted((pd.Timestamp(s), pd.Timestamp(e)) for s, e in ranges):
+        if merged and start <= merged[-1][1] + pd.Timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(s.strftime('%Y-%m-%d'), e.strftime('%Y-%m-%d')) for s, e in merged]
+
+def missing_ranges(covered, start_date, end_date):
+    """Parts of [start_date, end_date] outside the covered ranges."""
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    gaps = []
+    for s, e in merge_ranges(covered):
+        s, e = pd.Timestamp(s), pd.Timestamp(e)
+        if e < start or s > end:
+            continue
+        if s > start:
+            gaps.append((start, s - pd.Timedelta(days=1)))
+        start = max(start, e + pd.Timedelta(days=1))
+    if start <= end:
+        gaps.append((start, end))
+    return [(s.strftime('%Y-%m-%d'), e.strftime('%Y-%m-%d')) for s, e in gaps]
+
+# --------------------------------------------------------------------------------
+# ------------------------- 4. Price Store ----------------------------------------
+# --------------------------------------------------------------------------------
+
+class PriceStore:
+    """
+    Ticker/year partitioned Parquet price cache in front of a PriceFetcher.
+      - update(tickers, start, end) fetches only the ranges _coverage.json does not cover,
+        batching tickers that miss the same range into one fetch (one query on a cold store).
+      - read() returns the long frame, panel() the [T, N] OHLCV arrays (memory-mapped .npy
+        files when a panel_dir is given).
+    Each rewritten partition and the coverage file are replaced atomically, so an interrupted
+    update leaves a readable store and is redone on the next run.
+    """
+
+    def __init__(self, root, fetcher=None):
+        self.root = root
+        self.fetcher = fetcher
+        self.coverage_path = os.path.join(root, COVERAGE_FILE)
+        self.meta = {'version': 0, 'coverage': {}}
+        if os.path.exists(self.coverage_path):
+            with open(self.coverage_path) as f:
+                self.meta = json.load(f)
+
+    def part_path(self, ticker, year):
+        return os.path.join(self.root, f"ticker={ticker}", f"year={year}", PART_FILE)
+
+    def coverage(self, ticker):
+        return [tuple(r) for r in self.meta['coverage'].get(ticker, [])]
+
+    def missing(self, tickers, start_date, end_date):
+        """{(start, end): [tickers missing that range]} for the requested slice."""
+        gaps = {}
+        for ticker in tickers:
+            for gap in missing_ranges(self.coverage(ticker), start_date, end_date):
+                gaps.setdefault(gap, []).append(ticker)
+        return gaps
+
+    def write_rows(self, df, start_date, end_date, tickers=None):
+        """
+        Store the rows fetched for [start_date, end_date] in their (ticker, year) partitions,
+        keeping dates in order. Each partition's existing rows for that ticker inside the range
+        are replaced, not appended to, so redoing an update interrupted before save_meta does
+        not duplicate them. (Rows are not deduplicated on (ticker, date): CRSP permno reuse
+        legitimately repeats those.) `tickers` defaults to those present in df.
+        """
+        df = df.assign(date=pd.to_datetime(df['date']))
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        fetched = dict(iter(df.groupby([df['ticker'], df['date'].dt.year], sort=False)))
+        tickers = df['ticker'].unique() if tickers is None else tickers
+        for ticker in tickers:
+            for year in range(start.year, end.year + 1):
+                path = self.part_path(ticker, year)
+                rows = fetched.get((ticker, year))
+                if rows is None and not os.path.exists(path):
+                    continue
+                tables = []
+                if os.path.exists(path):
+                    table = pq.read_table(path, schema=PRICE_STORE_SCHEMA)
+                    stale = pc.and_(pc.greater_equal(table['date'], pa.scalar(start.date())),
+                                    pc.less_equal(table['date'], pa.scalar(end.date())))
+                    tables.append(table.filter(pc.invert(stale)))
+                if rows is not None:
+                    tables.append(pa.Table.from_pandas(rows.assign(date=rows['date'].dt.date)[PRICE_STORE_SCHEMA.names],
+                                                       schema=PRICE_STORE_SCHEMA, preserve_index=False))
+                table = pa.concat_tables(tables)
+                table = table.take(pc.sort_indices(table, [('date', 'ascending')]))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = os.path.join(os.path.dirname(path), '.' + PART_FILE + '.tmp')
+                pq.write_table(table, tmp_path)
+                os.replace(tmp_path, path)
+
+    def save_meta(self):
+        tmp_path = self.coverage_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.coverage_path)
+
+    def update(self, tickers=TICKER_UNIVERSE, start_date=START_DATE, end_date=END_DATE):
+        """Fetch and store whatever part of the slice is not cached yet. Returns rows added."""
+        os.makedirs(self.root, exist_ok=True)
+        gaps = self.missing(tickers, start_date, end_date)
+        n_rows = 0
+        for (start, end), gap_tickers in gaps.items():
+            if self.fetcher is None:
+                raise ValueError(f"{len(gap_tickers)} tickers miss {start}..{end} and the store has no fetcher.")
+            print(f"[INFO] Fetching {len(gap_tickers)} tickers, {start} to {end}...")
+            df = self.fetcher.fetch(gap_tickers, start, end)
+            df = df[df['ticker'].isin(gap_tickers)
+                    & pd.to_datetime(df['date']).between(pd.Timestamp(start), pd.Timestamp(end))]
+            self.write_rows(df, start, end, gap_tickers)
+            for ticker in gap_tickers:
+                self.meta['coverage'][ticker] = merge_ranges(self.coverage(ticker) + [(start, end)])
+            self.meta['version'] += 1
+            self.save_meta()
+            n_rows += len(df)
+        return n_rows
+
+    def read(self, tickers=None, start_date=None, end_date=None, columns=None):
+        """
+        Long frame (ticker, date, OHLCV) sorted by ticker then date, as the notebook's query
+        returns it; only the matching partitions are read.
+        """
+        dataset = ds.dataset(self.root, format='parquet', partitioning=STORE_PARTITIONING)
+        conditions = []
+        if tickers is not None:
+            conditions.append(ds.field('ticker').isin(list(tickers)))
+        if start_date is not None:
+            start_date = pd.Timestamp(start_date).date()
+            conditions.append((ds.field('year') >= start_date.year) & (ds.field('date') >= start_date))
+        if end_date is not None:
+            end_date = pd.Timestamp(end_date).date()
+            conditions.append((ds.field('year') <= end_date.year) & (ds.field('date') <= end_date))
+        expr = None
+        for cond in conditions:
+            expr = cond if expr is None else expr & cond
+        columns = ['ticker', 'date'] + (PRICE_FIELDS if columns is None else list(columns))
+        table = dataset.to_table(columns=columns, filter=expr)
+        df = table.to_pandas()
+        df['ticker'] = df['ticker'].astype(str)
+        df['date'] = pd.to_datetime(df['date'])
+        return df.sort_values(['ticker', 'date'], kind='stable').reset_index(drop=True)
+
+    def panel(self, tickers=TICKER_UNIVERSE, start_date=START_DATE, end_date=END_DATE, panel_dir=None):
+        """
+        [T, N] OHLCV arrays over the union of trading dates: {'dates', 'tickers', 'open', ...,
+        'volume', 'mask'} with NaN (and mask False) where a ticker has no row. A (ticker, date)
+        with several rows (ticker reuse across permnos in the msenames join) keeps the first.
+        With panel_dir the arrays are cached there as .npy files, keyed by the slice and the
+        store version, and returned memory-mapped read-only.
+        """
+        key = hashlib.blake2b(json.dumps([sorted(tickers), str(start_date), str(end_date),
+                                          self.meta['version']]).encode('utf-8'), digest_size=8).hexdigest()
+        cache_dir = None if panel_dir is None else os.path.join(panel_dir, f"panel-{key}")
+        if cache_dir is not None and os.path.isdir(cache_dir):
+            return load_price_panel(cache_dir)
+
+        df = self.read(tickers, start_date, end_date)
+        n_dups = int(df.duplicated(['ticker', 'date']).sum())
+        if n_dups:
+            print(f"[WARN] {n_dups} repeated (ticker, date) rows; the panel keeps the first of each.")
+            df = df.drop_duplicates(['ticker', 'date'])
+        dates = np.sort(df['date'].unique())
+        tickers = np.asarray(sorted(tickers), dtype=str)
+        d_idx = pd.Index(dates).get_indexer(df['date'])
+        t_idx = pd.Index(tickers).get_indexer(df['ticker'])
+        panel = {'dates': np.asarray(dates, dtype='datetime64[ns]'), 'tickers': tickers}
+        for name in PRICE_FIELDS:
+            values = np.full((len(dates), len(tickers)), np.nan)
+            values[d_idx, t_idx] = df[name].to_numpy(dtype=np.float64)
+            panel[name] = values
+        mask = np.zeros((len(dates), len(tickers)), dtype=bool)
+        mask[d_idx, t_idx] = True
+        panel['mask'] = mask
+
+        if cache_dir is None:
+            return panel
+        save_price_panel(panel, cache_dir)
+        return load_price_panel(cache_dir)
+
+def save_price_panel(panel, panel_dir):
+    """One .npy per array, written to a temp directory renamed into place."""
+    tmp_dir = panel_dir.rstrip(os.sep) + f'.tmp{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, arr in panel.items():
+        np.save(os.path.join(tmp_dir, name + '.npy'), np.asarray(arr))
+    shutil.rmtree(panel_dir, ignore_errors=True)
+    os.replace(tmp_dir, panel_dir)
+
+def load_price_panel(panel_dir, mmap=True):
+    """Load a saved panel; the [T, N] arrays are memory-mapped read-only if mmap."""
+    panel = {}
+    for filename in os.listdir(panel_dir):
+        if filename.endswith('.npy'):
+            name = filename[:-4]
+            panel[name] = np.load(os.path.join(panel_dir, filename),
+                                  mmap_mode='r' if mmap and name not in ('dates', 'tickers') else None)
+    return panel
+
+# --------------------------------------------------------------------------------
+# ------------------------- 5. Main -----------------------------------------------
+# --------------------------------------------------------------------------------
+
+def main():
+    """
+    Bring the local price store up to date for a ticker universe and date range (fetching only
+    missing ranges), then optionally export the [T, N] panel and the technicals CSV.
+    """
+    parser = argparse.ArgumentParser(
+        description="Incrementally cache daily CRSP prices in a local Parquet store."
+    )
+    parser.add_argument("--store_dir", default="price_store", help="Root of the price store.")
+    parser.add_argument("--source", default="wrds",
+                        help="'wrds', or a local .csv/.parquet with ticker, date, open, high, low, close, volume.")
+    parser.add_argument("--wrds_username", default="wenxzeng", help="WRDS user for --source wrds.")
+    parser.add_argument("--tickers", nargs="*", default=list(TICKER_UNIVERSE), help="Ticker universe.")
+    parser.add_argument("--start_date", default=START_DATE, help="First date (YYYY-MM-DD).")
+    parser.add_argument("--end_date", default=END_DATE, help="Last date (YYYY-MM-DD).")
+    parser.add_argument("--panel_dir", default=None, help="Cache the [T, N] OHLCV panel here as .npy files.")
+    parser.add_argument("--technicals_csv", default=None,
+                        help="Also write calculate_technicals output for the slice (e.g. technical_data.csv).")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare the store's rows with a direct fetch of the whole slice.")
+    args = parser.parse_args()
+
+    fetcher = WRDSFetcher(args.wrds_username) if args.source == 'wrds' else FileFetcher(args.source)
+    store = PriceStore(args.store_dir, fetcher)
+    n_rows = store.update(args.tickers, args.start_date, args.end_date)
+    print(f"[INFO] {n_rows} new rows; store version {store.meta['version']}.")
+
+    if args.check:
+        direct = fetcher.fetch(args.tickers, args.start_date, args.end_date)
+        direct = direct.assign(date=pd.to_datetime(direct['date']))
+        direct = direct.sort_values(['ticker', 'date'], kind='stable').reset_index(drop=True)
+        cached = store.read(args.tickers, args.start_date, args.end_date)
+        if not np.array_equal(cached[['ticker', 'date']].to_numpy(), direct[['ticker', 'date']].to_numpy()) or \
+                not np.array_equal(cached[PRICE_FIELDS].to_numpy(dtype=np.float64),
+                                   direct[PRICE_FIELDS].to_numpy(dtype=np.float64), equal_nan=True):
+            print("[ERROR] Store rows differ from a direct fetch of the slice.")
+            raise SystemExit(1)
+        print(f"[INFO] Check passed: {len(cached)} cached rows match a direct fetch.")
+
+    if args.panel_dir:
+        panel = store.panel(args.tickers, args.start_date, args.end_date, args.panel_dir)
+        print(f"[INFO] Panel: {panel['close'].shape[0]} dates x {panel['close'].shape[1]} tickers "
+              f"({int(panel['mask'].sum())} rows) in {args.panel_dir}")
+
+    if args.technicals_csv:
+        from technicals import calculate_technicals
+        df_technicals = calculate_technicals(store.read(args.tickers, args.start_date, args.end_date))
+        df_technicals.to_csv(args.technicals_csv, index=False)
+        print(f"[INFO] Technical data saved to {args.technicals_csv}")
+
+if __name__ == "__main__":
+    main()
+
+#### python price_store.py \
+#    --store_dir price_store --source wrds --panel_dir price_panels --technicals_csv technical_data.csv
@@ -0,0 +1,616 @@
+#!/apps/anaconda3/bin/python
+# technicals.py
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# Indicator columns, in the order calculate_technicals adds them
+OUTPUTS = ('SMA_20', 'EMA_12', 'RSI_14', 'EMA_26', 'MACD', 'MACD_signal', 'MACD_hist',
+           'BB_Middle', 'BB_Upper', 'BB_Lower')
+
+SMA_WINDOW = 20      # SMA_20 and the Bollinger bands
+RSI_WINDOW = 14
+BB_WIDTH = 2
+EMA_SPANS = {'EMA_12': 12, 'EMA_26': 26, 'MACD_signal': 9}
+RSI_LOSS_FLOOR = 1e-10
+
+# pandas flags a rolling variance as ill-conditioned (and recomputes the window) below this ratio
+INV_COND_TOL = np.finfo(np.float64).eps * 1e3
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Reference Version ----------------------------------
+# --------------------------------------------------------------------------------
+
+def calculate_technicals_reference(df):
+    """
+    calculate_technicals from price_pipeline_modified.ipynb (one ticker's rows), kept to check
+    the engine against: df.groupby('ticker', group_keys=False).apply(calculate_technicals_reference).
+    """
+    df = df.sort_values(by='date').copy()
+
+    df['SMA_20'] = df['close'].rolling(20, min_periods=1).mean()
+    df['EMA_12'] = df['close'].ewm(span=12, adjust=False).mean()
+
+    window = 14
+    delta = df['close'].diff(1)
+    gain = np.where(delta > 0, delta, 0)
+    loss = np.where(delta < 0, -delta, 0)
+
+    avg_gain = pd.Series(gain).rolling(window=window, min_periods=window).mean()
+    avg_loss = pd.Series(loss).rolling(window=window, min_periods=window).mean()
+    avg_loss = avg_loss.replace(0, 1e-10)
+
+    rs = avg_gain / avg_loss
+    df[f'RSI_{window}'] = 100 - (100 / (1 + rs.values))
+
+    df['EMA_26'] = df['close'].ewm(span=26, adjust=False).mean()
+    df['MACD'] = df['EMA_12'] - df['EMA_26']
+    df['MACD_signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
+    df['MACD_hist'] = df['MACD'] - df['MACD_signal']
+
+    df['BB_Middle'] = df['close'].rolling(window=20, min_periods=1).mean()
+    df['BB_Upper'] = df['BB_Middle'] + 2 * df['close'].rolling(window=20, min_periods=1).std()
+    df['BB_Lower'] = df['BB_Middle'] - 2 * df['close'].rolling(window=20, min_periods=1).std()
+
+    return df
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Running-State Kernels ------------------------------
+# --------------------------------------------------------------------------------
+# pandas' own online window kernels (Kahan-summed rolling mean, Welford rolling variance,
+# adjust=False EWM), vectorized across tickers. Every update is O(1) per ticker and performs
+# the same floating-point operations in the same order as pandas, so values match exactly.
+# `m` masks the tickers that receive a bar; the others keep their state.
+
+def new_mean_state(n):
+    return {'nobs': np.zeros(n, dtype=np.int64), 'sum': np.zeros(n), 'comp_add': np.zeros(n),
+            'comp_remove': np.zeros(n), 'neg': np.zeros(n, dtype=np.int64),
+            'same': np.zeros(n, dtype=np.int64), 'prev': np.full(n, np.nan)}
+
+def add_mean(st, val, m):
+    m = m & (val == val)
+    v = np.where(m, val, 0.0)
+    y = v - st['comp_add']
+    t = st['sum'] + y
+    st['comp_add'] = np.where(m, t - st['sum'] - y, st['comp_add'])
+    st['sum'] = np.where(m, t, st['sum'])
+    st['nobs'] += m
+    st['neg'] += m & np.signbit(v)
+    # pandas tracks runs of equal values and returns the value itself over a constant window
+    st['same'] = np.where(m, np.where(v == st['prev'], st['same'] + 1, 1), st['same'])
+    st['prev'] = np.where(m, v, st['prev'])
+
+def remove_mean(st, val, m):
+    m = m & (val == val)
+    v = np.where(m, val, 0.0)
+    y = -v - st['comp_remove']
+    t = st['sum'] + y
+    st['comp_remove'] = np.where(m, t - st['sum'] - y, st['comp_remove'])
+    st['sum'] = np.where(m, t, st['sum'])
+    st['nobs'] -= m
+    st['neg'] -= m & np.signbit(v)
+
+def calc_mean(st, minp):
+    nobs = st['nobs']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = st['sum'] / nobs
+    result = np.where(st['same'] >= nobs, st['prev'],
+                      np.where((st['neg'] == 0) & (result < 0), 0.0,
+                               np.where((st['neg'] == nobs) & (result > 0), 0.0, result)))
+    return np.where((nobs >= minp) & (nobs > 0), result, np.nan)
+
+def new_var_state(n):
+    return {'nobs': np.zeros(n), 'mean': np.zeros(n), 'ssqdm': np.zeros(n),
+            'comp_add': np.zeros(n), 'comp_remove': np.zeros(n)}
+
+def add_var(st, val, m, unstable):
+    m = m & (val == val)
+    v = np.where(m, val, 0.0)
+    nobs = st['nobs'] + m
+    prev_m2 = st['ssqdm']
+    comp = st['comp_add']
+    prev_mean = st['mean'] - comp
+    y = v - comp
+    t = y - st['mean']
+    new_comp = t + st['mean'] - y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = st['mean'] + t / nobs
+    ssqdm = prev_m2 + (v - prev_mean) * (v - mean)
+    st['nobs'] = nobs
+    st['comp_add'] = np.where(m, new_comp, comp)
+    st['mean'] = np.where(m, mean, st['mean'])
+    st['ssqdm'] = np.where(m, ssqdm, prev_m2)
+    unstable |= m & (prev_m2 * INV_COND_TOL > ssqdm)
+
+def remove_var(st, val, m, unstable):
+    m = m & (val == val)
+    v = np.where(m, val, 0.0)
+    nobs = st['nobs'] - m
+    keep = m & (nobs > 0)
+    emptied = m & (nobs == 0)
+    prev_m2 = st['ssqdm']
+    comp = st['comp_remove']
+    prev_mean = st['mean'] - comp
+    y = v - comp
+    t = y - st['mean']
+    new_comp = t + st['mean'] - y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = st['mean'] - t / nobs
+    ssqdm = prev_m2 - (v - prev_mean) * (v - mean)
+    st['nobs'] = nobs
+    st['comp_remove'] = np.where(keep, new_comp, comp)
+    st['mean'] = np.where(keep, mean, np.where(emptied, 0.0, st['mean']))
+    st['ssqdm'] = np.where(keep, ssqdm, np.where(emptied, 0.0, prev_m2))
+    unstable |= keep & (prev_m2 * INV_COND_TOL > ssqdm)
+    unstable &= ~emptied
+
+def calc_std(st, minp=1, ddof=1):
+    nobs = st['nobs']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = np.where((nobs >= minp) & (nobs > ddof), st['ssqdm'] / (nobs - ddof), np.nan)
+        return np.where(var < 0, 0.0, np.sqrt(var))
+
+def new_ewm_state(n):
+    return {'weighted': np.full(n, np.nan), 'old_wt': np.ones(n)}
+
+def update_ewm(st, cur, m, span):
+    """One ewm(span, adjust=False).mean() step (ignore_na=False: NaN bars still decay old_wt)."""
+    com = (span - 1) / 2.0
+    alpha = 1. / (1. + com)
+    old_wt_factor = 1. - alpha
+    weighted, old_wt = st['weighted'], st['old_wt']
+    obs = m & (cur == cur)
+    started = m & (weighted == weighted)
+    old_wt = np.where(started, old_wt * old_wt_factor, old_wt)
+    changed = started & obs & (weighted != cur)
+    with np.errstate(invalid='ignore'):
+        blended = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+    weighted = np.where(changed, blended, weighted)
+    old_wt = np.where(started & obs, 1., old_wt)
+    weighted = np.where(m & ~started & obs, cur, weighted)
+    st['weighted'], st['old_wt'] = weighted, old_wt
+    return np.where(m, weighted, np.nan)
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Indicator Engine -----------------------------------
+# --------------------------------------------------------------------------------
+
+class TechnicalsEngine:
+    """
+    Per-ticker running state of the calculate_technicals indicators (window sums, Welford
+    moments, EMA values, ring buffers of the last 20 closes and 14 RSI gains/losses), so one new
+    bar per ticker costs O(1) instead of a pass over the whole history.
+      - update(close, present) advances every ticker with a bar by one row and returns the
+        indicators of that row ([N] arrays, NaN for tickers without a bar).
+      - update_bars(df) does the same for long-format rows (ticker, date, close), adding
+        tickers it has not seen; save()/load() keep the state between daily runs.
+    Feeding a ticker's rows in date order gives exactly calculate_technicals' values for them.
+    """
+
+    def __init__(self, tickers=()):
+        self.tickers = []
+        self.state = {}
+        self.add_tickers(tickers)
+
+    def add_tickers(self, tickers):
+        """Append tickers with empty history."""
+        new = [t for t in tickers if t not in self.ticker_index]
+        if not new:
+            return
+        fresh = self._new_state(len(new))
+        if self.state:
+            self.state = {key: (np.concatenate([self.state[key], value], axis=-1) if not isinstance(value, dict)
+                                else {k: np.concatenate([self.state[key][k], v]) for k, v in value.items()})
+                          for key, value in fresh.items()}
+        else:
+            self.state = fresh
+        self.tickers.extend(new)
+
+    @property
+    def ticker_index(self):
+        return {t: i for i, t in enumerate(self.tickers)}
+
+    @staticmethod
+    def _new_state(n):
+        state = {'n_bars': np.zeros(n, dtype=np.int64), 'prev_close': np.full(n, np.nan),
+                 'closes': np.full((SMA_WINDOW, n), np.nan), 'gains': np.zeros((RSI_WINDOW, n)),
+                 'losses': np.zeros((RSI_WINDOW, n)),
+                 'sma': new_mean_state(n), 'gain': new_mean_state(n), 'loss': new_mean_state(n),
+                 'var': new_var_state(n)}
+        for name in EMA_SPANS:
+            state[name] = new_ewm_state(n)
+        return state
+
+    def _recompute_var(self, var, idx):
+        """Rebuild the variance of the tickers in idx from the closes in their window, as pandas does."""
+        part = {k: np.zeros(len(idx)) for k in var}
+        n_bars = self.state['n_bars'][idx]
+        window = np.minimum(n_bars, SMA_WINDOW)
+        unstable = np.zeros(len(idx), dtype=bool)
+        for k in range(SMA_WINDOW):
+            bar = n_bars - SMA_WINDOW + k
+            add_var(part, self.state['closes'][bar % SMA_WINDOW, idx], k >= SMA_WINDOW - window, unstable)
+        for key in var:
+            var[key][idx] = part[key]
+
+    def _advance(self, close, m):
+        """Advance the window state (everything but the EMAs) of the tickers in m by one bar."""
+        st = self.state
+        n_bars = st['n_bars']
+        cols = np.arange(len(close))
+
+        # Closes leaving the 20-day window, gains/losses leaving the 14-day window
+        full20, full14 = m & (n_bars >= SMA_WINDOW), m & (n_bars >= RSI_WINDOW)
+        old_close = st['closes'][n_bars % SMA_WINDOW, cols]
+        old_gain = st['gains'][n_bars % RSI_WINDOW, cols]
+        old_loss = st['losses'][n_bars % RSI_WINDOW, cols]
+
+        with np.errstate(invalid='ignore'):
+            delta = close - st['prev_close']
+            gain = np.where(delta > 0, delta, 0.0)
+            loss = np.where(delta < 0, -delta, 0.0)
+
+        # SMA_20 / BB_Middle (removal first, then the new close, as in pandas)
+        remove_mean(st['sma'], old_close, full20)
+        add_mean(st['sma'], close, m)
+
+        # Rolling std for the bands; first bar of a ticker and ill-conditioned windows recompute
+        var = st['var']
+        unstable = np.zeros(len(close), dtype=bool)
+        remove_var(var, old_close, full20, unstable)
+        add_var(var, close, m, unstable)
+        st['closes'][n_bars % SMA_WINDOW, cols] = np.where(m, close, old_close)
+        st['n_bars'] = n_bars + m
+        recompute = np.flatnonzero(m & (unstable | (n_bars == 0)))
+        if len(recompute):
+            self._recompute_var(var, recompute)
+
+        # RSI_14 gain/loss means
+        for key, value, old, ring in (('gain', gain, old_gain, 'gains'), ('loss', loss, old_loss, 'losses')):
+            remove_mean(st[key], old, full14)
+            add_mean(st[key], value, m)
+            st[ring][n_bars % RSI_WINDOW, cols] = np.where(m, value, old)
+        st['prev_close'] = np.where(m, close, st['prev_close'])
+
+    def update(self, close, present=None):
+        """
+        Advance the tickers with present=True (default: all) by one bar with these closes
+        ([N] arrays in self.tickers order). Returns {indicator: [N] array}.
+        """
+        close = np.asarray(close, dtype=np.float64)
+        m = np.ones(len(close), dtype=bool) if present is None else np.asarray(present, dtype=bool)
+        st = self.state
+        self._advance(close, m)
+
+        out = {}
+        sma_value = np.where(m, calc_mean(st['sma'], 1), np.nan)
+        out['SMA_20'] = sma_value
+        ema = {name: update_ewm(st[name], close, m, EMA_SPANS[name]) for name in ('EMA_12', 'EMA_26')}
+        out['EMA_12'] = ema['EMA_12']
+
+        avg_gain = calc_mean(st['gain'], RSI_WINDOW)
+        avg_loss = calc_mean(st['loss'], RSI_WINDOW)
+        avg_loss = np.where(avg_loss == 0, RSI_LOSS_FLOOR, avg_loss)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = avg_gain / avg_loss
+            out['RSI_14'] = np.where(m, 100 - (100 / (1 + rs)), np.nan)
+
+        out['EMA_26'] = ema['EMA_26']
+        out['MACD'] = ema['EMA_12'] - ema['EMA_26']
+        out['MACD_signal'] = update_ewm(st['MACD_signal'], out['MACD'], m, EMA_SPANS['MACD_signal'])
+        out['MACD_hist'] = out['MACD'] - out['MACD_signal']
+
+        std = np.where(m, calc_std(st['var']), np.nan)
+        out['BB_Middle'] = sma_value
+        out['BB_Upper'] = sma_value + BB_WIDTH * std
+        out['BB_Lower'] = sma_value - BB_WIDTH * std
+        return out
+
+    def update_bars(self, df, close_col='close'):
+        """
+        Advance the engine by long-format rows (ticker, date, close_col), each ticker's rows in
+        date order. Returns the rows, sorted by ticker then date, with the indicator columns added.
+        """
+        df = df.sort_values(['ticker', 'date'], kind='stable').copy()
+        self.add_tickers(pd.unique(df['ticker']))
+        col = df['ticker'].map(self.ticker_index).to_numpy(dtype=np.intp)
+        slot = df.groupby('ticker', sort=False).cumcount().to_numpy()
+        n_slots = int(slot.max()) + 1 if len(df) else 0
+
+        close = np.full((n_slots, len(self.tickers)), np.nan)
+        present = np.zeros((n_slots, len(self.tickers)), dtype=bool)
+        close[slot, col] = df[close_col].to_numpy(dtype=np.float64)
+        present[slot, col] = True
+        values = {name: np.empty((n_slots, len(self.tickers))) for name in OUTPUTS}
+        for k in range(n_slots):
+            out = self.update(close[k], present[k])
+            for name in OUTPUTS:
+                values[name][k] = out[name]
+        for name in OUTPUTS:
+            df[name] = values[name][slot, col]
+        return df
+
+    def save(self, path):
+        """Write tickers and state to an .npz file."""
+        flat = {}
+        for key, value in self.state.items():
+            if isinstance(value, dict):
+                flat.update({f'{key}/{k}': v for k, v in value.items()})
+            else:
+                flat[key] = value
+        np.savez(path, tickers=np.asarray(self.tickers, dtype=str), **flat)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            engine = cls()
+            engine.tickers = data['tickers'].tolist()
+            for key in data.files:
+                if '/' in key:
+                    group, name = key.split('/')
+                    engine.state.setdefault(group, {})[name] = data[key].copy()
+                elif key != 'tickers':
+                    engine.state[key] = data[key].copy()
+        return engine
+
+    @classmethod
+    def seed(cls, tickers, close, n_bars, values):
+        """
+        Engine state after each ticker's backfilled bars, for daily update() calls to carry on from.
+        close is the [S, N] slot layout (column j = ticker j's first n_bars[j] bars) and values the
+        indicators technicals_frame computed from it.
+          - The EMAs are read off the last backfilled values (their weights off the NaN bars since
+            the last close).
+          - The window sums and moments are replayed bar by bar (_advance, no outputs): pandas runs
+            its Kahan / Welford accumulators over the whole series without restarting, so their
+            rounding depends on every earlier bar, not just the last window.
+        """
+        engine = cls(tickers)
+        close = np.asarray(close, dtype=np.float64)
+        n_bars = np.asarray(n_bars, dtype=np.int64)
+        S, N = close.shape
+        for t in range(int(n_bars.max()) if N else 0):
+            engine._advance(close[t], t < n_bars)
+        if S == 0:
+            return engine
+
+        cols = np.arange(N)
+        last = np.maximum(n_bars - 1, 0)
+        in_history = np.arange(S)[:, None] < n_bars
+        for name, span in EMA_SPANS.items():
+            source = values['MACD'] if name == 'MACD_signal' else close
+            observed = in_history & (source == source)
+            seen = observed.any(axis=0)
+            since = np.where(seen, n_bars - 1 - (S - 1 - np.argmax(observed[::-1], axis=0)), 0)
+            # update_ewm decays old_wt once per bar after the last observation (a 1 on each one)
+            old_wt_factor = 1. - 1. / (1. + (span - 1) / 2.0)
+            old_wt = np.ones(N)
+            for k in range(int(since.max()) if N else 0):
+                old_wt = np.where(k < since, old_wt * old_wt_factor, old_wt)
+            weighted = np.where(n_bars > 0, values[name][last, cols], np.nan)
+            engine.state[name] = {'weighted': weighted, 'old_wt': old_wt}
+        return engine
+
+def technicals_frame(close):
+    """
+    calculate_technicals_reference's indicators for every column of an [S, N] slot layout
+    (column j = ticker j's bars in date order, NaN-padded after its last bar) at once: the same
+    column-wise pandas rolling/ewm kernels, so each column equals its ticker's groupby-apply
+    values exactly (padding only follows a ticker's bars, so it never reaches them).
+    Returns {indicator: [S, N] array}.
+    """
+    close = pd.DataFrame(np.asarray(close, dtype=np.float64))
+    out = {}
+    sma = close.rolling(SMA_WINDOW, min_periods=1).mean()
+    out['SMA_20'] = sma.to_numpy()
+    ema_12 = close.ewm(span=EMA_SPANS['EMA_12'], adjust=False).mean()
+    out['EMA_12'] = ema_12.to_numpy()
+
+    delta = close.diff(1).to_numpy()
+    gain = np.where(delta > 0, delta, 0)
+    loss = np.where(delta < 0, -delta, 0)
+    avg_gain = pd.DataFrame(gain).rolling(window=RSI_WINDOW, min_periods=RSI_WINDOW).mean()
+    avg_loss = pd.DataFrame(loss).rolling(window=RSI_WINDOW, min_periods=RSI_WINDOW).mean()
+    avg_loss = avg_loss.replace(0, RSI_LOSS_FLOOR)
+    rs = avg_gain / avg_loss
+    out['RSI_14'] = 100 - (100 / (1 + rs.to_numpy()))
+
+    ema_26 = close.ewm(span=EMA_SPANS['EMA_26'], adjust=False).mean()
+    out['EMA_26'] = ema_26.to_numpy()
+    macd = ema_12 - ema_26
+    out['MACD'] = macd.to_numpy()
+    macd_signal = macd.ewm(span=EMA_SPANS['MACD_signal'], adjust=False).mean()
+    out['MACD_signal'] = macd_signal.to_numpy()
+    out['MACD_hist'] = (macd - macd_signal).to_numpy()
+
+    std = close.rolling(window=SMA_WINDOW, min_periods=1).std()
+    out['BB_Middle'] = out['SMA_20']
+    out['BB_Upper'] = (sma + BB_WIDTH * std).to_numpy()
+    out['BB_Lower'] = (sma - BB_WIDTH * std).to_numpy()
+    return out
+
+def technicals_batch(close, present=None):
+    """
+    Backfill over a [T, N] close matrix (row t = each ticker's t-th bar, or a date grid with
+    present marking the tickers that trade that day). Returns ({indicator: [T, N]}, engine);
+    the engine holds the state after the last row, ready for daily update() calls.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    T, N = close.shape
+    if present is None:
+        values = technicals_frame(close)
+        return values, TechnicalsEngine.seed(range(N), close, np.full(N, T), values)
+
+    # Each ticker's bars packed to the top of its column, then spread back onto the date grid
+    present = np.asarray(present, dtype=bool)
+    slot = np.cumsum(present, axis=0) - 1
+    n_bars = present.sum(axis=0)
+    rows, cols = np.nonzero(present)
+    packed = np.full((int(n_bars.max()) if N else 0, N), np.nan)
+    packed[slot[rows, cols], cols] = close[rows, cols]
+    values = technicals_frame(packed)
+    out = {}
+    for name in OUTPUTS:
+        out[name] = np.full((T, N), np.nan)
+        out[name][rows, cols] = values[name][slot[rows, cols], cols]
+    return out, TechnicalsEngine.seed(range(N), packed, n_bars, values)
+
+def bars_layout(df, close_col='close'):
+    """
+    Long-format rows (ticker, date, close_col) sorted by ticker then date (stable), and their slot
+    layout: (rows, tickers, slot, col, [S, N] closes, n_bars per ticker).
+    """
+    df = df.sort_values(['ticker', 'date'], kind='stable').copy()
+    tickers = list(pd.unique(df['ticker']))
+    col = df['ticker'].map({t: i for i, t in enumerate(tickers)}).to_numpy(dtype=np.intp)
+    slot = df.groupby('ticker', sort=False).cumcount().to_numpy()
+    n_bars = np.bincount(col, minlength=len(tickers))
+    close = np.full((int(n_bars.max()) if len(df) else 0, len(tickers)), np.nan)
+    close[slot, col] = df[close_col].to_numpy(dtype=np.float64)
+    return df, tickers, slot, col, close, n_bars
+
+def backfill_technicals(df, close_col='close'):
+    """
+    calculate_technicals plus a TechnicalsEngine seeded with every ticker's state after its last
+    row, to save and advance one bar at a time in daily runs. Returns (rows, engine).
+    """
+    df, tickers, slot, col, close, n_bars = bars_layout(df, close_col)
+    values = technicals_frame(close)
+    for name in OUTPUTS:
+        df[name] = values[name][slot, col]
+    return df, TechnicalsEngine.seed(tickers, close, n_bars, values)
+
+def calculate_technicals(df):
+    """
+    Drop-in for df.groupby('ticker', group_keys=False).apply(calculate_technicals): every
+    ticker's rows by date, with the same indicator values, from one column-wise pass of the
+    pandas kernels over all tickers (technicals_frame).
+    Rows sharing a (ticker, date) keep their input order (the notebook's sort is not stable).
+    """
+    df, _, slot, col, close, _ = bars_layout(df)
+    values = technicals_frame(close)
+    for name in OUTPUTS:
+        df[name] = values[name][slot, col]
+    return df
+
+# --------------------------------------------------------------------------------
+# ------------------------- 4. Golden Check & Benchmark ---------------------------
+# --------------------------------------------------------------------------------
+
+def synthetic_prices(T=2000, n_tickers=45, seed=0):
+    """
+    Long-format (ticker, date, close) random walks with late listings, missing days, NaN
+    closes, flat stretches and a negative (CRSP bid/ask average) price series.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2017-01-02', periods=T)
+    frames = []
+    for i in range(n_tickers):
+        close = 100 * np.cumprod(1 + rng.standard_normal(T) * 0.02)
+        if i % 4 == 0:
+            close = np.round(close, 1)
+        if i % 5 == 0:
+            close[rng.random(T) < 0.01] = np.nan
+        if i % 7 == 0:
+            close[100:160] = close[100]
+        if i == 1:
+            close = -close
+        keep = (np.arange(T) >= rng.integers(0, T // 4)) & (rng.random(T) > 0.02)
+        frames.append(pd.DataFrame({'ticker': f'T{i:03d}', 'date': dates[keep], 'close': close[keep]}))
+    return pd.concat(frames, ignore_index=True).sample(frac=1.0, random_state=0)
+
+def compare(ref, new):
+    """Indicator columns that are not bit-identical (NaN equal to NaN)."""
+    return [name for name in OUTPUTS
+            if not np.array_equal(ref[name].to_numpy(), new[name].to_numpy(), equal_nan=True)]
+
+def compare_states(a, b):
+    """State arrays of two engines that are not bit-identical (NaN equal to NaN)."""
+    if a.tickers != b.tickers:
+        return ['tickers']
+    flat = lambda e: {f'{k}/{kk}' if isinstance(v, dict) else k: (vv if isinstance(v, dict) else v)
+                      for k, v in e.state.items() for kk, vv in (v.items() if isinstance(v, dict) else [(None, v)])}
+    fa, fb = flat(a), flat(b)
+    return [key for key in fa if key not in fb or not np.array_equal(fa[key], fb[key], equal_nan=True)]
+
+def main():
+    """
+    Check the backfill against the notebook's calculate_technicals, the engine state it seeds
+    against a bar-by-bar engine run, and one-bar daily updates through a saved state file
+    against the full backfill; then time them.
+    Exits with status 1 if any indicator differs.
+    """
+    parser = argparse.ArgumentParser(
+        description="Golden check and timing for the streaming technical indicator engine."
+    )
+    parser.add_argument("--input", default=None,
+                        help="Optional price table (.csv or .parquet) with ticker, date, close "
+                             "(default: synthetic random walks).")
+    parser.add_argument("--T", type=int, default=2000, help="Days of synthetic data.")
+    parser.add_argument("--n_tickers", type=int, default=45, help="Number of synthetic tickers.")
+    parser.add_argument("--daily_updates", type=int, default=20,
+                        help="Trailing days fed one bar at a time through update_bars.")
+    parser.add_argument("--state_file", default="technicals_state.npz", help="Where to save the engine state.")
+    args = parser.parse_args()
+
+    if args.input:
+        df = pd.read_parquet(args.input) if args.input.endswith('.parquet') else pd.read_csv(args.input)
+        df = df[['ticker', 'date', 'close']].drop_duplicates()
+        df['date'] = pd.to_datetime(df['date'])
+    else:
+        df = synthetic_prices(args.T, args.n_tickers)
+    print(f"[INFO] {len(df)} rows, {df['ticker'].nunique()} tickers.")
+
+    t0 = time.perf_counter()
+    ref = df.groupby('ticker', group_keys=False).apply(calculate_technicals_reference)
+    t_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = calculate_technicals(df)
+    t_new = time.perf_counter() - t0
+
+    bad = compare(ref, new) if ref.index.equals(new.index) else ['row order']
+    if bad:
+        print(f"[ERROR] Batch indicators differ from calculate_technicals: {', '.join(bad)}")
+        raise SystemExit(1)
+    print("[INFO] Golden check passed: batch indicators match calculate_technicals exactly.")
+    print(f"[INFO] groupby-apply: {t_ref:.3f}s, column-wise backfill: {t_new:.3f}s ({t_ref / t_new:.1f}x)")
+
+    # Backfill all but the last days (seeding the engine), then one bar per ticker per day from a reloaded state
+    days = np.sort(df['date'].unique())
+    split = days[-args.daily_updates] if 0 < args.daily_updates < len(days) else days[-1]
+    t0 = time.perf_counter()
+    _, engine = backfill_technicals(df[df['date'] < split])
+    t_seed = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    stepped = TechnicalsEngine()
+    stepped.update_bars(df[df['date'] < split])
+    t_stepped = time.perf_counter() - t0
+    bad = compare_states(stepped, engine)
+    if bad:
+        print(f"[ERROR] Seeded engine state differs from a bar-by-bar run: {', '.join(bad)}")
+        raise SystemExit(1)
+    print("[INFO] Golden check passed: the seeded engine state matches a bar-by-bar run.")
+    print(f"[INFO] bar-by-bar engine: {t_stepped:.3f}s, backfill + seeded engine: {t_seed:.3f}s "
+          f"({t_stepped / t_seed:.1f}x)")
+    engine.save(args.state_file)
+    t0 = time.perf_counter()
+    updates = []
+    for day in days[days >= split]:
+        engine = TechnicalsEngine.load(args.state_file)
+        updates.append(engine.update_bars(df[df['date'] == day]))
+        engine.save(args.state_file)
+    t_daily = (time.perf_counter() - t0) / max(len(updates), 1)
+    streamed = pd.concat(updates)
+    expected = new.loc[streamed.index]
+    bad = compare(expected, streamed)
+    if bad:
+        print(f"[ERROR] Daily updates differ from the full backfill: {', '.join(bad)}")
+        raise SystemExit(1)
+    print(f"[INFO] Golden check passed: {len(updates)} daily updates from the saved state match the backfill.")
+    print(f"[INFO] one daily update (load state, {df['ticker'].nunique()} bars, save state): "
+          f"{t_daily * 1e3:.2f} ms vs {t_ref * 1e3:.0f} ms to recompute the full history")
+
+if __name__ == "__main__":
+    main()
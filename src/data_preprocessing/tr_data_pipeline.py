@@ -6,12 +6,25 @@ import sys
 import re
 import json
 import gc
+import time
+import hashlib
+import tempfile
 import argparse
 import pytz
 import traceback
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, date
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dateutil.relativedelta import relativedelta
+from news_store import NewsStoreWriter, remove_parts, pivot_news_texts
+from dedup_index import DedupIndex, report as dedup_report
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, Holiday, GoodFriday, USMartinLutherKingJr, USPresidentsDay,
+    USMemorialDay, USLaborDay, USThanksgivingDay, nearest_workday, sunday_to_monday
+)
 
 # --------------------------------------------------------------------------------
 # ------------------------- 1. Pipeline Configuration -----------------------------
@@ -24,9 +37,52 @@ TICKER_UNIVERSE = [
     'COP', 'BA', 'UNP', 'HON', 'NEE', 'DUK', 'SO', 'PLD', 'AMT', 'CCI', 'LIN', 'SHW', 'DOW'
 ]
 
+# Set view of the universe for membership tests
+TICKER_UNIVERSE_SET = frozenset(TICKER_UNIVERSE)
+
+# RIC -> ticker for codes the leading-capitals rule would cut or misread (share classes etc.).
+# RICs not listed here resolve to their leading capital letters ("MSFT.O" -> "MSFT").
+RIC_TICKER_MAP = {
+    'BRKa.N': 'BRK.A',
+    'BRKb.N': 'BRK.B',
+    'BFa.N': 'BF.A',
+    'BFb.N': 'BF.B'
+}
+TICKER_PREFIX_RE = re.compile(r'[A-Z]+')
+
 DATE_MASK = '[DATE]'
 COMPANY_MASK = '[COMPANY]'
 
+# NYSE session calendar used to roll news onto trading days (holidays as well as weekends)
+EST_TZ = pytz.timezone('America/New_York')
+SESSION_CALENDAR_START = '2000-01-01'
+SESSION_CALENDAR_END = '2040-12-31'
+NYSE_SPECIAL_CLOSURES = [
+    '2001-09-11', '2001-09-12', '2001-09-13', '2001-09-14',  # September 11
+    '2004-06-11',                                            # President Reagan's funeral
+    '2007-01-02',                                            # President Ford's funeral
+    '2012-10-29', '2012-10-30',                              # Hurricane Sandy
+    '2018-12-05',                                            # President G.H.W. Bush's funeral
+    '2025-01-09'                                             # President Carter's funeral
+]
+# Distinct timestamp strings remembered by convert_to_est_trading_day
+TIMESTAMP_CACHE_SIZE = 1 << 18
+
+# Bump whenever a change alters the Parquet outputs: the manifest reprocesses every file on a new version
+PIPELINE_VERSION = '2.0'
+# Written to --output_dir; records what each input file was last processed with
+MANIFEST_NAME = 'pipeline_manifest.json'
+# Output formats: the wide trading_day x ticker pivot, the long news store (news_store.py), or both
+OUTPUT_FORMATS = ('pivot', 'long', 'both')
+# Long news store root, inside --output_dir
+NEWS_STORE_DIR = 'news_store'
+
+# Streaming mode: characters read per chunk and articles buffered per Parquet flush
+STREAM_READ_CHUNK = 1 << 20
+STREAM_BATCH_SIZE = 5000
+# Characters that can follow a complete bare number or literal in JSON
+SCALAR_DELIMITERS = frozenset(',]} \t\r\n')
+
 COMPANY_MASK_PATTERNS = {
     'AAPL': r'\b(Apple(?:\s+Inc\.?)?|AAPL)\b',
     'MSFT': r'\b(Microsoft(?:\s+Corp(?:oration)?\.?)?|MSFT)\b',
@@ -223,6 +279,138 @@ def load_json_data(file_path):
         data = json.load(f)
     return data
 
+def iter_json_items(file_path, key='Items', chunk_size=STREAM_READ_CHUNK):
+    """
+    Yield the elements of the top-level `key` array one at a time without loading the whole file.
+    The file is read in chunks of `chunk_size` characters; only the current article (plus one chunk)
+    is held in memory. Other top-level keys are decoded and discarded.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r') as f:
+        buf = ''
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            if eof:
+                return False
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            # Drop the consumed prefix so the buffer never grows beyond one item plus one chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        def next_char():
+            # Skip whitespace and return the next significant character (None at EOF)
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if not fill():
+                    return None
+
+        def decode_value():
+            nonlocal pos
+            next_char()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if not fill():
+                        raise
+                    continue
+                # Objects, arrays and strings end on their own closing character. A bare number or
+                # literal cut at the chunk boundary ("1." + "5", "2e-" + "7") may still decode as a
+                # shorter value, so accept it only once a delimiter follows it (or at EOF)
+                if (not isinstance(value, (dict, list, str))
+                        and (end == len(buf) or buf[end] not in SCALAR_DELIMITERS) and fill()):
+                    continue
+                pos = end
+                return value
+
+        if next_char() != '{':
+            raise ValueError(f"{file_path} is not a JSON object")
+        pos += 1
+        while True:
+            c = next_char()
+            if c == '}' or c is None:
+                return
+            if c == ',':
+                pos += 1
+                continue
+            name = decode_value()
+            if next_char() != ':':
+                raise ValueError(f"Malformed JSON near key {name!r} in {file_path}")
+            pos += 1
+            if name != key:
+                decode_value()
+                continue
+            if next_char() != '[':
+                raise ValueError(f"'{key}' in {file_path} is not an array")
+            pos += 1
+            while True:
+                c = next_char()
+                if c == ']':
+                    pos += 1
+                    break
+                if c is None:
+                    raise ValueError(f"Unterminated '{key}' array in {file_path}")
+                if c == ',':
+                    pos += 1
+                    continue
+                yield decode_value()
+
+def check_iter_json_items(max_chunk_size=8):
+    """
+    Compare iter_json_items against json.load at every chunk size 1..max_chunk_size, on documents
+    whose numbers, literals, strings and non-Items keys straddle chunk boundaries.
+    Returns the list of (document, chunk_size, got, expected) mismatches.
+    """
+    documents = [
+        '{"Items": [1.5, 2e-7, -3]}',
+        '{"A": 1.5, "Items": [1]}',
+        '{"Items":[{"x":1}],"After":2.5}',
+        '{"Items": [true, false, null, -0.25E+10, 1234567890, "a,]}b"]}',
+        '{ "Before" : [1.0e5, {"y": null}] ,\n "Items" : [ {"data": {"n": 10.75}} , 3.14159 ] }',
+        '{"Items": []}',
+    ]
+    mismatches = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'items.json')
+        for document in documents:
+            with open(path, 'w') as f:
+                f.write(document)
+            expected = json.loads(document)['Items']
+            for chunk_size in range(1, max_chunk_size + 1):
+                try:
+                    got = list(iter_json_items(path, chunk_size=chunk_size))
+                except (ValueError, json.JSONDecodeError) as e:
+                    got = f"{type(e).__name__}: {e}"
+                if got != expected:
+                    mismatches.append((document, chunk_size, got, expected))
+    return mismatches
+
+def ticker_from_subject(subject):
+    """
+    Ticker for a TR subject code, or None if the code is not a ticker ("R:" prefix).
+    RIC_TICKER_MAP is checked first, then the leading capitals of the RIC are used.
+    """
+    if not subject.startswith("R:"):
+        return None
+    ric = subject[2:]
+    ticker = RIC_TICKER_MAP.get(ric)
+    if ticker is None:
+        match = TICKER_PREFIX_RE.match(ric)
+        if match:
+            ticker = match.group()
+    return ticker
+
 def extract_tickers_from_subjects(subjects):
     """
     Extract ticker symbols from TR subject codes.
@@ -230,34 +418,83 @@ def extract_tickers_from_subjects(subjects):
     """
     tickers = []
     for subj in subjects:
-        if subj.startswith("R:"):
-            ticker_raw = subj[2:]
-            match = re.match(r'([A-Z]+)', ticker_raw)
-            if match:
-                tickers.append(match.group(1))
+        ticker = ticker_from_subject(subj)
+        if ticker:
+            tickers.append(ticker)
     return tickers
 
+def article_universe_tickers(article, universe=TICKER_UNIVERSE_SET):
+    """
+    Single pass over an article's subject codes: the tickers in `universe` (a set),
+    in first-seen order and without repeats (e.g. "R:MSFT.O" and "R:MSFT.OQ" give one MSFT).
+    """
+    tickers = {}
+    for subj in article.get('data', {}).get('subjects', []):
+        if subj.startswith("R:"):
+            ticker = ticker_from_subject(subj)
+            if ticker in universe:
+                tickers[ticker] = None
+    return list(tickers)
+
 def filter_article_by_universe(article, universe):
     """
     Return True if the article's subject codes (tickers) intersect with our universe.
     """
-    subjects = article.get('data', {}).get('subjects', [])
-    tickers_in_article = extract_tickers_from_subjects(subjects)
-    return any(ticker in universe for ticker in tickers_in_article)
+    if not isinstance(universe, (set, frozenset)):
+        universe = frozenset(universe)
+    return bool(article_universe_tickers(article, universe))
 
+def nyse_holiday_calendar():
+    """
+    Full-day NYSE closures: the regular holiday rules plus one-off closures.
+    Early (1pm) closes are regular sessions here.
+    """
+    class NYSEHolidayCalendar(AbstractHolidayCalendar):
+        rules = [
+            Holiday('New Year\'s Day', month=1, day=1, observance=sunday_to_monday),
+            USMartinLutherKingJr,
+            USPresidentsDay,
+            GoodFriday,
+            USMemorialDay,
+            Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+            Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+            USLaborDay,
+            USThanksgivingDay,
+            Holiday('Christmas Day', month=12, day=25, observance=nearest_workday)
+        ]
+    return NYSEHolidayCalendar()
+
+@lru_cache(maxsize=1)
+def nyse_sessions():
+    """
+    Sorted DatetimeIndex of NYSE trading sessions between SESSION_CALENDAR_START and SESSION_CALENDAR_END.
+    """
+    holidays = nyse_holiday_calendar().holidays(SESSION_CALENDAR_START, SESSION_CALENDAR_END)
+    holidays = holidays.union(pd.DatetimeIndex(NYSE_SPECIAL_CLOSURES))
+    sessions = pd.bdate_range(SESSION_CALENDAR_START, SESSION_CALENDAR_END)
+    return sessions[~sessions.isin(holidays)]
+
+@lru_cache(maxsize=1)
+def nyse_session_dates():
+    """
+    The sessions of nyse_sessions() as a frozenset of datetime.date, for scalar lookups.
+    """
+    return frozenset(nyse_sessions().date)
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
 def convert_to_est_trading_day(utc_timestamp_str):
     """
     Convert a UTC timestamp (ISO string) to EST and determine the trading day.
     If the local (EST) time is after 4pm, the news is assigned to the next trading day.
-    Also, if the trading day falls on a weekend, shift to Monday.
+    Also, if the trading day falls on a weekend or an NYSE holiday, shift to the next session.
+    Cached on the exact string: wire stories are often re-sent with the same timestamp.
     """
     utc_timestamp_str = utc_timestamp_str.rstrip('Z')
     utc_dt = datetime.fromisoformat(utc_timestamp_str)
     # Attach UTC tzinfo
     utc_dt = utc_dt.replace(tzinfo=pytz.UTC)
 
-    est_tz = pytz.timezone('America/New_York')
-    est_dt = utc_dt.astimezone(est_tz)
+    est_dt = utc_dt.astimezone(EST_TZ)
 
     # 4pm cutoff
     cutoff = est_dt.replace(hour=16, minute=0, second=0, microsecond=0)
@@ -266,12 +503,42 @@ def convert_to_est_trading_day(utc_timestamp_str):
     else:
         trading_day = est_dt.date()
 
-    # Shift forward if Saturday/Sunday
-    while trading_day.weekday() >= 5:
-        trading_day += pd.Timedelta(days=1)
+    # Shift forward past weekends and holidays
+    sessions = nyse_session_dates()
+    if SESSION_CALENDAR_START <= trading_day.isoformat() <= SESSION_CALENDAR_END:
+        while trading_day not in sessions:
+            trading_day += pd.Timedelta(days=1)
+    else:
+        # Outside the calendar: weekends only
+        while trading_day.weekday() >= 5:
+            trading_day += pd.Timedelta(days=1)
 
     return trading_day
 
+def assign_trading_days(utc_timestamps):
+    """
+    Vectorized convert_to_est_trading_day for an array/list of UTC timestamps
+    (ISO strings or datetimes; naive values are taken as UTC).
+      - Convert to New York time in one pass, then apply the 4pm cutoff.
+      - Roll each day forward to the next NYSE session with one searchsorted.
+    Returns a numpy object array of datetime.date, aligned with the input.
+    """
+    utc = pd.to_datetime(pd.Series(utc_timestamps, dtype=object), utc=True, format='ISO8601')
+    local = utc.dt.tz_convert(EST_TZ)
+    days = local.dt.tz_localize(None).dt.normalize()
+    days = days + pd.to_timedelta((local.dt.hour >= 16).astype('int64'), unit='D')
+
+    # Outside the session calendar only weekends roll, as in convert_to_est_trading_day
+    weekday = days.dt.weekday
+    rolled = days + pd.to_timedelta((7 - weekday).where(weekday >= 5, 0), unit='D')
+    out = rolled.dt.date.to_numpy(copy=True)
+
+    sessions = nyse_sessions()
+    inside = ((days >= pd.Timestamp(SESSION_CALENDAR_START))
+              & (days <= pd.Timestamp(SESSION_CALENDAR_END))).to_numpy()
+    out[inside] = sessions[sessions.searchsorted(days[inside].to_numpy(), side='left')].date
+    return out
+
 def mask_dates(text):
     """
     Replace date/time patterns with stricter rules, plus month/year detection.
@@ -321,121 +588,500 @@ def mask_products(text, ticker):
         text = re.sub(pat, product_mask, text, flags=re.IGNORECASE)
     return text
 
-def mask_text(text, ticker):
+def mask_text_reference(text, ticker):
     """
-    Apply date masking, company masking, and product masking.
+    Apply date masking, company masking, and product masking one re.sub pass at a time.
+    This is the reference behaviour the compiled engine below must reproduce.
     """
     text = mask_dates(text)
     text = mask_company(text, ticker)
     text = mask_products(text, ticker)
     return text
 
+# ---- Compiled masking engine ----
+# mask_dates runs six passes in a fixed order, each on the output of the previous one.
+# DATE_SCAN_RE does all of them in one scan: alternatives are tried in the same order,
+# and lookaheads stop a later alternative from taking digits an earlier pass would have
+# masked first (e.g. "Jan 12:30" is "[MONTH] [TIME]", not "[DATE]:30").
+# The scan opens with one character class (digits and month initials, plus 'ſ', which re
+# matches to 's' case-insensitively) so re can skip non-candidate positions in C;
+# (?<!\w.) after it is the leading \b, and lookbehinds pick the branch for that character.
+_NUMERIC_DATE = r'\b(?:\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{4}[/-]\d{1,2}[/-]\d{1,2})\b'
+_TIME = rf'\b\d{{1,2}}:(?!{_NUMERIC_DATE})\d{{2}}(?::(?!{_NUMERIC_DATE})\d{{2}})?\b'
+_MONTH_NAMES = ['Jan(?:uary)?', 'Feb(?:ruary)?', 'Mar(?:ch)?', 'Apr(?:il)?', 'May', 'Jun(?:e)?',
+                'Jul(?:y)?', 'Aug(?:ust)?', 'Sep(?:tember)?', 'Oct(?:ober)?', 'Nov(?:ember)?', 'Dec(?:ember)?']
+_MONTH_AFTER_INITIAL = '(?:' + '|'.join(f'(?<={name[0].lower()}){name[1:]}' for name in _MONTH_NAMES) + ')'
+_NUMERIC_DAY = r'\d{1,2}(?:st|nd|rd|th)?'
+_ORDINAL_DAY = r'(?:first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|' \
+               r'eleventh|twelfth|thirteenth|fourteenth|fifteenth|sixteenth|seventeenth|' \
+               r'eighteenth|nineteenth|twentieth|twenty[-\s]first|twenty[-\s]second|' \
+               r'twenty[-\s]third|twenty[-\s]fourth)'
+
+DATE_SCAN_RE = re.compile(
+    r'[\dJjFfMmAaSsſOoNnDd](?<!\w.)(?:'
+    r'(?<=\d)(?:'
+    r'(?P<date>(?:\d?[/-]\d{1,2}[/-]\d{2,4}|\d{3}[/-]\d{1,2}[/-]\d{1,2})\b)'
+    rf'|(?P<time>\d?:(?!{_NUMERIC_DATE})\d{{2}}(?::(?!{_NUMERIC_DATE})\d{{2}})?\b)'
+    r'|(?P<year>(?:(?<=1)9|(?<=2)0)\d{2}\b)'
+    rf')|(?i:{_MONTH_AFTER_INITIAL}(?:'
+    rf'(?P<month_day>\s+(?!{_NUMERIC_DATE}|{_TIME}){_NUMERIC_DAY}\b)'
+    rf'|(?P<month_ordinal>\s+{_ORDINAL_DAY}\b)'
+    r'|(?P<month>\b)'
+    r')))'
+)
+DATE_SCAN_MASKS = {
+    'date': DATE_MASK,
+    'time': '[TIME]',
+    'month_day': DATE_MASK,
+    'month_ordinal': DATE_MASK,
+    'month': '[MONTH]',
+    'year': '[YEAR]'
+}
+
+# Characters that re matches to an ASCII letter case-insensitively but str.lower() does not
+# lower to one; texts containing them skip the keyword prefilter in mask_entities
+CASEFOLD_SPECIAL_CHARS = ('\u0130', '\u0131', '\u017f', '\u212a')
+
+# Per-ticker compiled entity passes, built on first use
+_ENTITY_PASSES = {}
+
+def mask_dates_compiled(text):
+    """
+    Single-scan equivalent of mask_dates.
+    """
+    return DATE_SCAN_RE.sub(lambda m: DATE_SCAN_MASKS[m.lastgroup], text)
+
+def pattern_keywords(pattern):
+    """
+    Return the lowercase literal words a pattern's matches must start with, one per
+    top-level alternative, e.g. r'\b(Apple(?:\s+Inc\.?)?|AAPL)\b' -> ['apple', 'aapl'].
+    Returns None if some alternative does not start with a literal word.
+    """
+    body = pattern
+    if body.startswith(r'\b(') and body.endswith(r')\b'):
+        body = body[3:-3]
+
+    # Split on top-level '|'
+    alternatives, depth, start = [], 0, 0
+    for i, ch in enumerate(body):
+        if ch == '\\':
+            continue
+        if i > 0 and body[i - 1] == '\\':
+            continue
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == '|' and depth == 0:
+            alternatives.append(body[start:i])
+            start = i + 1
+    alternatives.append(body[start:])
+
+    keywords = []
+    for alt in alternatives:
+        word = re.match(r'[A-Za-z0-9]*', alt).group()
+        # A quantifier applies to the last character only, so it is not required
+        if alt[len(word):len(word) + 1] in ('?', '*', '{'):
+            word = word[:-1]
+        if not word:
+            return None
+        keywords.append(word.lower())
+    return keywords
+
+def build_entity_passes(ticker):
+    """
+    Compile the company pattern and product patterns of a ticker once, in the order
+    mask_company / mask_products apply them.
+    Returns a list of (compiled pattern, mask, keywords) tuples; keywords is None when
+    the pass has to run on every text.
+    """
+    patterns = [(COMPANY_MASK_PATTERNS.get(ticker, rf'\b{re.escape(ticker)}\b'), COMPANY_MASK)]
+    patterns.extend(PRODUCT_MASK_PATTERNS.get(ticker, {}).items())
+    mask_text_lower = ' '.join(mask.lower() for _, mask in patterns)
+
+    passes = []
+    for pat, mask in patterns:
+        keywords = pattern_keywords(pat)
+        # A keyword that a replacement can introduce is no proof of absence
+        if keywords is not None and any(k in mask_text_lower for k in keywords):
+            keywords = None
+        passes.append((re.compile(pat, flags=re.IGNORECASE), mask, keywords))
+    return passes
+
+def keyword_view(text):
+    """
+    Lowercased text for the keyword prefilter in mask_entities, or None if the text has
+    characters that lowercasing would not match the way re does.
+    """
+    if any(ch in text for ch in CASEFOLD_SPECIAL_CHARS):
+        return None
+    return text.lower()
+
+def mask_entities(text, ticker, lowered=False):
+    """
+    Equivalent of mask_company followed by mask_products with precompiled patterns.
+    A pass only runs if one of its keywords occurs in the lowercased text: a match must
+    contain its keyword, and no replacement token can create one, so skipping is exact.
+    `lowered` can pass in keyword_view(text) when the same text is masked for several tickers.
+    Returns `text` itself (same object) when nothing is masked.
+    """
+    passes = _ENTITY_PASSES.get(ticker)
+    if passes is None:
+        passes = _ENTITY_PASSES[ticker] = build_entity_passes(ticker)
+
+    if lowered is False:
+        lowered = keyword_view(text)
+    for pattern, mask, keywords in passes:
+        if lowered is not None and keywords is not None and not any(k in lowered for k in keywords):
+            continue
+        text = pattern.sub(mask, text)
+    return text
+
+def mask_text(text, ticker):
+    """
+    Apply date masking, company masking, and product masking with the compiled engine.
+    Output is identical to mask_text_reference.
+    """
+    return mask_entities(mask_dates_compiled(text), ticker)
+
 # --------------------------------------------------------------------------------
 # ------------------------- 3. Main Processing Functions --------------------------
 # --------------------------------------------------------------------------------
 
+def article_timestamp(article):
+    """
+    Return the first UTC timestamp string of an item, or None if it has none.
+    """
+    timestamps = article.get('timestamps', [])
+    if not timestamps:
+        return None
+    return timestamps[0].get('timestamp') or None
+
+def filter_article(article):
+    """
+    Apply the per-item filters: English language, non-empty body, at least one universe
+    ticker and a timestamp. Returns (universe tickers, UTC timestamp string), or None if
+    the article is filtered out.
+    """
+    # Must be English
+    if article.get('data', {}).get('language', '').lower() != 'en':
+        return None
+
+    # Must have body text
+    if not article.get('data', {}).get('body', '').strip():
+        return None
+
+    # Must have at least one ticker in universe (one pass over the subject codes)
+    article_tickers = article_universe_tickers(article)
+    if not article_tickers:
+        return None
+
+    # Timestamps
+    utc_timestamp = article_timestamp(article)
+    if not utc_timestamp:
+        return None
+    return article_tickers, utc_timestamp
+
+def article_trading_day(article, utc_timestamp):
+    """
+    convert_to_est_trading_day for one article, or None (with a warning) if its timestamp
+    does not parse, so one malformed item skips that article rather than failing the file.
+    """
+    try:
+        return convert_to_est_trading_day(utc_timestamp)
+    except (ValueError, TypeError) as e:
+        article_id = article.get('guid') or article.get('data', {}).get('id')
+        print(f"[WARN] Skipping article {article_id}: bad timestamp {utc_timestamp!r} ({e})")
+        return None
+
+def process_article(article, do_mask=True, trading_day=None):
+    """
+    Process a single Thomson Reuters item:
+      - Filter by English language and ticker universe (filter_article).
+      - Convert UTC to EST trading day with 4pm cutoff (or use the precomputed `trading_day`);
+        an article whose timestamp does not parse is skipped.
+      - Mask date/company/product in headline/body (if do_mask=True): dates once per
+        article, companies/products once per ticker.
+    Returns a list of dicts (one per universe ticker) with
+    'trading_day', 'ticker', 'article_id', 'masked_headline', 'masked_body'; empty if the article is filtered out.
+    """
+    kept = filter_article(article)
+    if kept is None:
+        return []
+    article_tickers, utc_timestamp = kept
+
+    # Convert time (unless already assigned in bulk by process_articles)
+    if trading_day is None:
+        trading_day = article_trading_day(article, utc_timestamp)
+        if trading_day is None:
+            return []
+    return mask_article(article, article_tickers, trading_day, do_mask=do_mask)
+
+def mask_article(article, article_tickers, trading_day, do_mask=True):
+    """
+    The output rows of an article that passed filter_article: one per universe ticker,
+    masked (if do_mask=True) and stamped with its trading day.
+    """
+    headline = article.get('data', {}).get('headline', '')
+    body = article.get('data', {}).get('body', '')
+    article_id = article.get('guid') or article.get('data', {}).get('id')
+
+    if do_mask:
+        # Shared stage: date masking does not depend on the ticker, so it runs once per article
+        headline = mask_dates_compiled(headline)
+        body = mask_dates_compiled(body)
+        headline_lowered = keyword_view(headline)
+        body_lowered = keyword_view(body)
+        # Identical masked texts (e.g. a body with no entity of either ticker) are stored once
+        shared_texts = {}
+
+    processed = []
+    for ticker in article_tickers:
+        if do_mask:
+            # Per-ticker stage: company and product masking
+            mh = mask_entities(headline, ticker, lowered=headline_lowered)
+            mb = mask_entities(body, ticker, lowered=body_lowered)
+            mh = shared_texts.setdefault(mh, mh)
+            mb = shared_texts.setdefault(mb, mb)
+        else:
+            mh = headline
+            mb = body
+
+        processed.append({
+            'trading_day': trading_day,
+            'ticker': ticker,
+            'article_id': article_id,
+            'masked_headline': mh,
+            'masked_body': mb
+        })
+
+    return processed
+
 def process_articles(data, do_mask=True):
     """
-    Process Thomson Reuters JSON:
-      - Filter by English language and ticker universe.
-      - Convert UTC to EST trading day with 4pm cutoff.
-      - Mask date/company/product in headlines/bodies (if do_mask=True).
-    Returns a list of dicts with 'trading_day', 'ticker', 'masked_headline', 'masked_body'.
+    Process Thomson Reuters JSON (see process_article for the per-item rules).
+    Items are filtered first; only the kept ones get a trading day, in one vectorized call.
+    Returns a list of dicts with 'trading_day', 'ticker', 'article_id', 'masked_headline', 'masked_body'.
     """
     processed = []
     items = data.get('Items', [])
+
+    kept = []
     for article in items:
-        # Must be English
-        if article.get('data', {}).get('language', '').lower() != 'en':
-            continue
-        
-        # Must have body text
-        if not article.get('data', {}).get('body', '').strip():
-            continue
-        
-        # Must have at least one ticker in universe
-        if not filter_article_by_universe(article, TICKER_UNIVERSE):
-            continue
-        
-        # Timestamps
-        timestamps = article.get('timestamps', [])
-        if not timestamps:
-            continue
-        utc_timestamp = timestamps[0].get('timestamp')
-        if not utc_timestamp:
-            continue
-        
-        # Convert time
-        trading_day = convert_to_est_trading_day(utc_timestamp)
-        
-        # Identify tickers
-        subjects = article.get('data', {}).get('subjects', [])
-        article_tickers = [t for t in extract_tickers_from_subjects(subjects) if t in TICKER_UNIVERSE]
-        if not article_tickers:
+        passed = filter_article(article)
+        if passed is not None:
+            kept.append((article,) + passed)
+
+    stamps = [stamp for _, _, stamp in kept]
+    try:
+        trading_days = assign_trading_days(stamps)
+    except (ValueError, TypeError):
+        # A malformed timestamp fails the whole batch: convert one by one and skip the bad ones
+        trading_days = [article_trading_day(article, stamp) for article, _, stamp in kept]
+
+    for (article, article_tickers, _), trading_day in zip(kept, trading_days):
+        if trading_day is None:
             continue
-        
-        headline = article.get('data', {}).get('headline', '')
-        body = article.get('data', {}).get('body', '')
-        
-        for ticker in article_tickers:
-            if do_mask:
-                mh = mask_text(headline, ticker)
-                mb = mask_text(body, ticker)
-            else:
-                mh = headline
-                mb = body
-            
-            processed.append({
-                'trading_day': trading_day,
-                'ticker': ticker,
-                'masked_headline': mh,
-                'masked_body': mb
-            })
+        processed.extend(mask_article(article, article_tickers, trading_day, do_mask=do_mask))
     
     return processed
 
+def dedup_articles(processed_articles):
+    """
+    Processed articles as a DataFrame with a 'masked_text' column ("headline body"),
+    keeping the first row of each exact combined text.
+    """
+    df = pd.DataFrame(processed_articles)
+    if df.empty:
+        return df
+
+    # Identify duplicates by the exact combined text (built once and kept as the output text)
+    df['masked_text'] = df['masked_headline'] + " " + df['masked_body']
+    df.drop_duplicates(subset=['masked_text'], inplace=True)
+    return df
+
 def aggregate_articles(processed_articles):
     """
     Group processed articles by (trading_day, ticker) and produce a list of unique masked news items.
     """
-    df = pd.DataFrame(processed_articles)
+    df = dedup_articles(processed_articles)
     if df.empty:
         return pd.DataFrame()  # no articles
-    
-    # Identify duplicates by the exact combined text
-    df['combined'] = df['masked_headline'] + " " + df['masked_body']
-    df.drop_duplicates(subset=['combined'], inplace=True)
-    df['masked_text'] = df['masked_headline'] + " " + df['masked_body']
-    
-    agg = df.groupby(['trading_day', 'ticker'])['masked_text'].apply(list).reset_index()
-    pivot_df = agg.pivot(index='trading_day', columns='ticker', values='masked_text')
-    return pivot_df
+    return pivot_news_texts(df)
 
-def process_pipeline(filepath, do_mask=True, convert_to_parquet=True):
+def process_pipeline(filepath, do_mask=True, convert_to_parquet=True, output_dir='.', output_format='pivot',
+                     dedup_index=None):
     """
     Full pipeline on a single file:
       - Load JSON
       - Process articles
-      - Aggregate articles
-      - Optionally write a Parquet file
-    Returns the pivot DataFrame.
+      - Aggregate articles (and, given a DedupIndex, drop texts already kept for other files)
+      - Optionally write a Parquet file to output_dir, and/or the file's rows to the
+        long news store in output_dir/news_store (output_format 'pivot', 'long' or 'both')
+    Returns the pivot DataFrame (empty for output_format='long', where no pivot is built).
     """
     data = load_json_data(filepath)
     processed_articles = process_articles(data, do_mask=do_mask)
     del data
     gc.collect()
     
-    pivot_df = aggregate_articles(processed_articles)
+    df = dedup_articles(processed_articles)
     del processed_articles
     gc.collect()
+
+    if dedup_index is not None and not df.empty:
+        source = os.path.basename(filepath)
+        keep = [not dedup_index.is_duplicate(text, day, ticker, source)
+                for text, day, ticker in zip(df['masked_text'], df['trading_day'], df['ticker'])]
+        df = df[keep]
+
+    if convert_to_parquet and output_format in ('long', 'both'):
+        store_root = os.path.join(output_dir, NEWS_STORE_DIR)
+        remove_parts(store_root, os.path.basename(filepath))
+        if not df.empty:
+            store = NewsStoreWriter(store_root, os.path.basename(filepath))
+            try:
+                store.write_frame(df)
+            finally:
+                store.close()
+            print(f"[INFO] Wrote {store.n_rows} rows to the news store in {store_root}")
+        if output_format == 'long':
+            return pd.DataFrame()
+
+    pivot_df = pivot_news_texts(df) if not df.empty else pd.DataFrame()
+    del df
     
     if convert_to_parquet and not pivot_df.empty:
-        outname = os.path.basename(filepath) + '_sentiment_news.parquet'
+        outname = os.path.join(output_dir, output_name_for(filepath))
         pivot_df.to_parquet(outname)
         print(f"[INFO] Wrote {outname}")
-    
+
     return pivot_df
 
+def output_name_for(filepath):
+    """Name of the Parquet output written for an input file."""
+    return os.path.basename(filepath) + '_sentiment_news.parquet'
+
+def process_pipeline_streaming(filepath, do_mask=True, batch_size=STREAM_BATCH_SIZE, output_dir='.',
+                               output_format='pivot', dedup_index=None):
+    """
+    Streaming variant of process_pipeline for monthly archives too large to json.load:
+      - Read 'Items' one article at a time (iter_json_items)
+      - Filter and mask each article as it arrives, dropping repeated texts via a digest set
+        (and, given a DedupIndex, texts already kept for other files)
+      - Flush every `batch_size` rows to per-trading-day spill files on disk
+      - Assemble the same trading_day x ticker pivot one trading day (= one row group) at a time
+    Peak memory is bounded by one batch plus one trading day, not by the size of the file.
+    The output file (in output_dir) matches process_pipeline's, as do the long news store rows for
+    output_format 'long' / 'both' (written batch by batch). Returns the number of articles written.
+    """
+    write_pivot = output_format in ('pivot', 'both')
+    store = None
+    if output_format in ('long', 'both'):
+        store_root = os.path.join(output_dir, NEWS_STORE_DIR)
+        remove_parts(store_root, os.path.basename(filepath))
+        store = NewsStoreWriter(store_root, os.path.basename(filepath))
+    spill_schema = pa.schema([('ticker', pa.string()), ('masked_text', pa.string())])
+    seen = set()
+    source = os.path.basename(filepath)
+    tickers = set()
+    n_written = 0
+
+    with tempfile.TemporaryDirectory(prefix='tr_stream_') as spill_dir:
+        spill_writers = {}
+        batch = []
+
+        def flush():
+            if store is not None:
+                store.write_rows(*[[rec[k] for rec in batch] for k in
+                                   ('trading_day', 'ticker', 'article_id', 'masked_headline', 'masked_body')])
+            if not write_pivot:
+                batch.clear()
+                return
+            by_day = {}
+            for rec in batch:
+                trading_day, ticker, text = rec['trading_day'], rec['ticker'], rec['masked_text']
+                by_day.setdefault(trading_day, ([], []))
+                by_day[trading_day][0].append(ticker)
+                by_day[trading_day][1].append(text)
+            for trading_day, (day_tickers, day_texts) in by_day.items():
+                if trading_day not in spill_writers:
+                    spill_path = os.path.join(spill_dir, f"{trading_day.isoformat()}.parquet")
+                    spill_writers[trading_day] = pq.ParquetWriter(spill_path, spill_schema)
+                spill_writers[trading_day].write_table(
+                    pa.table({'ticker': day_tickers, 'masked_text': day_texts}, schema=spill_schema)
+                )
+            batch.clear()
+
+        try:
+            for article in iter_json_items(filepath):
+                article_pairs = set()
+                for rec in process_article(article, do_mask=do_mask):
+                    # Tickers sharing the same masked text objects repeat an already-seen text
+                    pair = (id(rec['masked_headline']), id(rec['masked_body']))
+                    if pair in article_pairs:
+                        continue
+                    article_pairs.add(pair)
+                    # Same rule as aggregate_articles: drop repeats of the exact combined text
+                    combined = rec['masked_headline'] + " " + rec['masked_body']
+                    digest = hashlib.blake2b(combined.encode('utf-8'), digest_size=16).digest()
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                    if dedup_index is not None and dedup_index.is_duplicate(
+                            combined, rec['trading_day'], rec['ticker'], source):
+                        continue
+                    tickers.add(rec['ticker'])
+                    rec['masked_text'] = combined
+                    batch.append(rec)
+                    if len(batch) >= batch_size:
+                        flush()
+            if batch:
+                flush()
+        finally:
+            if store is not None:
+                store.close()
+        for writer in spill_writers.values():
+            writer.close()
+        del seen
+        gc.collect()
+
+        if store is not None:
+            print(f"[INFO] Wrote {store.n_rows} rows to the news store in {store_root}")
+            if not write_pivot:
+                return store.n_rows
+        if not spill_writers:
+            return 0
+
+        columns = pd.Index(sorted(tickers), name='ticker')
+        out_schema = pa.schema(
+            [pa.field(t, pa.list_(pa.string())) for t in columns]
+            + [pa.field('trading_day', pa.date32())]
+        )
+        outname = os.path.join(output_dir, output_name_for(filepath))
+        writer = None
+        try:
+            for trading_day in sorted(spill_writers):
+                day_table = pq.read_table(os.path.join(spill_dir, f"{trading_day.isoformat()}.parquet"))
+                cells = {}
+                for ticker, text in zip(day_table.column('ticker').to_pylist(),
+                                        day_table.column('masked_text').to_pylist()):
+                    cells.setdefault(ticker, []).append(text)
+                row = pd.DataFrame([[cells.get(t) for t in columns]],
+                                   index=pd.Index([trading_day], name='trading_day'),
+                                   columns=columns)
+                table = pa.Table.from_pandas(row, schema=out_schema)
+                if writer is None:
+                    writer = pq.ParquetWriter(outname, table.schema)
+                writer.write_table(table)
+                n_written += day_table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+
+    print(f"[INFO] Wrote {outname}")
+    return n_written
+
 # --------------------------------------------------------------------------------
 # ------------------------- 4. Month-by-Month Driver ------------------------------
 # --------------------------------------------------------------------------------
@@ -450,13 +1096,258 @@ def monthly_date_range(start_date: date, end_date: date):
         yield current.year, current.month
         current += relativedelta(months=1)
 
-def main():
+def collect_input_files(base_dir, start_dt, end_dt):
     """
-    Parse arguments and run the pipeline from a start date to an end date.
+    Walk the months from start_dt to end_dt and return the input files in processing order.
     For each year-month, first check for:
       1) STORY.RTRS.YYYY-MM.REC.JSON.txt
       2) News.RTRS.YYYYMM.0214.txt
-    If neither exists, process every .txt file in the directory.
+    If neither exists, fall back to every .txt file in the year directory.
+    Returns a list of (filepath, label) tuples; a file reached from several months is listed once.
+    """
+    jobs = []
+    queued = set()
+    for (year, month) in monthly_date_range(start_dt, end_dt):
+        subdir = os.path.join(base_dir, str(year))
+        # Candidate filenames:
+        story_name = f"STORY.RTRS.{year}-{month:02d}.REC.JSON.txt"
+        news_name = f"News.RTRS.{year}{month:02d}.0214.txt"
+        candidates = [story_name, news_name]
+
+        any_found = False
+        for fname in candidates:
+            filepath = os.path.join(subdir, fname)
+            if os.path.isfile(filepath):
+                any_found = True
+                if filepath not in queued:
+                    queued.add(filepath)
+                    jobs.append((filepath, 'monthly'))
+
+        if not any_found:
+            # Fallback: process every .txt file in the subdirectory
+            if os.path.isdir(subdir):
+                txt_files = [f for f in os.listdir(subdir) if f.endswith('.txt')]
+                if txt_files:
+                    for fname in txt_files:
+                        filepath = os.path.join(subdir, fname)
+                        if filepath not in queued:
+                            queued.add(filepath)
+                            jobs.append((filepath, 'fallback'))
+                else:
+                    print(f"[WARN] No .txt files found in {subdir}. Skipping.")
+            else:
+                print(f"[WARN] Directory {subdir} does not exist. Skipping.")
+    return jobs
+
+def input_fingerprint(filepath, use_hash=False):
+    """
+    Size and mtime of an input file, plus its SHA-256 if use_hash (reads the whole file).
+    """
+    st = os.stat(filepath)
+    fingerprint = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if use_hash:
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(STREAM_READ_CHUNK), b''):
+                digest.update(block)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+def load_manifest(manifest_path):
+    """
+    Load the run manifest ({'files': {abs input path: entry}}); empty if missing or unreadable.
+    """
+    if not os.path.isfile(manifest_path):
+        return {'files': {}}
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Could not read manifest {manifest_path} ({e}); reprocessing everything.")
+        return {'files': {}}
+    manifest.setdefault('files', {})
+    return manifest
+
+def save_manifest(manifest, manifest_path):
+    """
+    Write the manifest atomically (temp file + rename), so an interrupted run never leaves it half-written.
+    """
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def is_up_to_date(entry, fingerprint, do_mask, output_dir, output_format='pivot', dedup_mode=None):
+    """
+    True if a manifest entry shows the file was already processed as it is now:
+    same pipeline version, masking flag, output format and dedup mode (None, 'exact' or 'near'),
+    same content (SHA-256 if both sides have one, otherwise size and mtime), and its output still on disk.
+    """
+    if not entry or entry.get('pipeline_version') != PIPELINE_VERSION or entry.get('mask') != do_mask:
+        return False
+    if entry.get('output_format', 'pivot') != output_format or entry.get('dedup') != dedup_mode:
+        return False
+    if 'sha256' in entry and 'sha256' in fingerprint:
+        same_content = entry['sha256'] == fingerprint['sha256'] and entry.get('size') == fingerprint['size']
+    else:
+        same_content = entry.get('size') == fingerprint['size'] and entry.get('mtime_ns') == fingerprint['mtime_ns']
+    if not same_content:
+        return False
+    output = entry.get('output')
+    return output is None or os.path.isfile(os.path.join(output_dir, output))
+
+def select_stale_jobs(jobs, manifest, do_mask, output_dir, use_hash=False, force=False, output_format='pivot',
+                      dedup_mode=None):
+    """
+    Split jobs into those to (re)process and those the manifest shows as unchanged.
+    Files sharing an output name are rerun together, so the last one still wins as in a full run.
+    Returns (stale jobs, skipped file paths, {file path: fingerprint}).
+    """
+    fingerprints = {filepath: input_fingerprint(filepath, use_hash) for filepath, _ in jobs}
+    stale_outputs = set()
+    for filepath, _ in jobs:
+        entry = manifest['files'].get(os.path.abspath(filepath))
+        if force or not is_up_to_date(entry, fingerprints[filepath], do_mask, output_dir, output_format,
+                                      dedup_mode):
+            stale_outputs.add(output_name_for(filepath))
+
+    stale, skipped = [], []
+    for filepath, label in jobs:
+        if output_name_for(filepath) in stale_outputs:
+            stale.append((filepath, label))
+        else:
+            skipped.append(filepath)
+    return stale, skipped, fingerprints
+
+def run_pipeline_job(filepaths, do_mask=True, stream=False, batch_size=STREAM_BATCH_SIZE, output_dir='.',
+                     output_format='pivot', dedup_path=None, near_dup=False):
+    """
+    Run the pipeline on a list of files, in order, isolating failures per file.
+    This is the unit of work sent to a worker process; it never raises.
+    With dedup_path, each file is checked against the shared dedup index (see dedup_index.py).
+    Returns one status dict per file: 'file', 'status' ('ok'/'failed'), 'seconds', 'error'.
+    """
+    results = []
+    for filepath in filepaths:
+        print(f"[INFO] Processing {filepath} ...")
+        t0 = time.perf_counter()
+        index = None
+        try:
+            if dedup_path:
+                index = DedupIndex(dedup_path, near_dup=near_dup)
+            if stream:
+                process_pipeline_streaming(filepath, do_mask=do_mask, batch_size=batch_size,
+                                           output_dir=output_dir, output_format=output_format,
+                                           dedup_index=index)
+            else:
+                process_pipeline(filepath, do_mask=do_mask, convert_to_parquet=True,
+                                 output_dir=output_dir, output_format=output_format,
+                                 dedup_index=index)
+            if index is not None:
+                index.session_report()
+                index.close()
+            status, error = 'ok', None
+        except Exception as e:
+            print(f"[ERROR] Failed on {filepath}: {e}")
+            traceback.print_exc()
+            status, error = 'failed', traceback.format_exc()
+            if index is not None:
+                # Closing without a commit drops the latest uncommitted texts; texts committed
+                # earlier were kept for this same file, so its rerun keeps them again
+                index.conn.close()
+        finally:
+            gc.collect()
+        results.append({
+            'file': filepath,
+            'status': status,
+            'seconds': round(time.perf_counter() - t0, 3),
+            'error': error
+        })
+    return results
+
+def run_jobs(jobs, do_mask=True, stream=False, batch_size=STREAM_BATCH_SIZE, workers=1,
+             output_dir='.', on_result=None, output_format='pivot', dedup_path=None, near_dup=False):
+    """
+    Run the pipeline over `jobs` (from collect_input_files), serially or on a process pool.
+    Files whose outputs share a name are kept in one task and run in their serial order, so
+    the Parquet files left behind are the same as a serial run's. Returns the per-file statuses.
+    If given, on_result(status) is called in this (parent) process as each file finishes.
+    A shared dedup index keeps the first copy of a text in file order, so it always runs serially.
+    """
+    if dedup_path and workers > 1:
+        print("[WARN] --dedup_index keeps the first copy of a text in file order; running serially.")
+        workers = 1
+    groups = {}
+    for filepath, _ in jobs:
+        groups.setdefault(output_name_for(filepath), []).append(filepath)
+    tasks = list(groups.values())
+
+    if workers <= 1:
+        results = []
+        for filepaths in tasks:
+            for filepath in filepaths:
+                res = run_pipeline_job([filepath], do_mask, stream, batch_size, output_dir, output_format,
+                                       dedup_path, near_dup)[0]
+                if on_result is not None:
+                    on_result(res)
+                results.append(res)
+        return results
+
+    results = []
+    # One task per child keeps a month's memory from lingering in a long-lived worker
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        futures = {
+            pool.submit(run_pipeline_job, filepaths, do_mask, stream, batch_size,
+                        output_dir, output_format): filepaths
+            for filepaths in tasks
+        }
+        for future in as_completed(futures):
+            try:
+                task_results = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed for memory); record every file of the task
+                task_results = [{'file': fp, 'status': 'failed', 'seconds': None, 'error': repr(e)}
+                                for fp in futures[future]]
+            for res in task_results:
+                print(f"[INFO] {res['status'].upper()} {res['file']} ({res['seconds']}s)")
+                if on_result is not None:
+                    on_result(res)
+            results.extend(task_results)
+
+    # Report in serial order regardless of completion order
+    order = {filepath: i for i, (filepath, _) in enumerate(jobs)}
+    results.sort(key=lambda r: order[r['file']])
+    return results
+
+def write_run_summary(results, wall_seconds, summary_path=None, skipped=()):
+    """Print a per-file status table and totals; optionally also dump them as JSON."""
+    n_ok = sum(r['status'] == 'ok' for r in results)
+    n_failed = len(results) - n_ok
+    busy = sum(r['seconds'] or 0.0 for r in results)
+    print("[INFO] ---------------- Run summary ----------------")
+    for r in results:
+        seconds = f"{r['seconds']:.1f}s" if r['seconds'] is not None else "-"
+        print(f"[INFO] {r['status']:<6} {seconds:>9}  {r['file']}")
+    print(f"[INFO] {n_ok} ok, {n_failed} failed, {len(skipped)} unchanged (skipped), "
+          f"{busy:.1f}s of work in {wall_seconds:.1f}s wall time.")
+    if summary_path:
+        with open(summary_path, 'w') as f:
+            json.dump({
+                'files': results,
+                'n_ok': n_ok,
+                'n_failed': n_failed,
+                'skipped': list(skipped),
+                'work_seconds': round(busy, 3),
+                'wall_seconds': round(wall_seconds, 3)
+            }, f, indent=2)
+        print(f"[INFO] Wrote run summary to {summary_path}")
+
+def main():
+    """
+    Parse arguments and run the pipeline from a start date to an end date.
+    Input files are chosen month by month (see collect_input_files) and processed
+    either serially or, with --workers N, on a pool of N processes.
+    Inputs the manifest in --output_dir shows as unchanged are skipped (unless --force).
     Detailed error logging is printed to pinpoint issues.
     """
     parser = argparse.ArgumentParser(
@@ -470,9 +1361,53 @@ def main():
                         help="End date (YYYY-MM-DD).")
     parser.add_argument("--mask", action="store_true", default=False,
                         help="Enable masking (if specified, masking is applied).")
+    parser.add_argument("--stream", action="store_true", default=False,
+                        help="Stream each file article by article instead of loading it whole (flat memory).")
+    parser.add_argument("--batch_size", type=int, default=STREAM_BATCH_SIZE,
+                        help="Articles buffered per flush in --stream mode.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (1 = serial).")
+    parser.add_argument("--summary_path", default=None,
+                        help="Optional JSON file for the per-file status/timing summary.")
+    parser.add_argument("--output_dir", default=".",
+                        help="Directory for the Parquet outputs and the run manifest.")
+    parser.add_argument("--output_format", choices=OUTPUT_FORMATS, default="pivot",
+                        help="Wide pivot Parquet per file, the long news store (output_dir/news_store), or both.")
+    parser.add_argument("--hash", action="store_true", default=False,
+                        help="Also compare inputs by SHA-256 content hash, not just size and mtime.")
+    parser.add_argument("--force", action="store_true", default=False,
+                        help="Reprocess every input file, even if the manifest shows it unchanged.")
+    parser.add_argument("--dedup_index", default=None,
+                        help="SQLite dedup index shared across files (and combine_parquets.py); "
+                             "drops texts already kept for another file.")
+    parser.add_argument("--near_dup", action="store_true", default=False,
+                        help="With --dedup_index, also drop near-duplicates (MinHash) such as story updates.")
+    parser.add_argument("--check", action="store_true", default=False,
+                        help="Check the streaming JSON reader against json.load at chunk sizes 1-8, then exit.")
+    parser.add_argument("--profile", default=None,
+                        help="Write a stage profile (wall/CPU time, peak RSS, throughput) of this run to this JSON file.")
     
     args = parser.parse_args()
-    
+
+    if args.check:
+        mismatches = check_iter_json_items()
+        for document, chunk_size, got, expected in mismatches:
+            print(f"[ERROR] chunk_size={chunk_size} {document!r}: got {got!r}, expected {expected!r}")
+        if mismatches:
+            raise SystemExit(1)
+        print("[INFO] Streaming JSON reader matches json.load at chunk sizes 1-8.")
+        return
+
+    if args.profile:
+        # benchmarks/instrumentation.py, imported only when profiling
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+        from instrumentation import run_profiled
+        run_profiled(args.profile, 'tr_pipeline', run_cli, args, unit='files', count=len)
+    else:
+        run_cli(args)
+
+def run_cli(args):
+    """Run the pipeline for parsed command-line arguments. Returns the per-file results."""
     start_dt = pd.to_datetime(args.start_date).date()
     end_dt = pd.to_datetime(args.end_date).date()
     
@@ -483,49 +1418,50 @@ def main():
     do_mask = args.mask
     print(f"[INFO] Processing from {start_dt} to {end_dt} in monthly increments.")
     print(f"[INFO] Masking enabled? {do_mask}")
-    
-    for (year, month) in monthly_date_range(start_dt, end_dt):
-        subdir = os.path.join(args.base_dir, str(year))
-        # Candidate filenames:
-        story_name = f"STORY.RTRS.{year}-{month:02d}.REC.JSON.txt"
-        news_name = f"News.RTRS.{year}{month:02d}.0214.txt"
-        candidates = [story_name, news_name]
-        
-        any_found = False
-        for fname in candidates:
-            filepath = os.path.join(subdir, fname)
-            if os.path.isfile(filepath):
-                any_found = True
-                print(f"[INFO] Processing {filepath} ...")
-                try:
-                    process_pipeline(filepath, do_mask=do_mask, convert_to_parquet=True)
-                except Exception as e:
-                    print(f"[ERROR] Failed on {filepath}: {e}")
-                    traceback.print_exc()
-                finally:
-                    gc.collect()
-        
-        if not any_found:
-            # Fallback: process every .txt file in the subdirectory
-            if os.path.isdir(subdir):
-                txt_files = [f for f in os.listdir(subdir) if f.endswith('.txt')]
-                if txt_files:
-                    for fname in txt_files:
-                        filepath = os.path.join(subdir, fname)
-                        print(f"[INFO] Processing fallback file {filepath} ...")
-                        try:
-                            process_pipeline(filepath, do_mask=do_mask, convert_to_parquet=True)
-                        except Exception as e:
-                            print(f"[ERROR] Failed on {filepath}: {e}")
-                            traceback.print_exc()
-                        finally:
-                            gc.collect()
-                else:
-                    print(f"[WARN] No .txt files found in {subdir}. Skipping.")
-            else:
-                print(f"[WARN] Directory {subdir} does not exist. Skipping.")
+    print(f"[INFO] Streaming enabled? {args.stream}")
+    print(f"[INFO] Workers: {args.workers}")
+    print(f"[INFO] Output directory: {args.output_dir} (format: {args.output_format})")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    t0 = time.perf_counter()
+    dedup_mode = ('near' if args.near_dup else 'exact') if args.dedup_index else None
+    jobs = collect_input_files(args.base_dir, start_dt, end_dt)
+    jobs, skipped, fingerprints = select_stale_jobs(jobs, manifest, do_mask, args.output_dir,
+                                                    use_hash=args.hash, force=args.force,
+                                                    output_format=args.output_format,
+                                                    dedup_mode=dedup_mode)
+    print(f"[INFO] {len(jobs)} file(s) to process, {len(skipped)} unchanged since the last run.")
+
+    def record(res):
+        # Only the parent touches the manifest; failed files stay stale and are retried next run
+        if res['status'] != 'ok':
+            return
+        outname = output_name_for(res['file'])
+        manifest['files'][os.path.abspath(res['file'])] = {
+            **fingerprints[res['file']],
+            'mask': do_mask,
+            'output_format': args.output_format,
+            'dedup': dedup_mode,
+            'pipeline_version': PIPELINE_VERSION,
+            'output': (outname if args.output_format != 'long'
+                       and os.path.isfile(os.path.join(args.output_dir, outname)) else None),
+            'processed_at': datetime.now().isoformat(timespec='seconds')
+        }
+        save_manifest(manifest, manifest_path)
+
+    results = run_jobs(jobs, do_mask=do_mask, stream=args.stream, batch_size=args.batch_size,
+                       workers=args.workers, output_dir=args.output_dir, on_result=record,
+                       output_format=args.output_format, dedup_path=args.dedup_index,
+                       near_dup=args.near_dup)
+    write_run_summary(results, time.perf_counter() - t0, args.summary_path, skipped=skipped)
+    if args.dedup_index and os.path.isfile(args.dedup_index):
+        dedup_report(args.dedup_index)
     
     print("[INFO] All done. One Parquet file per processed file is written (if data existed).")
+    return results
 
 if __name__ == "__main__":
     main()
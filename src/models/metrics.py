@@ -0,0 +1,538 @@
+#!/apps/anaconda3/bin/python
+# metrics.py
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy.stats import pearsonr, spearmanr
+except ImportError:   # only the reference version uses scipy; it falls back to pandas
+    pearsonr = spearmanr = None
+
+# Trading days per year, for annualizing
+TRADING_DAYS = 252
+
+# Notebook labels of the per-series metrics (values in %, except the ratios)
+METRIC_LABELS = {
+    'total_return': "Total Return (%)",
+    'ann_return': "Annualized Return (%)",
+    'ann_vol': "Annualized Vol (%)",
+    'sharpe': "Sharpe",
+    'sortino': "Sortino",
+    'turnover': "Turnover (%)",
+    'max_drawdown': "Max Drawdown (%)",
+}
+PERCENT_METRICS = ('total_return', 'ann_return', 'ann_vol', 'turnover', 'max_drawdown')
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Reference Version ----------------------------------
+# --------------------------------------------------------------------------------
+
+def run_backtest_reference(env, model, dates=None, benchmark_returns=None):
+    """
+    run_backtest from RL_portf_alloc_TD3_final_result.ipynb, kept to check run_backtest against:
+    one dict per step with copies of the action and weight vectors, then a DataFrame.
+    """
+    obs, info = env.reset()
+    done = False
+
+    # starting cash allocation: cash + stocks (n_stocks + cash)
+    all_cash = np.zeros(env.n_stocks + 1, dtype=np.float32)
+    all_cash[0] = 1.0
+
+    records = [{
+        "date": dates[env._current_step] if dates is not None else env._current_step,
+        "portfolio_value": env.portfolio_value,
+        "daily_return": 0,
+        "action": all_cash.copy(),
+        "weights": all_cash.copy(),
+        "turnover": 0
+    }]
+
+    step_count = 0
+    while not done:
+        action, _ = model.predict(obs, deterministic=True)
+        obs, reward, done, _, info = env.step(action)
+
+        cur_date = dates[env._current_step] if (dates is not None and env._current_step < len(dates)) else step_count
+
+        records.append({
+            "date": cur_date,
+            "portfolio_value": env.portfolio_value,
+            "daily_return": reward,
+            "action": action.copy(),
+            "weights": env.weights.copy(),
+            "turnover": info.get('turnover', np.nan)
+        })
+        step_count += 1
+
+    df = pd.DataFrame(records)
+
+    if benchmark_returns is not None:
+        if isinstance(benchmark_returns, dict):
+            for bench_name, bench_returns in benchmark_returns.items():
+                df[f"benchmark_{bench_name}"] = bench_returns[:len(df)]
+        else:
+            df['benchmark_return'] = benchmark_returns[:len(df)]
+
+    return df
+
+def correlation_reference(x, y, method):
+    """pearsonr / spearmanr as the notebooks call them (pandas' coefficients if scipy is missing)."""
+    try:
+        if pearsonr is not None:
+            return (pearsonr if method == 'pearson' else spearmanr)(x, y)[0]
+        return pd.DataFrame({'x': x, 'y': y}).corr(method=method).iloc[0, 1]
+    except Exception:
+        return np.nan
+
+def compute_performance_metrics_reference(df, trading_days=TRADING_DAYS, rf_rate=None):
+    """
+    compute_performance_metrics from RL_portf_alloc_TD3_final_result.ipynb (with max drawdowns),
+    plus the per-benchmark IC / RankIC of the earlier notebook version. One pass per column.
+    """
+    rets       = df['daily_return'].values
+    portf_vals = df['portfolio_value'].values
+
+    total_return = portf_vals[-1] / portf_vals[0] - 1.0
+    ann_ret      = total_return
+
+    std_daily = np.std(rets, ddof=1)
+    ann_vol   = std_daily * np.sqrt(trading_days)
+
+    if rf_rate is not None and len(rf_rate) > 0:
+        avg_rf = np.mean(rf_rate)
+        ann_rf  = (1 + avg_rf)**trading_days - 1.0
+    else:
+        ann_rf = 0.0
+
+    sharpe = (ann_ret - ann_rf) / ann_vol if ann_vol > 1e-12 else np.nan
+    neg_rets = rets[rets < 0]
+    if len(neg_rets) > 1:
+        dd_std   = np.std(neg_rets, ddof=1) * np.sqrt(trading_days)
+        sortino  = (ann_ret - ann_rf) / dd_std if dd_std > 1e-12 else np.nan
+    else:
+        sortino = np.nan
+
+    running_max = np.maximum.accumulate(portf_vals)
+    drawdowns   = (portf_vals / running_max) - 1
+    max_dd      = drawdowns.min()
+
+    portfolio_metrics = {
+        "Total Return (%)":       total_return * 100,
+        "Annualized Return (%)":  ann_ret * 100,
+        "Annualized Vol (%)":     ann_vol * 100,
+        "Sharpe":                 sharpe,
+        "Sortino":                sortino,
+        "Turnover (%)":           np.nanmean(df['turnover']) * 100,
+        "Max Drawdown (%)":       max_dd * 100
+    }
+
+    benchmarks_metrics = {}
+    for col in df.columns:
+        if not col.startswith("benchmark_"):
+            continue
+        name    = col[len("benchmark_"):]
+        bmk_rets= df[col].values
+
+        init_val      = portf_vals[0]
+        bmk_cumval    = (1 + pd.Series(bmk_rets)).cumprod() * init_val
+        total_bmk_ret = bmk_cumval.iloc[-1] / bmk_cumval.iloc[0] - 1.0
+
+        std_bmk_daily = np.std(bmk_rets, ddof=1)
+        ann_bmk_vol   = std_bmk_daily * np.sqrt(trading_days)
+        sharpe_bmk    = (total_bmk_ret - ann_rf) / ann_bmk_vol if ann_bmk_vol > 1e-12 else np.nan
+
+        neg_bmk = bmk_rets[bmk_rets < 0]
+        if len(neg_bmk) > 1:
+            bmk_dd_std  = np.std(neg_bmk, ddof=1) * np.sqrt(trading_days)
+            sortino_bmk = (total_bmk_ret - ann_rf) / bmk_dd_std if bmk_dd_std > 1e-12 else np.nan
+        else:
+            sortino_bmk = np.nan
+
+        bmk_running_max = bmk_cumval.cummax()
+        bmk_drawdowns   = (bmk_cumval / bmk_running_max) - 1
+        max_dd_bmk      = bmk_drawdowns.min()
+
+        benchmarks_metrics[name] = {
+            "Total Return (%)":       total_bmk_ret * 100,
+            "Annualized Return (%)":  total_bmk_ret * 100,
+            "Annualized Vol (%)":     ann_bmk_vol * 100,
+            "Sharpe":                 sharpe_bmk,
+            "Sortino":                sortino_bmk,
+            "Max Drawdown (%)":       max_dd_bmk * 100,
+            "IC":                     correlation_reference(rets, bmk_rets, 'pearson'),
+            "RankIC":                 correlation_reference(rets, bmk_rets, 'spearman')
+        }
+
+    return {
+        "Portfolio":  portfolio_metrics,
+        "Benchmarks": benchmarks_metrics
+    }
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Backtest Records -----------------------------------
+# --------------------------------------------------------------------------------
+
+def run_backtest_arrays(env, model, dates=None):
+    """
+    Run a PortfolioEnv (default or lean) with a trained model from reset to done, writing each
+    step into arrays preallocated for the whole episode (env.T rows, the first one the all-cash
+    start) instead of one dict per step. Returns a dict of arrays:
+      - 'portfolio_value', 'daily_return', 'turnover': [T]
+      - 'action', 'weights': [T, n_stocks+1]
+      - 'date': dates[step] for each row (dates must cover the env's T days), or, without
+        dates, the notebook's step counter (start step, then 0, 1, 2, ...).
+    """
+    obs, info = env.reset()
+    done = False
+    start = env._current_step
+    n_rows, n_assets = env.T - start, env.n_stocks + 1
+
+    values = np.empty(n_rows, dtype=np.float64)
+    rets = np.zeros(n_rows, dtype=np.float64)
+    turnover = np.zeros(n_rows, dtype=np.float64)
+    actions = np.zeros((n_rows, n_assets), dtype=np.float32)
+    weights = np.zeros((n_rows, n_assets), dtype=np.float64)
+    actions[0, 0] = weights[0, 0] = 1.0
+    values[0] = env.portfolio_value
+
+    i = 0
+    while not done:
+        action, _ = model.predict(obs, deterministic=True)
+        obs, reward, done, _, info = env.step(action)
+        i += 1
+        values[i] = env.portfolio_value
+        rets[i] = reward
+        actions[i] = action
+        weights[i] = env.weights
+        turnover[i] = info.get('turnover', np.nan)
+
+    n_rows = i + 1
+    if dates is not None:
+        date = np.asarray(dates)[start:start + n_rows]
+    else:
+        date = np.arange(-1, n_rows - 1)
+        date[0] = start
+    return {'date': date, 'portfolio_value': values[:n_rows], 'daily_return': rets[:n_rows],
+            'action': actions[:n_rows], 'weights': weights[:n_rows], 'turnover': turnover[:n_rows]}
+
+def run_backtest(env, model, dates=None, benchmark_returns=None):
+    """
+    Drop-in replacement for run_backtest in the TD3 notebooks: the same DataFrame
+    [date, portfolio_value, daily_return, action, weights, turnover] (+ benchmark_<name> columns
+    for a dict of benchmark returns, 'benchmark_return' for a single array), recorded through
+    run_backtest_arrays. The action / weights cells are rows of the recorded arrays.
+    """
+    record = run_backtest_arrays(env, model, dates)
+    df = pd.DataFrame({
+        "date": record['date'],
+        "portfolio_value": record['portfolio_value'],
+        "daily_return": record['daily_return'],
+        "action": list(record['action']),
+        "weights": list(record['weights']),
+        "turnover": record['turnover'],
+    })
+    if benchmark_returns is not None:
+        if isinstance(benchmark_returns, dict):
+            for bench_name, bench_returns in benchmark_returns.items():
+                df[f"benchmark_{bench_name}"] = bench_returns[:len(df)]
+        else:
+            df['benchmark_return'] = benchmark_returns[:len(df)]
+    return df
+
+def backtest_runs(env, models, dates=None):
+    """
+    Backtest several models (e.g. TD3 checkpoints) on the same env. Returns run_backtest_arrays'
+    fields stacked over runs: [R, T] for the series, [R, T, n_stocks+1] for action / weights,
+    plus the shared 'date' [T]. Feed 'daily_return', 'portfolio_value' and 'turnover' to batch_metrics.
+    """
+    records = [run_backtest_arrays(env, model, dates) for model in models]
+    runs = {key: np.stack([r[key] for r in records]) for key in records[0] if key != 'date'}
+    runs['date'] = records[0]['date']
+    return runs
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Batch Metrics --------------------------------------
+# --------------------------------------------------------------------------------
+
+def rank_average(x):
+    """Ranks 1..T along the last axis, ties sharing their average rank (scipy's rankdata)."""
+    T = x.shape[-1]
+    order = np.argsort(x, axis=-1, kind='stable')
+    xs = np.take_along_axis(x, order, axis=-1)
+    pos = np.broadcast_to(np.arange(T), x.shape)
+    starts = np.ones(x.shape, dtype=bool)
+    starts[..., 1:] = xs[..., 1:] != xs[..., :-1]
+    ends = np.ones(x.shape, dtype=bool)
+    ends[..., :-1] = starts[..., 1:]
+    first = np.maximum.accumulate(np.where(starts, pos, 0), axis=-1)
+    last = np.minimum.accumulate(np.where(ends, pos, T - 1)[..., ::-1], axis=-1)[..., ::-1]
+    ranks = np.empty(x.shape, dtype=np.float64)
+    np.put_along_axis(ranks, order, (first + last) / 2.0 + 1.0, axis=-1)
+    return ranks
+
+def pearson_matrix(a, b):
+    """Pearson correlation of every row of a [R, T] with every row of b [B, T] -> [R, B] (NaN if constant)."""
+    ac = a - a.mean(axis=-1, keepdims=True)
+    bc = b - b.mean(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = (ac @ bc.T) / np.outer(np.sqrt((ac * ac).sum(axis=-1)), np.sqrt((bc * bc).sum(axis=-1)))
+    return np.clip(corr, -1.0, 1.0)
+
+def drawdowns(values):
+    """values / running max - 1 along the last axis."""
+    return values / np.maximum.accumulate(values, axis=-1) - 1.0
+
+def risk_ratios(rets, period_return, ann_rf, trading_days):
+    """
+    Annualized vol, Sharpe and Sortino of each row of rets [K, T] (ddof=1 as in the notebook;
+    the Sortino denominator is the std of the negative days, NaN with fewer than two).
+    """
+    ann_vol = rets.std(axis=-1, ddof=1) * np.sqrt(trading_days)
+    neg = rets < 0
+    n_neg = neg.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        neg_mean = np.where(neg, rets, 0.0).sum(axis=-1) / n_neg
+        neg_var = np.where(neg, (rets - neg_mean[:, None]) ** 2, 0.0).sum(axis=-1) / (n_neg - 1)
+        down_vol = np.sqrt(neg_var) * np.sqrt(trading_days)
+        excess = period_return - ann_rf
+        sharpe = np.where(ann_vol > 1e-12, excess / ann_vol, np.nan)
+        sortino = np.where((n_neg > 1) & (down_vol > 1e-12), excess / down_vol, np.nan)
+    return ann_vol, sharpe, sortino
+
+def batch_metrics(returns, benchmarks=None, values=None, turnover=None, rf_rate=None,
+                  trading_days=TRADING_DAYS):
+    """
+    compute_performance_metrics for R runs and B benchmarks in one vectorized pass.
+      - returns: [R, T] daily returns of each run (row 0 is the start, 0, as run_backtest records it).
+      - benchmarks: optional [B, T] daily benchmark returns (longer rows are cut to T).
+      - values: optional [R, T] portfolio values (default: the compounded returns).
+      - turnover: optional [R, T] turnover per step.
+      - rf_rate: optional daily risk-free series; its compounded mean is the Sharpe / Sortino hurdle.
+    As in the final notebook, the "annualized" return is the total return over the period.
+    Returns a dict of fractions (not %):
+      - 'runs' / 'benchmarks': {metric: [R] / [B]} for total_return, ann_return, ann_vol, sharpe,
+        sortino, max_drawdown (and turnover for runs).
+      - 'drawdown' [R, T] and 'benchmark_drawdown' [B, T].
+      - 'ic', 'rank_ic' (Pearson / Spearman of daily returns) and 'info_ratio' (annualized,
+        of run minus benchmark returns): [R, B].
+    """
+    rets = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+    R, T = rets.shape
+    if values is None:
+        values = np.cumprod(1.0 + rets, axis=-1)
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    if rf_rate is not None and len(rf_rate) > 0:
+        ann_rf = (1 + np.mean(rf_rate)) ** trading_days - 1.0
+    else:
+        ann_rf = 0.0
+
+    total = values[:, -1] / values[:, 0] - 1.0
+    ann_vol, sharpe, sortino = risk_ratios(rets, total, ann_rf, trading_days)
+    dd = drawdowns(values)
+    runs = {'total_return': total, 'ann_return': total, 'ann_vol': ann_vol, 'sharpe': sharpe,
+            'sortino': sortino, 'max_drawdown': dd.min(axis=-1),
+            'turnover': (np.nanmean(np.atleast_2d(turnover), axis=-1) if turnover is not None
+                         else np.full(R, np.nan))}
+    result = {'runs': runs, 'drawdown': dd}
+
+    if benchmarks is not None:
+        bmk = np.atleast_2d(np.asarray(benchmarks, dtype=np.float64))[:, :T]
+        cum = np.cumprod(1.0 + bmk, axis=-1)
+        bmk_total = cum[:, -1] / cum[:, 0] - 1.0
+        bmk_vol, bmk_sharpe, bmk_sortino = risk_ratios(bmk, bmk_total, ann_rf, trading_days)
+        bmk_dd = drawdowns(cum)
+        result['benchmarks'] = {'total_return': bmk_total, 'ann_return': bmk_total, 'ann_vol': bmk_vol,
+                                'sharpe': bmk_sharpe, 'sortino': bmk_sortino,
+                                'max_drawdown': bmk_dd.min(axis=-1)}
+        result['benchmark_drawdown'] = bmk_dd
+        result['ic'] = pearson_matrix(rets, bmk)
+        result['rank_ic'] = pearson_matrix(rank_average(rets), rank_average(bmk))
+        excess = rets[:, None, :] - bmk[None, :, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['info_ratio'] = excess.mean(axis=-1) / excess.std(axis=-1, ddof=1) * np.sqrt(trading_days)
+    return result
+
+def metrics_table(result, run_names=None, benchmark_names=None):
+    """
+    batch_metrics' output as one DataFrame in the notebook's labels (one row per run, then per
+    benchmark), with "IC <b>", "RankIC <b>" and "IR <b>" columns for the runs.
+    """
+    R = len(result['runs']['total_return'])
+    run_names = list(run_names) if run_names is not None else [f"run_{i}" for i in range(R)]
+    tables = [pd.DataFrame({label: result['runs'][key] for key, label in METRIC_LABELS.items()},
+                           index=run_names)]
+    if 'benchmarks' in result:
+        B = len(result['benchmarks']['total_return'])
+        benchmark_names = list(benchmark_names) if benchmark_names is not None else [f"benchmark_{j}" for j in range(B)]
+        for j, name in enumerate(benchmark_names):
+            tables[0][f"IC {name}"] = result['ic'][:, j]
+            tables[0][f"RankIC {name}"] = result['rank_ic'][:, j]
+            tables[0][f"IR {name}"] = result['info_ratio'][:, j]
+        tables.append(pd.DataFrame({label: result['benchmarks'][key] for key, label in METRIC_LABELS.items()
+                                    if key in result['benchmarks']}, index=benchmark_names))
+    table = pd.concat(tables)
+    for key in PERCENT_METRICS:
+        table[METRIC_LABELS[key]] *= 100
+    return table
+
+def compute_performance_metrics(df, trading_days=TRADING_DAYS, rf_rate=None):
+    """
+    Drop-in replacement for compute_performance_metrics in the TD3 notebooks: the same nested
+    {"Portfolio": {...}, "Benchmarks": {name: {...}}} dict (benchmarks are the "benchmark_"
+    columns, each also with its IC / RankIC against the portfolio), computed by batch_metrics.
+    """
+    bench_cols = [c for c in df.columns if c.startswith("benchmark_")]
+    result = batch_metrics(df['daily_return'].to_numpy()[None],
+                           df[bench_cols].to_numpy().T if bench_cols else None,
+                           values=df['portfolio_value'].to_numpy()[None],
+                           turnover=df['turnover'].to_numpy(dtype=np.float64)[None],
+                           rf_rate=rf_rate, trading_days=trading_days)
+
+    def labelled(metrics, i):
+        return {label: metrics[key][i] * (100 if key in PERCENT_METRICS else 1)
+                for key, label in METRIC_LABELS.items() if key in metrics}
+
+    benchmarks_metrics = {}
+    for j, col in enumerate(bench_cols):
+        bench = labelled(result['benchmarks'], j)
+        bench["IC"] = result['ic'][0, j]
+        bench["RankIC"] = result['rank_ic'][0, j]
+        benchmarks_metrics[col[len("benchmark_"):]] = bench
+    return {"Portfolio": labelled(result['runs'], 0), "Benchmarks": benchmarks_metrics}
+
+# --------------------------------------------------------------------------------
+# ------------------------- 4. Golden Check & Benchmark ---------------------------
+# --------------------------------------------------------------------------------
+
+class LinearPolicy:
+    """Deterministic stand-in for a trained TD3 model: action = clip(W @ obs + 1, 0, 10)."""
+
+    def __init__(self, obs_dim, n_assets, seed=0):
+        rng = np.random.default_rng(seed)
+        self.W = (rng.standard_normal((n_assets, obs_dim)) * 0.05).astype(np.float32)
+
+    def predict(self, obs, deterministic=True):
+        return np.clip(self.W @ obs + 1.0, 0.0, 10.0).astype(np.float32), None
+
+def synthetic_benchmarks(returns, n_benchmarks, seed=0):
+    """[B, T] benchmark returns: the equal-weight market plus noisy single-stock / market mixes."""
+    rng = np.random.default_rng(seed)
+    market = returns.mean(axis=1).astype(np.float64)
+    rows = [market]
+    for j in range(1, n_benchmarks):
+        stock = returns[:, j % returns.shape[1]].astype(np.float64)
+        rows.append(0.5 * market + 0.5 * stock + rng.standard_normal(len(market)) * 0.002)
+    bench = np.stack(rows)
+    bench[:, ::50] = np.round(bench[:, ::50], 3)   # ties for the rank correlation
+    return bench
+
+def metrics_match(ref, new, rtol=1e-9, atol=1e-12):
+    """Compare two nested metrics dicts; returns the paths that differ."""
+    diffs = []
+    for section in ("Portfolio", "Benchmarks"):
+        a, b = ref[section], new[section]
+        pairs = [((section,), a, b)] if section == "Portfolio" else \
+                [((section, name), a[name], b.get(name, {})) for name in a]
+        if section == "Benchmarks" and set(a) != set(b):
+            diffs.append(section)
+        for path, ma, mb in pairs:
+            for label, value in ma.items():
+                if label not in mb or not np.isclose(value, mb[label], rtol=rtol, atol=atol, equal_nan=True):
+                    diffs.append('/'.join(path + (label,)))
+    return diffs
+
+def main():
+    """
+    Check run_backtest / compute_performance_metrics / batch_metrics against the notebook
+    versions on a synthetic market with linear stand-in policies, then time backtest
+    bookkeeping and metrics for R runs x B benchmarks both ways.
+    """
+    parser = argparse.ArgumentParser(
+        description="Golden check and timing for the vectorized backtest metrics."
+    )
+    parser.add_argument("--T", type=int, default=756, help="Days of synthetic data.")
+    parser.add_argument("--n_stocks", type=int, default=45, help="Number of stocks.")
+    parser.add_argument("--runs", type=int, default=24, help="Number of policies (checkpoints) compared.")
+    parser.add_argument("--benchmarks", type=int, default=4, help="Number of benchmark series.")
+    args = parser.parse_args()
+
+    from portfolio_env import PortfolioEnv, synthetic_market
+    features, returns, rf = synthetic_market(args.T, args.n_stocks)
+    dates = pd.bdate_range("2021-01-04", periods=args.T)
+    bench = synthetic_benchmarks(returns, args.benchmarks)
+    bench_dict = {f"b{j}": bench[j] for j in range(args.benchmarks)}
+    obs_dim = args.n_stocks * features.shape[2] + args.n_stocks + 1
+    models = [LinearPolicy(obs_dim, args.n_stocks + 1, seed=i) for i in range(args.runs)]
+    env = PortfolioEnv(features, returns, rf, transaction_cost=0.001)
+    lean_env = PortfolioEnv(features, returns, rf, transaction_cost=0.001, lean=True)
+
+    # 1) Golden check: records, per-run metrics, and the batch across runs
+    ref_df = run_backtest_reference(env, models[0], dates=dates, benchmark_returns=bench_dict)
+    new_df = run_backtest(lean_env, models[0], dates=dates, benchmark_returns=bench_dict)
+    same = list(ref_df.columns) == list(new_df.columns) and all(
+        np.array_equal(np.stack(ref_df[c].to_numpy()), np.stack(new_df[c].to_numpy()))
+        if c in ('action', 'weights') else ref_df[c].equals(new_df[c].astype(ref_df[c].dtype))
+        for c in ref_df.columns)
+    if not same:
+        print("[ERROR] run_backtest records differ from the notebook version.")
+        raise SystemExit(1)
+    diffs = metrics_match(compute_performance_metrics_reference(ref_df, rf_rate=rf),
+                          compute_performance_metrics(new_df, rf_rate=rf))
+    if diffs:
+        print(f"[ERROR] compute_performance_metrics differs from the notebook version: {', '.join(diffs)}")
+        raise SystemExit(1)
+    print("[INFO] Golden check passed: run_backtest and compute_performance_metrics match the notebook versions.")
+
+    t0 = time.perf_counter()
+    ref_metrics = []
+    for model in models:
+        df = run_backtest_reference(env, model, dates=dates, benchmark_returns=bench_dict)
+        ref_metrics.append(compute_performance_metrics_reference(df, rf_rate=rf))
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    runs = backtest_runs(lean_env, models, dates=dates)
+    t_runs = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    result = batch_metrics(runs['daily_return'], bench, values=runs['portfolio_value'],
+                           turnover=runs['turnover'], rf_rate=rf)
+    t_batch = time.perf_counter() - t0
+
+    table = metrics_table(result, [f"ckpt_{i}" for i in range(args.runs)], list(bench_dict))
+    for i, ref in enumerate(ref_metrics):
+        row = table.iloc[i]
+        new = {"Portfolio": {label: row[label] for label in ref["Portfolio"]},
+               "Benchmarks": {name: {label: (row[f"{label} {name}"] if label in ("IC", "RankIC")
+                                             else table.loc[name, label]) for label in m}
+                              for name, m in ref["Benchmarks"].items()}}
+        diffs = metrics_match(ref, new)
+        if diffs:
+            print(f"[ERROR] batch_metrics differs from the notebook version for run {i}: {', '.join(diffs)}")
+            raise SystemExit(1)
+    print(f"[INFO] Golden check passed: batch_metrics matches the notebook metrics for "
+          f"{args.runs} runs x {args.benchmarks} benchmarks.")
+
+    # 2) Metrics alone: per-run DataFrames through the notebook function vs one batch call
+    frames = [pd.DataFrame({'daily_return': runs['daily_return'][i], 'portfolio_value': runs['portfolio_value'][i],
+                            'turnover': runs['turnover'][i],
+                            **{f"benchmark_{name}": b for name, b in bench_dict.items()}})
+              for i in range(args.runs)]
+    t0 = time.perf_counter()
+    for df in frames:
+        compute_performance_metrics_reference(df, rf_rate=rf)
+    t_ref_metrics = time.perf_counter() - t0
+
+    print(f"[INFO] backtests + metrics, notebook: {t_ref:.3f}s; "
+          f"preallocated + batch: {t_runs + t_batch:.3f}s ({t_ref / (t_runs + t_batch):.1f}x)")
+    print(f"[INFO] metrics only, notebook: {t_ref_metrics * 1e3:.1f}ms; "
+          f"batch_metrics: {t_batch * 1e3:.1f}ms ({t_ref_metrics / t_batch:.1f}x)")
+    print(table[list(METRIC_LABELS.values())].round(3).to_string())
+
+if __name__ == "__main__":
+    main()
+
+#### python metrics.py --T 756 --runs 24 --benchmarks 4
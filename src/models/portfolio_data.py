@@ -0,0 +1,260 @@
+#!/apps/anaconda3/bin/python
+# portfolio_data.py
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import argparse
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Reference Version ----------------------------------
+# --------------------------------------------------------------------------------
+
+def prepare_data_reference(df, start_date, end_date, tickers, feature_cols):
+    """
+    The original day-by-day loop from the TD3 notebooks, kept to check prepare_data against.
+    One boolean filter per date plus itertuples/getattr per row: O(T*N) filters in total.
+    """
+    mask = (df['date'] >= start_date) & (df['date'] <= end_date) & (df['ticker'].isin(tickers))
+    sub = df.loc[mask].copy()
+    sub.sort_values(by=['date', 'ticker'], inplace=True)
+    unique_dates = sub['date'].unique()
+
+    n_dates = len(unique_dates)
+    n_tickers = len(tickers)
+    n_features = len(feature_cols)
+
+    feature_array = np.zeros((n_dates, n_tickers, n_features), dtype=np.float32)
+    return_array = np.zeros((n_dates, n_tickers), dtype=np.float32)
+    ticker_to_idx = {t: i for i, t in enumerate(tickers)}
+
+    for t_i, day in enumerate(unique_dates):
+        day_rows = sub[sub['date'] == day]
+        for row in day_rows.itertuples(index=False):
+            idx = ticker_to_idx[row.ticker]
+            feats = [getattr(row, c) for c in feature_cols]
+            feature_array[t_i, idx, :] = feats
+            return_array[t_i, idx] = row.returns
+
+    return unique_dates, feature_array, return_array
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Vectorized Version ---------------------------------
+# --------------------------------------------------------------------------------
+
+def prepare_data(df, start_date, end_date, tickers, feature_cols, return_col='returns',
+                 return_mask=False, cache_dir=None, mmap=False):
+    """
+    Filters df by [start_date, end_date] and tickers, then organizes
+    daily features and returns for each ticker in a consistent shape.
+    Same arrays as the notebook loop (prepare_data_reference), built with one index-based scatter.
+
+    Returns:
+        date_array (1D np.array of shape [T]): The unique, sorted dates in the range.
+        feature_array (3D np.array of shape [T, n_tickers, n_features]):
+                      Features for each day, each ticker (0 where the ticker has no row).
+        return_array (2D np.array of shape [T, n_tickers]):
+                      Realized daily returns for each ticker (0 where the ticker has no row).
+        mask_array (2D bool np.array of shape [T, n_tickers]), only if return_mask:
+                      True where the ticker has a row that day, so missing ticker-days can be
+                      told apart from genuine zeros.
+
+    With cache_dir, the arrays are saved as .npy files keyed by (date range, tickers,
+    feature_cols, return_col) and a hash of the selected rows, and loaded on the next call
+    (memory-mapped read-only if mmap).
+    """
+    mask = (df['date'] >= start_date) & (df['date'] <= end_date) & (df['ticker'].isin(tickers))
+    sub = df.loc[mask, ['date', 'ticker', return_col] + [c for c in feature_cols if c != return_col]]
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, cache_key(sub, start_date, end_date, tickers, feature_cols, return_col))
+        if os.path.isdir(cache_path):
+            arrays = load_cached_arrays(cache_path, mmap)
+            return arrays if return_mask else arrays[:3]
+
+    # 1) Same order as the loop; where a (date, ticker) repeats, the loop's last write wins
+    sub = sub.sort_values(by=['date', 'ticker'])
+    unique_dates = np.asarray(sub['date'].unique())
+    sub = sub.drop_duplicates(subset=['date', 'ticker'], keep='last')
+
+    # 2) Row -> (date index, ticker index); dates are sorted, so factorize codes follow unique_dates
+    ticker_to_idx = {t: i for i, t in enumerate(tickers)}
+    date_idx = pd.factorize(sub['date'])[0]
+    ticker_idx = sub['ticker'].map(ticker_to_idx).to_numpy(dtype=np.intp)
+
+    # 3) Scatter every row at once
+    n_dates, n_tickers, n_features = len(unique_dates), len(tickers), len(feature_cols)
+    feature_array = np.zeros((n_dates, n_tickers, n_features), dtype=np.float32)
+    return_array = np.zeros((n_dates, n_tickers), dtype=np.float32)
+    mask_array = np.zeros((n_dates, n_tickers), dtype=bool)
+    feature_array[date_idx, ticker_idx, :] = sub[list(feature_cols)].to_numpy(dtype=np.float64)
+    return_array[date_idx, ticker_idx] = sub[return_col].to_numpy(dtype=np.float64)
+    mask_array[date_idx, ticker_idx] = True
+
+    arrays = (unique_dates, feature_array, return_array, mask_array)
+    if cache_path is not None:
+        save_cached_arrays(cache_path, arrays, {
+            'start_date': str(start_date), 'end_date': str(end_date), 'tickers': list(tickers),
+            'feature_cols': list(feature_cols), 'return_col': return_col
+        })
+    return arrays if return_mask else arrays[:3]
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Array Cache ----------------------------------------
+# --------------------------------------------------------------------------------
+
+CACHE_ARRAYS = ('dates', 'features', 'returns', 'mask')
+
+def cache_key(sub, start_date, end_date, tickers, feature_cols, return_col):
+    """
+    Cache directory name: the request plus a content hash of the selected rows, so an
+    edited feature table never serves stale arrays.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([str(start_date), str(end_date), list(tickers),
+                              list(feature_cols), return_col]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(sub, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def save_cached_arrays(cache_path, arrays, meta):
+    """
+    Write the arrays to a temp directory and rename it into place, so readers never see half a cache.
+    Object dates would be pickled, which np.load refuses, so they are stored as fixed-width strings
+    (str dates) or datetime64[ns] (Timestamps); meta['dates_dtype'] records the original dtype and
+    load_cached_arrays restores it, so a cache hit returns the same dates as a miss.
+    """
+    tmp_path = cache_path + f'.tmp{os.getpid()}'
+    os.makedirs(tmp_path, exist_ok=True)
+    meta = dict(meta, dates_dtype=np.asarray(arrays[0]).dtype.str)
+    for name, arr in zip(CACHE_ARRAYS, arrays):
+        arr = np.asarray(arr)
+        if name == 'dates' and arr.dtype == object:
+            if all(isinstance(d, str) for d in arr):
+                arr = arr.astype(str)
+            else:
+                arr = np.asarray(pd.to_datetime(arr), dtype='datetime64[ns]')
+        np.save(os.path.join(tmp_path, name + '.npy'), arr, allow_pickle=False)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    try:
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Another process cached the same key first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def load_cached_arrays(cache_path, mmap=False):
+    """
+    Load (dates, features, returns, mask) from a cache directory, with the dates in the dtype they were saved from.
+    """
+    arrays = [np.load(os.path.join(cache_path, name + '.npy'), mmap_mode='r' if mmap else None)
+              for name in CACHE_ARRAYS]
+    with open(os.path.join(cache_path, 'meta.json')) as f:
+        dates_dtype = json.load(f).get('dates_dtype')
+    if dates_dtype is not None and np.dtype(dates_dtype) != arrays[0].dtype:
+        if np.dtype(dates_dtype) == object and arrays[0].dtype.kind == 'M':
+            arrays[0] = np.asarray(list(pd.to_datetime(arrays[0])), dtype=object)
+        else:
+            arrays[0] = arrays[0].astype(dates_dtype)
+    return tuple(arrays)
+
+def check_cache_round_trip(arrays):
+    """
+    Save arrays (dates, features, returns, mask) to a temporary cache and load them back,
+    with the dates as given, as object Timestamps and as str. Returns True if every load
+    matches, dates dtype included (a cache hit must return what a miss returned).
+    """
+    dates = pd.to_datetime(arrays[0])
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for variant, variant_dates in (('given', np.asarray(arrays[0])),
+                                       ('object', np.asarray(list(dates), dtype=object)),
+                                       ('str', np.asarray(list(dates.strftime('%Y-%m-%d')), dtype=object))):
+            cache_path = os.path.join(tmp_dir, variant)
+            save_cached_arrays(cache_path, (variant_dates,) + tuple(arrays[1:]), {'variant': variant})
+            loaded = load_cached_arrays(cache_path)
+            if not (loaded[0].dtype == variant_dates.dtype and np.array_equal(loaded[0], variant_dates)
+                    and all(np.array_equal(a, b, equal_nan=True) for a, b in zip(arrays[1:], loaded[1:]))):
+                return False
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return True
+
+def main():
+    """
+    Check prepare_data against the notebook loop on a feature table and time both.
+    Exits with status 1 if any array differs.
+    """
+    parser = argparse.ArgumentParser(
+        description="Golden check and timing for the vectorized prepare_data."
+    )
+    parser.add_argument("--input", required=True,
+                        help="Feature table (.csv or .parquet) with 'date', 'ticker', 'returns' and features.")
+    parser.add_argument("--start_date", default="2018-01-01", help="Start date (YYYY-MM-DD).")
+    parser.add_argument("--end_date", default="2024-12-31", help="End date (YYYY-MM-DD).")
+    parser.add_argument("--feature_cols", nargs="*", default=None,
+                        help="Feature columns (default: every column after 'date' and 'ticker').")
+    parser.add_argument("--cache_dir", default=None, help="Optional directory for the .npy cache.")
+    parser.add_argument("--profile", default=None,
+                        help="Write a stage profile (wall/CPU time, peak RSS, throughput) of this run to this JSON file.")
+    args = parser.parse_args()
+
+    if args.profile:
+        # benchmarks/instrumentation.py, imported only when profiling
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+        from instrumentation import run_profiled
+        run_profiled(args.profile, 'prepare_data', run_cli, args, unit='rows', count=int)
+    else:
+        run_cli(args)
+
+def run_cli(args):
+    """Run the golden check and timing for parsed command-line arguments. Returns the number of input rows."""
+    if args.input.endswith('.parquet'):
+        df = pd.read_parquet(args.input)
+    else:
+        df = pd.read_csv(args.input)
+    df['date'] = pd.to_datetime(df['date'])
+    tickers = sorted(df['ticker'].unique())
+    feature_cols = args.feature_cols or [c for c in df.columns if c not in ('date', 'ticker')]
+    print(f"[INFO] {len(df)} rows, {len(tickers)} tickers, {len(feature_cols)} features.")
+
+    t0 = time.perf_counter()
+    ref = prepare_data_reference(df, args.start_date, args.end_date, tickers, feature_cols)
+    t_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = prepare_data(df, args.start_date, args.end_date, tickers, feature_cols, cache_dir=args.cache_dir)
+    t_new = time.perf_counter() - t0
+
+    same = (np.array_equal(np.asarray(ref[0]), new[0])
+            and all(np.array_equal(a, b, equal_nan=True) for a, b in zip(ref[1:], new[1:])))
+    if not same:
+        print("[ERROR] prepare_data differs from the reference loop.")
+        raise SystemExit(1)
+    print("[INFO] Golden check passed: arrays match the reference loop.")
+    if not check_cache_round_trip(prepare_data(df, args.start_date, args.end_date, tickers, feature_cols,
+                                               return_mask=True)):
+        print("[ERROR] Cached arrays differ after a save/load round trip.")
+        raise SystemExit(1)
+    str_df = df.assign(date=df['date'].dt.strftime('%Y-%m-%d'))
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        miss, hit = (prepare_data(str_df, args.start_date, args.end_date, tickers, feature_cols,
+                                  return_mask=True, cache_dir=tmp_dir) for _ in range(2))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if not (miss[0].dtype == hit[0].dtype and np.array_equal(miss[0], hit[0])
+            and all(np.array_equal(a, b, equal_nan=True) for a, b in zip(miss[1:], hit[1:]))):
+        print("[ERROR] A cache hit returns different arrays than the miss that filled it.")
+        raise SystemExit(1)
+    print("[INFO] Cache check passed: arrays survive a save/load round trip.")
+    print(f"[INFO] reference: {t_ref:.3f}s, vectorized: {t_new:.3f}s ({t_ref / t_new:.1f}x)")
+    return len(df)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,931 @@
+#!/apps/anaconda3/bin/python
+# portfolio_env.py
+
+import time
+import argparse
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Scalar Environment ---------------------------------
+# --------------------------------------------------------------------------------
+
+class PortfolioEnv(gym.Env):
+    """
+    Illustrates a day-by-day environment where:
+      - Action at day t -> final weights w_t.
+      - Day t returns => reward from w_t.
+      - End of day t, we compute intermediate weights_{t+1} after returns.
+      - Next observation includes (features_{t+1}, intermediate_weights_{t+1}).
+    With lean=True a long-only softmax step on float32 actions allocates no array buffers: observations
+    are written into one preallocated buffer (returned as is; copy it to keep it), the weight
+    math runs in place, and history goes to preallocated per-episode arrays instead of growing
+    lists, so memory stays flat over long training runs. history_* are then views of
+    the filled part, built on access (rewards, weights and turnovers are float64, actions keep
+    the action space's dtype, action weights are float32). Long-short and simplex projections
+    still allocate their weight vector.
+    record_history=False skips history in either mode (e.g. during training); run_backtest
+    should keep it on.
+    """
+    HISTORY_FIELDS = ('rewards', 'weights', 'actions', 'action_weights', 'turnovers')
+
+    def __init__(self,
+                 feature_array,    # shape [T, n_stocks, n_features]
+                 return_array,     # shape [T, n_stocks]
+                 rf_rate,          # new: riskfree rate array; must align with T (daily rates)
+                 long_short=False,
+                 short_limit=1.0,     # e.g., 0.7 => up to 70% short
+                 borrow_cost=0.01,    # 1% annual for short (converted internally to daily)
+                 transaction_cost=0.00,  # e.g., 0.1% annual => ~0.001 daily
+                 initial_capital=1_000_000,
+                 lean=False,
+                 record_history=True,
+                 projection='softmax'):   # long-only projection: 'softmax' or 'simplex'
+        super(PortfolioEnv, self).__init__()
+        if projection not in PROJECTIONS:
+            raise ValueError(f"projection must be one of {PROJECTIONS}, got {projection!r}.")
+
+        self.feature_array = feature_array
+        self.return_array  = return_array
+        self.rf_rate = rf_rate  # now a daily series of riskfree rates
+        self.T, self.n_stocks, self.n_features = feature_array.shape
+
+        # Use provided riskfree rate (assumed daily) per step.
+        # For costs, we still treat them as annual rates scaled to daily:
+        self.daily_bcost = borrow_cost / 252.
+        self.daily_tcost = transaction_cost  # can be scaled if needed
+
+        self.long_short = long_short
+        self.short_limit = short_limit
+        self.projection = projection
+
+        self.initial_capital = float(initial_capital)
+        self._current_step = 0
+
+        # For long-short, split capital according to short_limit
+        if self.long_short:
+            self.long_capital  = self.initial_capital * (1.0 / (1.0 + self.short_limit))
+            self.short_capital = self.initial_capital * (self.short_limit / (1.0 + self.short_limit))
+        else:
+            self.long_capital  = self.initial_capital
+            self.short_capital = 0.0
+
+
+        # Observation space: flattened features + current weights (n_stocks+1)
+        obs_dim = self.n_stocks*self.n_features + (self.n_stocks+1)
+        self.observation_space = spaces.Box(
+            low=-100.0, high=100.0, shape=(obs_dim,), dtype=np.float32
+        )
+
+        # Action space: raw "preferences" for each of the n_stocks+1; will be projected
+        self.action_space = spaces.Box(
+            low=0.0, high=10.0, shape=(self.n_stocks+1,), dtype=np.float32
+        )
+
+        # Internal variables
+        self.weights = None  # shape [n_stocks+1], w[0]=cash, w[1:]=stocks
+        self.portfolio_value = None
+
+        self.lean = lean
+        self.record_history = record_history
+
+        # For logging (lean=True: history_* are served by __getattr__ from the episode buffers)
+        if not self.lean:
+            self.history_rewards = []
+            self.history_weights = []
+            self.history_actions = []
+            self.history_action_weights = []  # new: record of projected action weights
+            self.history_turnovers = []       # new: record of turnover rates
+        else:
+            n_assets = self.n_stocks + 1
+            self._obs = np.zeros(obs_dim, dtype=np.float32)
+            self._terminal_obs = np.zeros(obs_dim, dtype=np.float32)
+            self._weights = np.zeros(n_assets, dtype=np.float64)
+            self._softmax = np.zeros(n_assets, dtype=np.float32)
+            self._stock32 = np.zeros(self.n_stocks, dtype=np.float32)
+            self._stock64 = np.zeros(self.n_stocks, dtype=np.float64)
+            self._stock_t1 = np.zeros(self.n_stocks, dtype=np.result_type(np.float32, return_array.dtype))
+            self._fresh = True
+            self._history = None
+            self._n_history = 0
+
+    def _history_buffers(self):
+        """
+        Per-episode history arrays (at most T-1 steps), allocated once and reused every episode.
+        """
+        if self._history is None:
+            n_steps, n_assets = max(self.T - 1, 0), self.n_stocks + 1
+            self._history = {
+                'rewards': np.zeros(n_steps, dtype=np.float64),
+                'weights': np.zeros((n_steps, n_assets), dtype=np.float64),
+                'actions': np.zeros((n_steps, n_assets), dtype=self.action_space.dtype),
+                'action_weights': np.zeros((n_steps, n_assets), dtype=np.float32),
+                'turnovers': np.zeros(n_steps, dtype=np.float64)
+            }
+        return self._history
+
+    def __getattr__(self, name):
+        """
+        lean=True: history_<field> is a view of the filled part of the episode buffer (valid until
+        the next reset), so step() never has to re-point it.
+        """
+        field = name[len('history_'):] if name.startswith('history_') else None
+        if field in self.HISTORY_FIELDS and self.__dict__.get('lean'):
+            if self._history is None:
+                return []
+            return self._history[field][:self._n_history]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def reset(self, seed=None, options=None):
+        """Start at day 0 with full cash allocation (100% cash)."""
+        super().reset(seed=seed)
+
+        self._current_step = 0
+        self.portfolio_value = self.initial_capital
+
+        if self.lean:
+            self._weights[:] = 0.0
+            self._weights[0] = 1.0
+            self.weights = self._weights
+            self._fresh = True
+            self._n_history = 0
+            if self.record_history:
+                self._history_buffers()
+            return self._get_observation(), {}
+
+        # Start fully in cash
+        all_cash = np.zeros(self.n_stocks+1, dtype=np.float32)
+        all_cash[0] = 1.0
+        self.weights = all_cash.copy()
+
+        # Reset logging histories
+        self.history_rewards = []
+        self.history_weights = []
+        self.history_actions = []
+        self.history_action_weights = []
+        self.history_turnovers = []
+
+        obs = self._get_observation()
+        info = {}
+        return obs, info
+
+    def _get_observation(self):
+        """
+        Observation at day t includes:
+          - features for day t: shape [n_stocks, n_features] flattened
+          - intermediate weights at day t: shape [n_stocks+1]
+        """
+        if self.lean:
+            n_feats = self.n_stocks * self.n_features
+            self._obs[:n_feats] = self.feature_array[self._current_step].reshape(-1)
+            self._obs[n_feats:] = self._weights
+            return self._obs
+        feats_flat = self.feature_array[self._current_step].flatten()
+        obs = np.concatenate([feats_flat, self.weights], axis=0)
+        return obs.astype(np.float32)
+
+    def step(self, action):
+        """
+        Step logic:
+          1) Use the previous day's weights (intermediate weights) which have earned returns.
+          2) The agent provides a new action which is projected into valid portfolio weights.
+          3) Apply transaction and short costs.
+          4) Update portfolio value based on asset returns and update weights.
+        """
+        if self.lean:
+            return self._step_lean(action)
+
+        # 1) Get current intermediate weights
+        intermediate_weight_t = self.weights
+
+        # 2) Project raw action into valid portfolio weights
+        action_weight_t = self._project_action(action)
+
+        # Calculate turnover: absolute difference between new and current weights
+        turnover = np.sum(np.abs(action_weight_t[1:] - intermediate_weight_t[1:]))
+        tcost = turnover * self.daily_tcost
+
+        # Compute short borrowing cost if in long-short mode
+        if self.long_short:
+            short_exposure = np.sum(np.clip(action_weight_t[1:], a_min=None, a_max=0.0))
+            short_cost = -short_exposure * self.daily_bcost
+        else:
+            short_cost = 0.0
+
+        # Record the projected action weights and turnover rate
+        if self.record_history:
+            self.history_action_weights.append(action_weight_t.copy())
+            self.history_turnovers.append(turnover)
+
+        # 3) Transition to next time step
+        self._current_step += 1
+        returns_t1 = self.return_array[self._current_step]
+        # Use the riskfree rate for the current step (assumed to be daily)
+        current_rf = self.rf_rate[self._current_step]
+        intermediate_cash_t1 = action_weight_t[0] * (1 + current_rf)
+        intermediate_stock_t1 = action_weight_t[1:] * (1 + returns_t1)
+        intermediate_total_t1 = intermediate_cash_t1 + np.sum(intermediate_stock_t1)
+        intermediate_weights_t1 = np.concatenate([
+            [intermediate_cash_t1 / intermediate_total_t1],
+            intermediate_stock_t1 / intermediate_total_t1
+        ])
+
+        # Compute raw daily return fraction and adjust for costs
+        raw_return_fraction = (intermediate_total_t1 / np.sum(action_weight_t)) - 1.0
+        net_return_fraction = raw_return_fraction - tcost - short_cost
+
+        # Update portfolio value
+        self.portfolio_value *= (1.0 + net_return_fraction)
+
+        # 4) Update environment state and log histories
+        reward = net_return_fraction
+        self.weights = intermediate_weights_t1
+        done = (self._current_step >= (self.T - 1))
+
+        if self.record_history:
+            self.history_rewards.append(reward)
+            self.history_weights.append(intermediate_weights_t1.copy())
+            self.history_actions.append(action.copy())
+
+        if not done:
+            next_obs = self._get_observation()
+        else:
+            next_obs = np.zeros_like(self._get_observation())
+
+        info = {
+            "portfolio_value": self.portfolio_value,
+            "turnover": turnover,
+            "short_cost": short_cost,
+            "raw_return_frac": raw_return_fraction,
+            "transaction_cost": tcost,
+        }
+        return next_obs, float(reward), done, False, info
+
+    def _step_lean(self, action):
+        """
+        Same arithmetic as step() (identical results) on preallocated buffers.
+        """
+        # 2) Project raw action into valid portfolio weights (softmax in place for float32 actions)
+        if not self.long_short and self.projection == 'softmax' and action.dtype == np.float32:
+            action_weight_t = self._softmax
+            np.subtract(action, np.max(action), out=action_weight_t)
+            np.exp(action_weight_t, out=action_weight_t)
+            action_weight_t /= np.sum(action_weight_t)
+        else:
+            action_weight_t = self._project_action(action)
+
+        # Turnover; right after reset() step() still holds the float32 all-cash weights
+        if action_weight_t.dtype != np.float32:
+            turnover = np.sum(np.abs(action_weight_t[1:] - self.weights[1:].astype(
+                np.float32 if self._fresh else np.float64)))
+        elif self._fresh:
+            turnover = np.sum(np.abs(action_weight_t[1:], out=self._stock32))
+        else:
+            np.subtract(action_weight_t[1:], self._weights[1:], out=self._stock64)
+            turnover = np.sum(np.abs(self._stock64, out=self._stock64))
+        tcost = turnover * self.daily_tcost
+
+        if self.long_short:
+            short_exposure = np.sum(np.clip(action_weight_t[1:], a_min=None, a_max=0.0, out=self._stock32))
+            short_cost = -short_exposure * self.daily_bcost
+        else:
+            short_cost = 0.0
+
+        # 3) Transition to next time step, in place
+        self._current_step += 1
+        current_rf = self.rf_rate[self._current_step]
+        intermediate_cash_t1 = action_weight_t[0] * (1 + current_rf)
+        if action_weight_t.dtype == np.float32:
+            stock_t1 = np.add(self.return_array[self._current_step], 1, out=self._stock_t1)
+            stock_t1 *= action_weight_t[1:]
+        else:
+            stock_t1 = action_weight_t[1:] * (1 + self.return_array[self._current_step])
+        intermediate_total_t1 = intermediate_cash_t1 + np.sum(stock_t1)
+        raw_return_fraction = (intermediate_total_t1 / np.sum(action_weight_t)) - 1.0
+        net_return_fraction = raw_return_fraction - tcost - short_cost
+        self.portfolio_value *= (1.0 + net_return_fraction)
+        self._weights[0] = intermediate_cash_t1 / intermediate_total_t1
+        np.divide(stock_t1, intermediate_total_t1, out=self._weights[1:])
+        self._fresh = False
+
+        # 4) History into the episode buffers
+        reward = net_return_fraction
+        if self.record_history:
+            history = self._history_buffers()
+            i = self._n_history
+            history['rewards'][i] = reward
+            history['weights'][i] = self._weights
+            history['actions'][i] = action
+            history['action_weights'][i] = action_weight_t
+            history['turnovers'][i] = turnover
+            self._n_history += 1
+
+        done = (self._current_step >= (self.T - 1))
+        next_obs = self._get_observation() if not done else self._terminal_obs
+        info = {
+            "portfolio_value": self.portfolio_value,
+            "turnover": turnover,
+            "short_cost": short_cost,
+            "raw_return_frac": raw_return_fraction,
+            "transaction_cost": tcost,
+        }
+        return next_obs, float(reward), done, False, info
+
+    def _project_action(self, action):
+        """
+        Projects a raw action vector into feasible portfolio weights.
+         - Long-only mode: applies softmax (ensuring positivity & sum-to-one), or the exact
+           Euclidean projection onto the simplex with projection='simplex'.
+         - Long-short mode: applies a custom projection to honor long/short limits.
+        Runs the batched projections (section 2) on a batch of one.
+        """
+        batch = np.asarray(action)[None, :]
+        if self.long_short:
+            return longshort_collateral_weights(batch, self.short_limit)[0]
+        if self.projection == 'simplex':
+            return simplex_weights(batch)[0]
+        return softmax_weights(batch)[0]
+
+    def render(self, mode='human'):
+        print(f"Step: {self._current_step}, Portfolio Value: {self.portfolio_value:.2f}, Weights: {self.weights}")
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Batched Projections --------------------------------
+# --------------------------------------------------------------------------------
+
+PROJECTIONS = ('softmax', 'simplex')
+
+def softmax_weights(actions):
+    """
+    Row-wise softmax of a [B, n_stocks+1] action batch (long-only projection).
+    """
+    shifted = actions - actions.max(axis=1, keepdims=True)
+    exp_w = np.exp(shifted)
+    return exp_w / exp_w.sum(axis=1, keepdims=True)
+
+def simplex_weights(actions, total=1.0):
+    """
+    Exact Euclidean projection of each row of a [B, n_stocks+1] action batch onto the simplex
+    {w >= 0, sum(w) = total}, by sorting: w = max(a - theta, 0), where theta is found from the
+    largest k with u_k > (sum(u_1..u_k) - total) / k on the row sorted in decreasing order.
+    Unlike softmax it can put exactly zero weight on an asset. Computed in float64 (the
+    cumulative sums cancel badly in float32 for large actions); rows come back in the action dtype.
+    """
+    a = actions.astype(np.float64)
+    u = -np.sort(-a, axis=1)
+    css = np.cumsum(u, axis=1) - total
+    k = np.arange(1, a.shape[1] + 1)
+    n_active = np.count_nonzero(u * k > css, axis=1)
+    theta = css[np.arange(len(a)), n_active - 1] / n_active
+    return np.maximum(a - theta[:, None], 0).astype(actions.dtype)
+
+def longshort_collateral_weights(actions, short_limit):
+    """
+    Batched collateral-constrained long/short projection for a [B, n_stocks+1] action batch:
+      - Longs are scaled to sum to 1 and shorts to -min(short/long preference ratio, short_limit)
+        when long preferences dominate; otherwise shorts sum to -short_limit, longs to the
+        long/short ratio, and the unused long capital stays in cash.
+      - Cash (column 0) is short_limit plus that unused capital, floored at 0; the action's
+        own cash entry is ignored.
+    short_limit is a scalar or a [B] array. Follows the original per-env arithmetic step by
+    step (in the action dtype), so every row equals the scalar projection of that action.
+    """
+    dtype = actions.dtype
+    short_limit = np.asarray(short_limit).astype(dtype)
+    a_stocks = actions[:, 1:]
+    # maximum/minimum rather than clip (same values, a fraction of the call overhead);
+    # negation is exact, so -sum(neg) is bit for bit the scalar |sum(neg)| and sum(|neg|)
+    pos_raw = np.maximum(a_stocks, 0)
+    neg_raw = np.minimum(a_stocks, 0)
+    sum_pos = pos_raw.sum(axis=1)
+    sum_neg_abs = -neg_raw.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        more_long = sum_pos >= sum_neg_abs
+        neg_over_pos = sum_neg_abs / sum_pos
+        pos_over_neg = sum_pos / sum_neg_abs
+        short_ratio = np.where(more_long, np.minimum(neg_over_pos, short_limit), short_limit)
+        long_ratio = np.where(more_long, dtype.type(1), np.minimum(dtype.type(1), pos_over_neg))
+        cash = np.where(more_long, short_limit, short_limit + (1 - pos_over_neg))
+        short_weights = neg_raw / sum_neg_abs[:, None] * short_ratio[:, None]
+        long_weights = pos_raw / sum_pos[:, None] * long_ratio[:, None]
+
+    w_final = np.empty(actions.shape, dtype=np.float32)
+    w_final[:, 0] = np.maximum(cash, 0)
+    w_final[:, 1:] = np.where(a_stocks >= 0, long_weights, short_weights)
+    return w_final
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Batched Environment --------------------------------
+# --------------------------------------------------------------------------------
+
+def per_env(value, num_envs, dtype):
+    """Broadcast a scalar or per-env sequence setting to a [num_envs] array."""
+    arr = np.asarray(value, dtype=dtype)
+    if arr.ndim == 0:
+        return np.full(num_envs, arr, dtype=dtype)
+    if arr.shape != (num_envs,):
+        raise ValueError(f"Expected a scalar or {num_envs} values, got shape {arr.shape}.")
+    return arr
+
+# [B]-leading arrays of BatchedPortfolioEnv that get_attr/set_attr slice per env
+PER_ENV_ATTRS = ('start_offsets', 'long_short', 'short_limit', 'daily_bcost', 'daily_tcost', 'start', 'end',
+                 't', 'fresh', 'weights', 'portfolio_value', 'episode_reward', 'obs', 'rewards')
+
+class BatchedPortfolioEnv(VecEnv):
+    """
+    PortfolioEnv stepped for B independent episodes at once, behind the SB3 VecEnv interface,
+    so TD3 collects B transitions per call with no per-env Python step loop.
+      - Each episode covers a window of `window` days (the whole series if None; a length drawn
+        from [min_window, window] if min_window is given) starting at its own offset, drawn
+        at every reset (or fixed via start_offsets).
+      - long_short, short_limit, borrow_cost and transaction_cost may differ per env;
+        projection ('softmax' or 'simplex') applies to all long-only envs.
+      - State lives in preallocated [B, ...] buffers; nothing is appended per step.
+      - Finished episodes reset automatically; their last observation is in
+        info['terminal_observation'] and their total reward / length in info['episode'].
+    An episode over window [s, s+L) gives the same rewards, weights and portfolio values as
+    PortfolioEnv on feature_array[s:s+L], return_array[s:s+L], rf_rate[s:s+L] (for the
+    notebook dtypes: float32 features/returns/actions and a float64 rf_rate array).
+    """
+    render_mode = None
+
+    def __init__(self,
+                 feature_array,
+                 return_array,
+                 rf_rate,
+                 num_envs=8,
+                 window=None,
+                 min_window=None,
+                 start_offsets=None,
+                 long_short=False,
+                 short_limit=1.0,
+                 borrow_cost=0.01,
+                 transaction_cost=0.00,
+                 initial_capital=1_000_000,
+                 projection='softmax',
+                 seed=None):
+        if projection not in PROJECTIONS:
+            raise ValueError(f"projection must be one of {PROJECTIONS}, got {projection!r}.")
+        self.feature_array = feature_array
+        self.return_array = return_array
+        self.rf_rate = np.asarray(rf_rate)
+        self.T, self.n_stocks, self.n_features = feature_array.shape
+        self.window = self.T if window is None else int(window)
+        self.min_window = self.window if min_window is None else int(min_window)
+        if not 2 <= self.min_window <= self.window <= self.T:
+            raise ValueError(f"Need 2 <= min_window <= window <= T ({self.T}).")
+        self.start_offsets = None if start_offsets is None else per_env(start_offsets, num_envs, np.int64)
+        self._check_start_offsets()
+
+        self.long_short = per_env(long_short, num_envs, bool)
+        self.short_limit = per_env(short_limit, num_envs, np.float64)
+        self.daily_bcost = per_env(borrow_cost, num_envs, np.float64) / 252.
+        self.daily_tcost = per_env(transaction_cost, num_envs, np.float64)
+        self.initial_capital = float(initial_capital)
+        self.projection = projection
+        self.rng = np.random.default_rng(seed)
+
+        obs_dim = self.n_stocks * self.n_features + (self.n_stocks + 1)
+        observation_space = spaces.Box(low=-100.0, high=100.0, shape=(obs_dim,), dtype=np.float32)
+        action_space = spaces.Box(low=0.0, high=10.0, shape=(self.n_stocks + 1,), dtype=np.float32)
+        super().__init__(num_envs, observation_space, action_space)
+
+        # Weights dtype after one step (float64 for float32 returns and a float64 rf_rate)
+        state_dtype = np.result_type(np.float32, return_array.dtype, self.rf_rate.dtype)
+        B, n = num_envs, self.n_stocks
+        self.start = np.zeros(B, dtype=np.int64)
+        self.end = np.zeros(B, dtype=np.int64)
+        self.t = np.zeros(B, dtype=np.int64)
+        self.fresh = np.ones(B, dtype=bool)
+        self.weights = np.zeros((B, n + 1), dtype=state_dtype)
+        self.portfolio_value = np.zeros(B, dtype=np.float64)
+        self.episode_reward = np.zeros(B, dtype=np.float64)
+        self.obs = np.zeros((B, obs_dim), dtype=np.float32)
+        self.rewards = np.zeros(B, dtype=np.float64)
+        self.actions = None
+
+    def _check_start_offsets(self):
+        """Fixed offsets must leave room for a full window: 0 <= offset and offset + window <= T."""
+        if self.start_offsets is None:
+            return
+        bad = (self.start_offsets < 0) | (self.start_offsets + self.window > self.T)
+        if bad.any():
+            raise ValueError(f"start_offsets {self.start_offsets[bad].tolist()} out of range: need "
+                             f"0 <= offset <= T - window ({self.T} - {self.window} = {self.T - self.window}).")
+
+    def _reset_envs(self, idx):
+        """Draw new windows for the envs in idx and put them fully in cash."""
+        lengths = self.rng.integers(self.min_window, self.window + 1, size=len(idx))
+        if self.start_offsets is not None:
+            self._check_start_offsets()
+            starts = self.start_offsets[idx]
+        else:
+            starts = self.rng.integers(0, self.T - lengths + 1)
+        self.start[idx] = starts
+        self.end[idx] = starts + lengths - 1
+        self.t[idx] = starts
+        self.fresh[idx] = True
+        self.weights[idx] = 0.0
+        self.weights[idx, 0] = 1.0
+        self.portfolio_value[idx] = self.initial_capital
+        self.episode_reward[idx] = 0.0
+
+    def _fill_observations(self, idx):
+        feats = self.feature_array[self.t[idx]].reshape(len(idx), -1)
+        n_feat = feats.shape[1]
+        self.obs[idx, :n_feat] = feats
+        self.obs[idx, n_feat:] = self.weights[idx]
+
+    def reset(self):
+        if self._seeds and self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        idx = np.arange(self.num_envs)
+        self._reset_envs(idx)
+        self._fill_observations(idx)
+        return self.obs.copy()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=self.action_space.dtype)
+
+    def step_wait(self):
+        actions = self.actions
+        B = self.num_envs
+        rows = np.arange(B)
+
+        # 2) Project raw actions into portfolio weights (softmax/simplex or long/short collateral)
+        ls = self.long_short
+        action_weight = simplex_weights(actions) if self.projection == 'simplex' else softmax_weights(actions)
+        if ls.any():
+            action_weight[ls] = longshort_collateral_weights(actions[ls], self.short_limit[ls])
+        stock_w = action_weight[:, 1:]
+
+        # Turnover and costs; right after a reset the scalar env still holds float32 weights
+        fresh = self.fresh
+        turnover = np.abs(stock_w - self.weights[:, 1:]).sum(axis=1)
+        tcost = turnover * self.daily_tcost
+        if fresh.any():
+            turnover_fresh = np.abs(stock_w[fresh]).sum(axis=1)
+            turnover[fresh] = turnover_fresh
+            tcost[fresh] = turnover_fresh * self.daily_tcost[fresh].astype(turnover_fresh.dtype)
+        short_cost = np.zeros(B, dtype=np.float64)
+        if ls.any():
+            exposure = np.clip(stock_w[ls], None, 0.0).sum(axis=1)
+            short_cost[ls] = -exposure * self.daily_bcost[ls].astype(exposure.dtype)
+
+        # 3) Move to the next day and let the weights earn that day's returns
+        self.t += 1
+        returns_t1 = self.return_array[self.t]
+        cash_t1 = action_weight[:, 0] * (1 + self.rf_rate[self.t])
+        stock_t1 = stock_w * (1 + returns_t1)
+        total_t1 = cash_t1 + stock_t1.sum(axis=1)
+        raw_return = total_t1 / action_weight.sum(axis=1) - 1.0
+        self.rewards[:] = raw_return - tcost - short_cost
+
+        self.portfolio_value *= (1.0 + self.rewards)
+        self.episode_reward += self.rewards
+        self.weights[:, 0] = cash_t1 / total_t1
+        self.weights[:, 1:] = stock_t1 / total_t1[:, None]
+        self.fresh[:] = False
+
+        # 4) Observations, infos and automatic resets
+        dones = self.t >= self.end
+        self._fill_observations(rows)
+        infos = [{
+            "portfolio_value": self.portfolio_value[b],
+            "turnover": turnover[b],
+            "short_cost": short_cost[b] if ls[b] else 0.0,
+            "raw_return_frac": raw_return[b],
+            "transaction_cost": tcost[b],
+        } for b in range(B)]
+        done_idx = np.flatnonzero(dones)
+        if len(done_idx):
+            for b in done_idx:
+                infos[b]["terminal_observation"] = np.zeros(self.obs.shape[1], dtype=np.float32)
+                infos[b]["episode"] = {"r": self.episode_reward[b], "l": int(self.t[b] - self.start[b])}
+                infos[b]["TimeLimit.truncated"] = False
+            self._reset_envs(done_idx)
+            self._fill_observations(done_idx)
+        return self.obs.copy(), self.rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        pass
+
+    def _all_envs(self, indices):
+        return indices is None or sorted(self._get_indices(indices)) == list(range(self.num_envs))
+
+    def get_attr(self, attr_name, indices=None):
+        """Per-env settings and state (PER_ENV_ATTRS) are sliced per env; other attributes are shared."""
+        value = getattr(self, attr_name)
+        if attr_name in PER_ENV_ATTRS and value is not None:
+            return [value[i] for i in self._get_indices(indices)]
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        """
+        Per-env attributes (PER_ENV_ATTRS) are set for the given envs only; an attribute shared
+        by all envs can only be set for all of them.
+        """
+        current = getattr(self, attr_name, None)
+        if attr_name in PER_ENV_ATTRS and current is not None:
+            updated = current.copy()
+            updated[list(self._get_indices(indices))] = value
+        elif self._all_envs(indices):
+            updated = value
+        else:
+            raise NotImplementedError(f"'{attr_name}' is shared by all envs of a BatchedPortfolioEnv; "
+                                      f"it cannot be set for a subset of them.")
+        if attr_name == 'start_offsets':
+            updated = None if updated is None else per_env(updated, self.num_envs, np.int64)
+            previous, self.start_offsets = self.start_offsets, updated
+            try:
+                self._check_start_offsets()
+            except ValueError:
+                self.start_offsets = previous
+                raise
+        else:
+            setattr(self, attr_name, updated)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """
+        Methods act on the whole batch, so they can only be called for all envs. The method
+        runs once and its result is repeated for each env.
+        """
+        if not self._all_envs(indices):
+            raise NotImplementedError(f"BatchedPortfolioEnv.{method_name} acts on all envs; "
+                                      f"it cannot be called for a subset of them.")
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result] * len(self._get_indices(indices))
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+# --------------------------------------------------------------------------------
+# ------------------------- 4. Golden Check & Benchmark ---------------------------
+# --------------------------------------------------------------------------------
+
+def synthetic_market(T=1000, n_stocks=45, n_features=6, seed=0):
+    """Random float32 features/returns and a float64 daily rf series, like prepare_data's output."""
+    rng = np.random.default_rng(seed)
+    features = rng.standard_normal((T, n_stocks, n_features)).astype(np.float32)
+    returns = (rng.standard_normal((T, n_stocks)) * 0.02).astype(np.float32)
+    rf = np.full(T, 0.02 / 252) + rng.standard_normal(T) * 1e-6
+    return features, returns, rf
+
+def project_softmax_reference(action):
+    """The original per-step long-only projection of PortfolioEnv."""
+    shifted = action - np.max(action)
+    exp_w = np.exp(shifted)
+    return exp_w / np.sum(exp_w)
+
+def project_longshort_reference(action, short_limit):
+    """
+    The original per-step _project_action_longshort_with_collateral of PortfolioEnv
+    (nested weight_norm and a Python loop over stocks), kept to check the batched version against.
+    """
+    def weight_norm(weight, ratio):
+        weight = weight/np.abs(np.sum(weight)) * ratio
+        return weight
+
+    w_final = np.zeros(len(action), dtype=np.float32)
+    a_stocks = action[1:]
+    pos_raw = np.clip(a_stocks, 0, None)
+    neg_raw = np.clip(a_stocks, None, 0)
+
+    sum_pos = pos_raw.sum()
+    sum_neg_abs = np.abs(neg_raw).sum()
+
+    if sum_pos >= sum_neg_abs:
+        cash = short_limit
+        short_weights = weight_norm(neg_raw, min(sum_neg_abs/sum_pos, short_limit))
+        long_weights = weight_norm(pos_raw, 1)
+    else:
+        cash = short_limit + (1 - sum_pos/sum_neg_abs)
+        short_weights = weight_norm(neg_raw, short_limit)
+        long_weights = weight_norm(pos_raw, min(1, sum_pos/sum_neg_abs))
+
+    if cash < 0:
+        cash = 0
+
+    w_final[0] = cash
+    for i in range(len(a_stocks)):
+        if a_stocks[i] >= 0:
+            w_final[i+1] = long_weights[i]
+        else:
+            w_final[i+1] = short_weights[i]
+    return w_final
+
+def check_projections(n_assets=46, batch=512, seed=0, tol=1e-5):
+    """
+    Property checks of the batched projections on random action batches (several scales,
+    ties, all-equal and one-hot rows). Returns a list of failed property names:
+      - softmax / longshort: every row equals the original per-step projection.
+      - simplex: w >= 0, sum(w) = 1, w = max(a - theta, 0) for a single theta (the KKT
+        conditions, so w is the exact Euclidean projection), and points already on the
+        simplex are left where they are.
+      - longshort: cash >= 0, longs sum to at most 1, shorts to at least -short_limit,
+        and every weight has the sign of its stock action.
+    """
+    rng = np.random.default_rng(seed)
+    failed = set()
+    for scale in (1e-3, 1.0, 10.0, 1e3):
+        actions = (rng.standard_normal((batch, n_assets)) * scale).astype(np.float32)
+        actions[0] = 0.0
+        actions[1, :] = scale
+        actions[2] = 0.0
+        actions[2, 5] = scale
+        actions[3] = np.round(actions[3] / scale) * scale   # ties
+        short_limit = rng.uniform(0.0, 1.5, batch)
+
+        soft = softmax_weights(actions)
+        if not all(np.array_equal(soft[b], project_softmax_reference(actions[b])) for b in range(batch)):
+            failed.add('softmax matches reference')
+
+        w = simplex_weights(actions)
+        if w.dtype != actions.dtype or (w < 0).any() or not np.allclose(w.sum(axis=1), 1.0, atol=tol):
+            failed.add('simplex feasible')
+        active = w > 0
+        theta = np.where(active, actions - w, np.nan)
+        spread = np.nanmax(theta, axis=1) - np.nanmin(theta, axis=1)
+        if (spread > tol * max(scale, 1.0)).any():
+            failed.add('simplex single threshold')
+        theta_max = np.nanmax(theta, axis=1)
+        if (np.where(active, -np.inf, actions) > theta_max[:, None] + tol * max(scale, 1.0)).any():
+            failed.add('simplex zeroed entries below threshold')
+        if not np.allclose(simplex_weights(w), w, atol=tol):
+            failed.add('simplex idempotent')
+
+        ls_actions = actions.copy()
+        ls_actions[0, 1] = scale   # at least one long in the all-zero row
+        ls = longshort_collateral_weights(ls_actions, short_limit)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            reference = np.stack([project_longshort_reference(ls_actions[b], float(short_limit[b]))
+                                  for b in range(batch)])
+        if not np.array_equal(ls, reference, equal_nan=True):
+            failed.add('longshort matches reference')
+        stocks = ls[:, 1:]
+        with np.errstate(invalid='ignore'):
+            if (ls[:, 0] < 0).any():
+                failed.add('longshort cash >= 0')
+            if (np.clip(stocks, 0, None).sum(axis=1) > 1 + tol).any():
+                failed.add('longshort longs <= 1')
+            if (np.clip(stocks, None, 0).sum(axis=1) < -short_limit - tol).any():
+                failed.add('longshort shorts >= -short_limit')
+            if ((stocks > 0) & (ls_actions[:, 1:] < 0)).any() or ((stocks < 0) & (ls_actions[:, 1:] > 0)).any():
+                failed.add('longshort signs follow actions')
+    return sorted(failed)
+
+def check_against_scalar(features, returns, rf, num_envs=6, window=60, projection='softmax', seed=0):
+    """
+    Run B windows in the batched env and the same windows in PortfolioEnv with the same actions
+    (mixed long-only / long-short and costs). Returns the number of mismatching steps.
+    """
+    rng = np.random.default_rng(seed)
+    T = len(features)
+    starts = rng.integers(0, T - window + 1, size=num_envs)
+    settings = dict(long_short=np.arange(num_envs) % 2 == 1,
+                    short_limit=rng.uniform(0.3, 1.0, num_envs),
+                    borrow_cost=rng.uniform(0.0, 0.03, num_envs),
+                    transaction_cost=rng.uniform(0.0, 0.002, num_envs))
+    venv = BatchedPortfolioEnv(features, returns, rf, num_envs=num_envs, window=window,
+                               start_offsets=starts, projection=projection, **settings)
+    envs = [PortfolioEnv(features[s:s + window], returns[s:s + window], rf[s:s + window],
+                         long_short=bool(settings['long_short'][b]),
+                         short_limit=float(settings['short_limit'][b]),
+                         borrow_cost=float(settings['borrow_cost'][b]),
+                         transaction_cost=float(settings['transaction_cost'][b]),
+                         projection=projection)
+            for b, s in enumerate(starts)]
+
+    mismatches = 0
+    obs = venv.reset()
+    scalar_obs = [env.reset()[0] for env in envs]
+    mismatches += sum(not np.array_equal(obs[b], scalar_obs[b]) for b in range(num_envs))
+    for _ in range(window - 1):
+        actions = rng.uniform(-1.0, 10.0, size=(num_envs, venv.n_stocks + 1)).astype(np.float32)
+        obs, rewards, dones, infos = venv.step(actions)
+        for b, env in enumerate(envs):
+            s_obs, s_reward, s_done, _, s_info = env.step(actions[b])
+            v_obs = infos[b]["terminal_observation"] if dones[b] else obs[b]
+            same = (np.array_equal(v_obs, s_obs) and s_done == dones[b]
+                    and float(venv.rewards[b]) == s_reward
+                    and float(infos[b]["portfolio_value"]) == float(s_info["portfolio_value"]))
+            mismatches += not same
+    return mismatches
+
+def check_lean(features, returns, rf, seed=0):
+    """
+    Run PortfolioEnv with and without lean=True on the same actions (long-only and long-short,
+    two episodes each). Returns the number of mismatching steps or history arrays.
+    """
+    rng = np.random.default_rng(seed)
+    mismatches = 0
+    for long_short in (False, True):
+        kwargs = dict(long_short=long_short, short_limit=0.7, transaction_cost=0.001)
+        env = PortfolioEnv(features, returns, rf, **kwargs)
+        lean_env = PortfolioEnv(features, returns, rf, lean=True, **kwargs)
+        for _ in range(2):
+            mismatches += not np.array_equal(env.reset()[0], lean_env.reset()[0])
+            done = False
+            while not done:
+                action = rng.uniform(-10.0 if long_short else 0.0, 10.0, env.n_stocks + 1).astype(np.float32)
+                obs, reward, done, _, info = env.step(action)
+                l_obs, l_reward, l_done, _, l_info = lean_env.step(action)
+                mismatches += not (np.array_equal(obs, l_obs) and reward == l_reward and done == l_done
+                                   and info['portfolio_value'] == l_info['portfolio_value'])
+            for field in PortfolioEnv.HISTORY_FIELDS:
+                mismatches += not np.array_equal(np.array(getattr(env, 'history_' + field)),
+                                                 getattr(lean_env, 'history_' + field))
+    return mismatches
+
+def steps_per_second(step_fn, n_steps):
+    t0 = time.perf_counter()
+    step_fn(n_steps)
+    return n_steps / (time.perf_counter() - t0)
+
+def main():
+    """
+    Check BatchedPortfolioEnv against PortfolioEnv on synthetic data, then report
+    environment steps/sec of the scalar class and of the batched env for several B.
+    """
+    parser = argparse.ArgumentParser(
+        description="Golden check and steps/sec benchmark for BatchedPortfolioEnv."
+    )
+    parser.add_argument("--T", type=int, default=1000, help="Days of synthetic data.")
+    parser.add_argument("--n_stocks", type=int, default=45, help="Number of stocks.")
+    parser.add_argument("--n_features", type=int, default=6, help="Features per stock.")
+    parser.add_argument("--steps", type=int, default=20000, help="Environment steps timed per setting.")
+    parser.add_argument("--num_envs", type=int, nargs="*", default=[1, 8, 64, 256],
+                        help="Batch sizes to time.")
+    args = parser.parse_args()
+
+    failed = check_projections(args.n_stocks + 1)
+    if failed:
+        print(f"[ERROR] Projection properties failed: {', '.join(failed)}")
+        raise SystemExit(1)
+    print("[INFO] Projection checks passed: softmax/long-short match the original projections, "
+          "simplex weights are the exact projection.")
+
+    features, returns, rf = synthetic_market(args.T, args.n_stocks, args.n_features)
+    for projection in PROJECTIONS:
+        mismatches = check_against_scalar(features, returns, rf, projection=projection)
+        if mismatches:
+            print(f"[ERROR] {mismatches} steps differ from the scalar PortfolioEnv ({projection}).")
+            raise SystemExit(1)
+    print("[INFO] Golden check passed: batched episodes match PortfolioEnv step for step.")
+    mismatches = check_lean(features[:300], returns[:300], rf[:300])
+    if mismatches:
+        print(f"[ERROR] {mismatches} steps/histories differ between lean and default PortfolioEnv.")
+        raise SystemExit(1)
+    print("[INFO] Golden check passed: lean PortfolioEnv matches the default step path.")
+
+    rng = np.random.default_rng(1)
+    action_pool = rng.uniform(0.0, 10.0, size=(1024, args.n_stocks + 1)).astype(np.float32)
+
+    # Long/short projection per action: original loop vs the batched kernel (batch of one and of 1024)
+    ls_pool = action_pool - 5.0
+    def run_reference(n_calls):
+        for i in range(n_calls):
+            project_longshort_reference(ls_pool[i % len(ls_pool)], 0.7)
+    def run_single(n_calls):
+        for i in range(n_calls):
+            longshort_collateral_weights(ls_pool[i % len(ls_pool), None], 0.7)
+    def run_batch(n_calls):
+        for _ in range(max(1, n_calls // len(ls_pool))):
+            longshort_collateral_weights(ls_pool, 0.7)
+    ref_rate = steps_per_second(run_reference, args.steps)
+    print(f"[INFO] long/short projection, original:  {ref_rate:>12,.0f} actions/s")
+    for label, fn in (("batch of 1", run_single), ("batch of 1024", run_batch)):
+        rate = steps_per_second(fn, args.steps)
+        print(f"[INFO] long/short projection, {label:<9}{rate:>12,.0f} actions/s ({rate / ref_rate:.1f}x)")
+
+    def run_scalar(env):
+        def run(n_steps):
+            env.reset()
+            for i in range(n_steps):
+                _, _, done, _, _ = env.step(action_pool[i % len(action_pool)])
+                if done:
+                    env.reset()
+        return run
+    base = steps_per_second(run_scalar(PortfolioEnv(features, returns, rf, transaction_cost=0.001)), args.steps)
+    print(f"[INFO] PortfolioEnv:              {base:>12,.0f} steps/s")
+    lean = steps_per_second(run_scalar(PortfolioEnv(features, returns, rf, transaction_cost=0.001,
+                                                    lean=True, record_history=False)), args.steps)
+    print(f"[INFO] PortfolioEnv lean:         {lean:>12,.0f} steps/s ({lean / base:.1f}x)")
+
+    for num_envs in args.num_envs:
+        venv = BatchedPortfolioEnv(features, returns, rf, num_envs=num_envs, window=min(252, args.T),
+                                   transaction_cost=0.001, seed=0)
+        batch = np.resize(action_pool, (num_envs, args.n_stocks + 1))
+        def run_batched(n_steps):
+            venv.reset()
+            for _ in range(max(1, n_steps // num_envs)):
+                venv.step(batch)
+        rate = steps_per_second(run_batched, args.steps) if num_envs <= args.steps else float('nan')
+        print(f"[INFO] BatchedPortfolioEnv B={num_envs:<4} {rate:>12,.0f} steps/s ({rate / base:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/apps/anaconda3/bin/python
+# chunking.py
+
+import re
+import time
+import argparse
+import numpy as np
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Tokenizers -----------------------------------------
+# --------------------------------------------------------------------------------
+# Both tokenizers expose encode(text) -> tokens, decode(tokens) -> text and
+# count(texts) -> token counts (without special tokens).
+
+LLAMA3_TOKENIZER = "meta-llama/Meta-Llama-3.1-8B-Instruct"
+# Llama-3.1 context used by vllm_summarize (max_model_len) and the digest budget for FinGPT
+CONTEXT_TOKENS = 8000
+DIGEST_MAX_TOKENS = 512
+
+# Llama-3 style pre-tokenization: contractions, letter runs with an optional leading
+# non-letter, 1-3 digit groups, punctuation runs, newlines and other whitespace
+PRETOKEN_RE = re.compile(r"'(?:[sdmt]|ll|ve|re)|[^\r\n\w]?[^\W\d_]+|\d{1,3}| ?[^\s\w]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+",
+                         re.IGNORECASE)
+# Long letter runs split into pieces of this many characters (BPE rarely keeps long words whole)
+APPROX_PIECE_CHARS = 6
+
+class ApproxTokenizer:
+    """
+    Llama-3-like token counts without the tokenizer files: the pre-tokenizer regex, long words
+    split every APPROX_PIECE_CHARS characters. Tokens are substrings, so decode(encode(t)) == t.
+    An estimate for budgeting and benchmarks; load the real tokenizer where it is available.
+    """
+    name = 'approx'
+
+    def encode(self, text):
+        tokens = []
+        for piece in PRETOKEN_RE.findall(text):
+            if len(piece) > APPROX_PIECE_CHARS + 1 and piece[-1].isalpha():
+                head = len(piece) % APPROX_PIECE_CHARS or APPROX_PIECE_CHARS
+                tokens.append(piece[:head])
+                tokens.extend(piece[i:i + APPROX_PIECE_CHARS] for i in range(head, len(piece), APPROX_PIECE_CHARS))
+            else:
+                tokens.append(piece)
+        return tokens
+
+    def decode(self, tokens):
+        return ''.join(tokens)
+
+    def count(self, texts):
+        return [len(self.encode(t)) for t in texts]
+
+class HFTokenizer:
+    """A Hugging Face tokenizer (e.g. Llama-3's) behind the same three methods."""
+
+    def __init__(self, name):
+        from transformers import AutoTokenizer
+        self.name = name
+        self.tokenizer = AutoTokenizer.from_pretrained(name)
+
+    def encode(self, text):
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def decode(self, tokens):
+        return self.tokenizer.decode(tokens)
+
+    def count(self, texts):
+        if not texts:
+            return []
+        return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False)['input_ids']]
+
+def load_tokenizer(name=LLAMA3_TOKENIZER):
+    """HFTokenizer(name), or ApproxTokenizer for name 'approx' or when transformers is unavailable."""
+    if name == 'approx':
+        return ApproxTokenizer()
+    try:
+        return HFTokenizer(name)
+    except (ImportError, OSError) as e:
+        print(f"[WARN] Tokenizer {name} unavailable ({e}); using approximate Llama-3 token counts.")
+        return ApproxTokenizer()
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Token-Aware Chunking -------------------------------
+# --------------------------------------------------------------------------------
+
+def prompt_budget(tokenizer, template, context_tokens=CONTEXT_TOKENS, max_new_tokens=512, **fields):
+    """Tokens left for {articles} in a prompt template once the template and the reply are counted."""
+    overhead = tokenizer.count([template.format(articles='', **fields)])[0]
+    return context_tokens - overhead - max_new_tokens
+
+def split_tokens(text, tokenizer, max_tokens):
+    """Cut one text into consecutive pieces of at most max_tokens tokens."""
+    tokens = tokenizer.encode(text)
+    step = max_tokens
+    while True:
+        pieces = [tokenizer.decode(tokens[i:i + step]) for i in range(0, len(tokens), step)]
+        counts = tokenizer.count(pieces)
+        if max(counts) <= max_tokens or step == 1:
+            return pieces, counts
+        step = max(1, int(step * 0.95))
+
+def chunk_articles_tokens(articles, tokenizer, max_tokens, separator=" "):
+    """
+    chunk_articles with a token budget: articles are packed in order into chunks of at most
+    max_tokens tokens (each joint counted as one separator token). An article longer than
+    the budget is split across chunks instead of overflowing the context.
+    """
+    chunks = []
+    current_chunk = []
+    current_tokens = 0
+
+    for article, n_tokens in zip(articles, tokenizer.count(articles)):
+        pieces = [(article, n_tokens)] if n_tokens <= max_tokens else zip(*split_tokens(article, tokenizer, max_tokens))
+        for piece, piece_tokens in pieces:
+            cost = piece_tokens + (1 if current_chunk else 0)
+            if current_tokens + cost > max_tokens and current_chunk:
+                chunks.append(separator.join(current_chunk))
+                current_chunk = [piece]
+                current_tokens = piece_tokens
+            else:
+                current_chunk.append(piece)
+                current_tokens += cost
+
+    if current_chunk:
+        chunks.append(separator.join(current_chunk))
+    return chunks
+
+def truncate_tokens(text, tokenizer, max_tokens=DIGEST_MAX_TOKENS):
+    """The first max_tokens tokens of text (FinGPT's 512-word cut, in tokens)."""
+    tokens = tokenizer.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return tokenizer.decode(tokens[:max_tokens])
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Length-Bucketed Batching ---------------------------
+# --------------------------------------------------------------------------------
+
+def arrival_batches(n, batch_size):
+    """Batches in submission order (what one prompt after another gives when batched)."""
+    return [list(range(i, min(i + batch_size, n))) for i in range(0, n, batch_size)]
+
+def length_buckets(lengths, batch_size, max_batch_tokens=None):
+    """
+    Batches of prompt indices with similar lengths: sort by length, then cut every batch_size
+    prompts, or earlier once the padded batch (longest x count) would exceed max_batch_tokens.
+    """
+    batches, current, current_max = [], [], 0
+    for i in np.argsort(lengths, kind='stable'):
+        new_max = max(current_max, lengths[i])
+        if current and (len(current) == batch_size or
+                        (max_batch_tokens is not None and new_max * (len(current) + 1) > max_batch_tokens)):
+            batches.append(current)
+            current, new_max = [], lengths[i]
+        current.append(int(i))
+        current_max = new_max
+    if current:
+        batches.append(current)
+    return batches
+
+def padding_fraction(lengths, batches):
+    """Share of the padded [batch, longest] token slots that are padding."""
+    lengths = np.asarray(lengths)
+    padded = sum(int(lengths[b].max()) * len(b) for b in batches)
+    return 1.0 - lengths.sum() / padded if padded else 0.0
+
+# --------------------------------------------------------------------------------
+# ------------------------- 4. Benchmark ------------------------------------------
+# --------------------------------------------------------------------------------
+
+SAMPLE_WORDS = ("the company said shares rose fell percent quarter revenue earnings analysts expected "
+                "market investors billion million guidance outlook sales growth profit margin report "
+                "chief executive officer announced acquisition deal regulators approval demand supply "
+                "prices rates inflation federal reserve trading session stock index dividend "
+                "restructuring semiconductor pharmaceutical subscription advertising infrastructure").split()
+
+def sample_articles(n_days=300, seed=5293):
+    """Fixed sample of news days: word soup with numbers, tickers and punctuation like TR stories."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array(SAMPLE_WORDS)
+    days = []
+    for _ in range(n_days):
+        articles = []
+        for _ in range(rng.choice([1, 3, 8, 20, 60], p=[0.3, 0.3, 0.2, 0.15, 0.05])):
+            words = list(rng.choice(vocab, rng.integers(60, 900)))
+            for j in rng.integers(0, len(words), len(words) // 12):
+                words[j] = rng.choice([f"{rng.uniform(0, 500):.2f}", f"({rng.integers(1, 99)}%)", "U.S.", "Inc.,"])
+            articles.append(" ".join(words).capitalize() + ".")
+        days.append(articles)
+    return days
+
+def proxy_forward(batch_lengths, width=256, weights=None):
+    """Stand-in for a model forward pass: one dense layer over the padded [batch, longest, width] input."""
+    x = np.ones((len(batch_lengths), max(batch_lengths), width), dtype=np.float32)
+    return x @ weights
+
+def time_batches(lengths, batches, width=256, repeats=3):
+    """Best-of-repeats seconds for proxy_forward over every batch; returns (seconds, useful tokens per second)."""
+    weights = np.ones((width, width), dtype=np.float32) / width
+    seconds = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for batch in batches:
+            proxy_forward([lengths[i] for i in batch], width, weights)
+        seconds = min(seconds, time.perf_counter() - t0)
+    return seconds, sum(lengths) / seconds
+
+def main():
+    """
+    On a fixed sample of news days: context overflow and fill of word-count vs token-budget
+    chunking, then padding fraction and tokens/sec of arrival-order vs length-bucketed batches
+    for the summary and FinGPT prompts. Tokens/sec is measured with a numpy proxy forward pass
+    over the padded batches, so it tracks padding waste rather than GPU speed.
+    """
+    parser = argparse.ArgumentParser(
+        description="Token-aware chunking and length-bucketed batching benchmark."
+    )
+    parser.add_argument("--tokenizer", default=LLAMA3_TOKENIZER,
+                        help="Hugging Face tokenizer name, or 'approx' for the built-in estimate.")
+    parser.add_argument("--n_days", type=int, default=300, help="Sample news days.")
+    parser.add_argument("--context_tokens", type=int, default=CONTEXT_TOKENS, help="Model context length.")
+    parser.add_argument("--max_words", type=int, default=6000, help="Word budget of the old chunk_articles.")
+    parser.add_argument("--batch_size", type=int, default=16, help="Prompts per generation batch.")
+    args = parser.parse_args()
+
+    from llm_client import MASKED_SUMMARY_TEMPLATE, SUMMARY_WORD_LIMIT, SUMMARY_MAX_TOKENS, \
+        chunk_articles, clean_digest, sentiment_prompt
+
+    tokenizer = load_tokenizer(args.tokenizer)
+    days = sample_articles(args.n_days)
+    fields = {'industry': 'Technology', 'ticker': 'AAPL', 'word_limit': SUMMARY_WORD_LIMIT}
+    budget = prompt_budget(tokenizer, MASKED_SUMMARY_TEMPLATE, args.context_tokens, SUMMARY_MAX_TOKENS, **fields)
+    print(f"[INFO] {args.n_days} days, {sum(len(d) for d in days)} articles; tokenizer {tokenizer.name}, "
+          f"{budget} tokens per chunk in a {args.context_tokens}-token context.")
+
+    # 1. Chunking: word budget vs token budget
+    prompts = {}
+    for name, chunker in (('words', lambda a: chunk_articles(a, args.max_words)),
+                          ('tokens', lambda a: chunk_articles_tokens(a, tokenizer, budget))):
+        t0 = time.perf_counter()
+        prompts[name] = [MASKED_SUMMARY_TEMPLATE.format(articles=chunk, **fields)
+                         for articles in days for chunk in chunker(articles)]
+        seconds = time.perf_counter() - t0
+        lengths = np.array(tokenizer.count(prompts[name]))
+        overflow = int((lengths + SUMMARY_MAX_TOKENS > args.context_tokens).sum())
+        fill = (np.minimum(lengths, args.context_tokens - SUMMARY_MAX_TOKENS) / (args.context_tokens - SUMMARY_MAX_TOKENS))
+        print(f"[INFO] chunk by {name:>6}: {len(lengths)} prompts, {overflow} overflow the context, "
+              f"mean fill {fill.mean():.1%} ({seconds:.2f}s)")
+    if any(n + SUMMARY_MAX_TOKENS > args.context_tokens for n in tokenizer.count(prompts['tokens'])):
+        print("[ERROR] Token-budget chunks overflow the context.")
+        raise SystemExit(1)
+
+    # 2. Batching: arrival order vs length buckets, for summary prompts and FinGPT digests
+    digests = [clean_digest(" ".join(articles)[:rng_len], max_words=None) for articles, rng_len in
+               zip(days, np.random.default_rng(0).integers(200, 6000, len(days)))]
+    sentiment_prompts = [sentiment_prompt(truncate_tokens(d, tokenizer), 'AAPL') for d in digests if d]
+    for name, stage_prompts in (('summary', prompts['tokens']), ('sentiment', sentiment_prompts)):
+        lengths = tokenizer.count(stage_prompts)
+        for label, batches in (('arrival', arrival_batches(len(lengths), args.batch_size)),
+                               ('bucketed', length_buckets(lengths, args.batch_size))):
+            seconds, tokens_per_sec = time_batches(lengths, batches)
+            print(f"[INFO] {name:>9} {label:>8}: padding {padding_fraction(lengths, batches):.1%}, "
+                  f"{tokens_per_sec:,.0f} useful tokens/s (proxy forward, {seconds:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/apps/anaconda3/bin/python
+# llm_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import shutil
+import hashlib
+import tempfile
+import argparse
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Configuration --------------------------------------
+# --------------------------------------------------------------------------------
+
+# Responses are evicted least-recently-used first once the stored text exceeds the bound,
+# down to EVICT_TO of it
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+EVICT_TO = 0.9
+# Rows written (or hits recorded) between commits
+COMMIT_EVERY = 500
+# Part of every key: bump to invalidate all entries if the stored format changes
+CACHE_FORMAT = 1
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Persistent Cache -----------------------------------
+# --------------------------------------------------------------------------------
+
+def cache_key(model, kind, params, prompt):
+    """
+    BLAKE2b-128 of (model, call kind, call parameters, rendered prompt). The prompt already holds
+    the template and the input text, so any change to those, the model or e.g. max_tokens gives a
+    new key, and nothing else does.
+    """
+    payload = json.dumps([CACHE_FORMAT, model, kind, sorted(dict(params).items()), prompt],
+                         ensure_ascii=False, default=list)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+class LLMCache:
+    """
+    SQLite-backed, content-addressed store of model responses (summaries, label probabilities),
+    shared by the summarization and sentiment stages and by masked / unmasked runs.
+      - get(key) is one primary-key lookup; put(key, value) only inserts (a key's response
+        never changes), so a crash loses at most the uncommitted tail and never corrupts rows.
+      - Hits refresh last_used in batches; once the stored bytes exceed max_bytes the least
+        recently used responses are deleted.
+    Values are JSON (str or dict).
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key BLOB PRIMARY KEY, kind TEXT, value TEXT, size INTEGER, last_used REAL
+            );
+            CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_used);
+        """)
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.touched = {}
+        self.pending = 0
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0}
+
+    def key(self, model, kind, params, prompt):
+        return cache_key(model, kind, params, prompt)
+
+    def get(self, key):
+        """The cached response for key, or None."""
+        row = self.conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        self.touched[key] = time.time()
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+        return json.loads(row[0])
+
+    def put(self, key, value, kind=''):
+        value = json.dumps(value, ensure_ascii=False)
+        size = len(key) + len(value.encode('utf-8'))
+        cursor = self.conn.execute("INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?, ?)",
+                                   (key, kind, value, size, time.time()))
+        if cursor.rowcount:
+            self.total_bytes += size
+            self.stats['writes'] += 1
+            self.pending += 1
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+
+    def evict(self):
+        """Delete least-recently-used responses until the store is back to EVICT_TO of max_bytes."""
+        self.flush_touched()
+        excess = self.total_bytes - int(self.max_bytes * EVICT_TO)
+        keys, freed = [], 0
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if freed >= excess:
+                break
+            keys.append((key,))
+            freed += size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.total_bytes -= freed
+        self.stats['evicted'] += len(keys)
+
+    def flush_touched(self):
+        if self.touched:
+            self.conn.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                                  [(t, key) for key, t in self.touched.items()])
+            self.touched = {}
+
+    def commit(self):
+        self.flush_touched()
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def report(self):
+        """Print entries and bytes per call kind, and this session's hit rate."""
+        for kind, n, size in self.conn.execute(
+                "SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM responses GROUP BY kind ORDER BY kind"):
+            print(f"[INFO] {kind or '(unnamed)'}: {n} responses, {size / 1024 ** 2:.1f} MB")
+        lookups = self.stats['hits'] + self.stats['misses']
+        if lookups:
+            print(f"[INFO] This run: {self.stats['hits']}/{lookups} hits ({self.stats['hits'] / lookups:.1%}), "
+                  f"{self.stats['writes']} written, {self.stats['evicted']} evicted.")
+        print(f"[INFO] {self.total_bytes / 1024 ** 2:.1f} of {self.max_bytes / 1024 ** 2:.0f} MB used in {self.path}")
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Check & Report -------------------------------------
+# --------------------------------------------------------------------------------
+
+def check_rerun(path, n_tickers=4, n_days=60, latency=0.01):
+    """
+    Run the summarization and sentiment stages over synthetic news twice through a cached
+    client: the second run must make zero backend calls and return the same results.
+    Then shrink the bound and check that eviction keeps the store under it.
+    """
+    import asyncio
+    from llm_client import AsyncLLMClient, MockBackend, synthetic_news, summarize_day, sentiment_day
+
+    news = synthetic_news(n_tickers, n_days)
+    keys = [(ticker, i) for ticker, days in news.items() for i in range(len(days))]
+
+    async def run(cache):
+        backend = MockBackend(latency=latency)
+        async with AsyncLLMClient(backend, cache=cache) as client:
+            summaries = await asyncio.gather(*(summarize_day(client, news[t][i], t) for t, i in keys))
+            sentiments = await asyncio.gather(*(sentiment_day(client, s, t) for (t, _), s in zip(keys, summaries)))
+        return (summaries, sentiments), backend.calls
+
+    results = []
+    for attempt in range(2):
+        cache = LLMCache(path)
+        t0 = time.perf_counter()
+        result, calls = asyncio.run(run(cache))
+        print(f"[INFO] Run {attempt + 1}: {calls} backend calls, {cache.stats['hits']} cache hits, "
+              f"{time.perf_counter() - t0:.2f}s")
+        cache.close()
+        results.append((result, calls))
+    if results[1][1] != 0 or results[0][0] != results[1][0]:
+        print("[ERROR] Rerun on unchanged inputs called the model or changed the results.")
+        return False
+
+    cache = LLMCache(path)
+    cache.max_bytes = cache.total_bytes // 2
+    cache.put(b'x' * 16, "one more response", 'complete')
+    cache.commit()
+    if cache.total_bytes > cache.max_bytes or \
+            cache.total_bytes != cache.conn.execute("SELECT SUM(size) FROM responses").fetchone()[0]:
+        print("[ERROR] Eviction did not keep the cache under its bound.")
+        return False
+    print(f"[INFO] Eviction kept the cache at {cache.total_bytes} of {cache.max_bytes} bytes "
+          f"({cache.stats['evicted']} responses evicted).")
+    cache.close()
+    return True
+
+def main():
+    """
+    Report what a response cache holds, optionally shrinking it to --max_mb, or (--check) verify
+    that a rerun on unchanged inputs makes zero model calls.
+    """
+    parser = argparse.ArgumentParser(description="Inspect, bound or check the LLM response cache.")
+    parser.add_argument("--cache", default="llm_cache.sqlite", help="Path of the response cache.")
+    parser.add_argument("--max_mb", type=float, default=None, help="Evict down to this size.")
+    parser.add_argument("--check", action="store_true",
+                        help="Rerun check on synthetic news with a mock backend, in a throwaway cache "
+                             "(--cache is not touched).")
+    args = parser.parse_args()
+
+    if args.check:
+        # Never the real cache: its default name is the production one
+        check_dir = tempfile.mkdtemp(prefix='llm_cache_check_')
+        try:
+            passed = check_rerun(os.path.join(check_dir, 'llm_cache.sqlite'))
+        finally:
+            shutil.rmtree(check_dir, ignore_errors=True)
+        if not passed:
+            raise SystemExit(1)
+        print("[INFO] Check passed: the rerun was served entirely from the cache.")
+        return
+
+    if not os.path.isfile(args.cache):
+        print(f"[ERROR] No cache at {args.cache}.")
+        return
+    max_bytes = int(args.max_mb * 1024 ** 2) if args.max_mb is not None else DEFAULT_MAX_BYTES
+    cache = LLMCache(args.cache, max_bytes)
+    if cache.total_bytes > max_bytes:
+        cache.evict()
+    cache.report()
+    cache.close()
+
+if __name__ == "__main__":
+    main()
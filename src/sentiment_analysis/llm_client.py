@@ -0,0 +1,817 @@
+#!/apps/anaconda3/bin/python
+# llm_client.py
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from llm_cache import LLMCache, DEFAULT_MAX_BYTES
+from chunking import load_tokenizer, prompt_budget, chunk_articles_tokens, truncate_tokens
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Configuration --------------------------------------
+# --------------------------------------------------------------------------------
+
+# Client defaults: backend calls in flight, prompts/s (None: unlimited), retries and backoff
+# (the notebooks' 3 attempts, 5s base delay)
+DEFAULT_CONCURRENCY = 32
+DEFAULT_RATE = None
+MAX_RETRIES = 3
+BACKOFF_BASE = 5.0
+BACKOFF_CAP = 60.0
+# Prompts with the same parameters are grouped for up to BATCH_WAIT seconds, BATCH_SIZE at most
+BATCH_SIZE = 16
+BATCH_WAIT = 0.01
+
+SUMMARY_WORD_LIMIT = 512
+SUMMARY_MAX_TOKENS = 512
+CHUNK_MAX_WORDS = 6000           # vllm_summarize path (8000-token context)
+DIGEST_MAX_WORDS = 512
+SENTIMENT_LABELS = ('Positive', 'Negative', 'Neutral')
+NO_NEWS = "No relevant news"
+
+TICKER_INDUSTRY_MAP = {
+    'AAPL': 'Technology', 'MSFT': 'Technology', 'NVDA': 'Technology', 'AVGO': 'Technology',
+    'ADBE': 'Technology', 'GOOGL': 'Technology', 'META': 'Technology',
+    'UNH': 'Healthcare', 'JNJ': 'Healthcare', 'PFE': 'Healthcare', 'MRK': 'Healthcare', 'ABBV': 'Healthcare',
+    'JPM': 'Financials', 'BAC': 'Financials', 'WFC': 'Financials', 'GS': 'Financials', 'MS': 'Financials',
+    'AMZN': 'Consumer Discretionary', 'TSLA': 'Consumer Discretionary', 'HD': 'Consumer Discretionary',
+    'MCD': 'Consumer Discretionary', 'NKE': 'Consumer Discretionary',
+    'DIS': 'Communication Services', 'VZ': 'Communication Services', 'CMCSA': 'Communication Services',
+    'PG': 'Consumer Staples', 'KO': 'Consumer Staples', 'PEP': 'Consumer Staples', 'WMT': 'Consumer Staples',
+    'COST': 'Consumer Staples',
+    'XOM': 'Energy', 'CVX': 'Energy', 'COP': 'Energy',
+    'BA': 'Industrials', 'UNP': 'Industrials', 'HON': 'Industrials', 'SHW': 'Industrials', 'DOW': 'Materials',
+    'NEE': 'Utilities', 'DUK': 'Utilities', 'SO': 'Utilities',
+    'PLD': 'Real Estate', 'AMT': 'Real Estate', 'CCI': 'Real Estate'
+}
+# fingpt_sentiments_from_summarization.ipynb gives AMZN a wider industry context
+SENTIMENT_INDUSTRY_OVERRIDES = {'AMZN': 'Consumer Discretionary and Technology'}
+
+MASKED_SUMMARY_TEMPLATE = """As a financial analyst, create a concise daily market digest from these anonymized articles.
+Industry: {industry}
+Word Limit: {word_limit}
+
+Important Notes:
+- Company names, dates, and products have been anonymized.
+- Focus on industry-wide implications.
+- Maintain anonymization in summary.
+
+Articles:
+{articles}
+
+CONCISE ANONYMIZED MARKET DIGEST (≤{word_limit} words):"""
+
+UNMASKED_SUMMARY_TEMPLATE = """As a financial analyst, create a concise daily market digest from these articles.
+Company: {ticker}
+Industry: {industry}
+Word Limit: {word_limit}
+
+Key Focus Areas:
+- Company-specific developments
+- Product/market news
+- Financial performance indicators
+- Competitor reactions
+- Analyst ratings
+
+Articles:
+{articles}
+
+CONCISE MARKET DIGEST (≤{word_limit} words):"""
+
+END_PATTERN = re.compile(r"\((?:END|end|End)\)")
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Backends -------------------------------------------
+# --------------------------------------------------------------------------------
+
+class LLMError(Exception):
+    """A request the backend rejected; retrying the same prompt will not help."""
+
+class TransientLLMError(LLMError):
+    """Rate limiting, server errors, timeouts: worth retrying (after retry_after seconds if given)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class LLMBackend:
+    """
+    A model behind two batched coroutines:
+      - complete(prompts, max_tokens, temperature) -> one generated text per prompt.
+      - classify(prompts, labels) -> one {label: probability} per prompt, from the next-token
+        distribution after the prompt (FinGPT's get_sentiment), normalized over the labels.
+    Raise TransientLLMError for failures worth retrying and LLMError otherwise. cache_id names
+    the model in response-cache keys.
+    """
+    max_batch = BATCH_SIZE
+    cache_id = None
+
+    async def complete(self, prompts, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.3):
+        raise NotImplementedError
+
+    async def classify(self, prompts, labels=SENTIMENT_LABELS):
+        raise NotImplementedError
+
+def label_probs(token_logprobs, labels):
+    """
+    {label: probability} from (token text, logprob) pairs of the next token; tokens match a
+    label up to surrounding whitespace. Normalized to sum to 1 over the labels.
+    """
+    probs = dict.fromkeys(labels, 0.0)
+    for token, logprob in token_logprobs:
+        token = token.strip()
+        if token in probs:
+            probs[token] += math.exp(logprob)
+    total = sum(probs.values())
+    if total == 0:
+        raise LLMError(f"None of {list(labels)} among the top next-token candidates.")
+    return {label: prob / total for label, prob in probs.items()}
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    OpenAI-style HTTP API (DeepSeek, a vLLM / TGI server, the mock server below), standard
+    library only. Chat mode posts one /chat/completions request per prompt; otherwise a batch
+    is one /completions request with a list of prompts. classify() always uses /completions
+    with max_tokens=1 and top logprobs.
+    """
+
+    def __init__(self, base_url, model, api_key=None, chat=True, timeout=60, max_workers=64, top_logprobs=20):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.cache_id = model
+        self.api_key = api_key
+        self.chat = chat
+        self.timeout = timeout
+        self.top_logprobs = top_logprobs
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def post(self, path, payload):
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(self.base_url + path, data=json.dumps(payload).encode('utf-8'),
+                                         headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                retry_after = e.headers.get('Retry-After')
+                raise TransientLLMError(f"HTTP {e.code} from {path}",
+                                        float(retry_after) if retry_after else None) from e
+            raise LLMError(f"HTTP {e.code} from {path}: {e.read()[:200]!r}") from e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise TransientLLMError(f"{type(e).__name__} on {path}: {e}") from e
+
+    async def apost(self, path, payload):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.post, path, payload)
+
+    async def complete(self, prompts, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.3):
+        if self.chat:
+            responses = await asyncio.gather(*(
+                self.apost('/chat/completions', {'model': self.model, 'messages': [{'role': 'user', 'content': p}],
+                                                 'temperature': temperature, 'max_tokens': max_tokens,
+                                                 'stream': False})
+                for p in prompts
+            ))
+            return [r['choices'][0]['message']['content'].strip() for r in responses]
+        response = await self.apost('/completions', {'model': self.model, 'prompt': list(prompts),
+                                                     'temperature': temperature, 'max_tokens': max_tokens})
+        choices = sorted(response['choices'], key=lambda c: c['index'])
+        return [c['text'].strip() for c in choices]
+
+    async def classify(self, prompts, labels=SENTIMENT_LABELS):
+        response = await self.apost('/completions', {'model': self.model, 'prompt': list(prompts),
+                                                     'temperature': 0.0, 'max_tokens': 1,
+                                                     'logprobs': self.top_logprobs})
+        choices = sorted(response['choices'], key=lambda c: c['index'])
+        return [label_probs(c['logprobs']['top_logprobs'][0].items(), labels) for c in choices]
+
+class VLLMBackend(LLMBackend):
+    """
+    In-process vllm.LLM (the notebooks' FP8 Llama-3.1 / FinGPT setup). Each batch is one
+    generate() call, run in a worker thread; vLLM batches the prompts on the GPU.
+    """
+    max_batch = 64
+
+    def __init__(self, llm, cache_id, top_logprobs=20):
+        self.llm = llm
+        self.cache_id = cache_id
+        self.top_logprobs = top_logprobs
+        self.lock = asyncio.Lock()
+
+    async def generate(self, prompts, params):
+        async with self.lock:
+            return await asyncio.to_thread(self.llm.generate, list(prompts), params, use_tqdm=False)
+
+    async def complete(self, prompts, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.3):
+        from vllm import SamplingParams
+        outputs = await self.generate(prompts, SamplingParams(temperature=temperature, max_tokens=max_tokens))
+        return [o.outputs[0].text.strip() for o in outputs]
+
+    async def classify(self, prompts, labels=SENTIMENT_LABELS):
+        from vllm import SamplingParams
+        outputs = await self.generate(prompts, SamplingParams(temperature=0.0, max_tokens=1,
+                                                              logprobs=self.top_logprobs))
+        return [label_probs([(lp.decoded_token, lp.logprob) for lp in o.outputs[0].logprobs[0].values()], labels)
+                for o in outputs]
+
+def mock_digest(prompt):
+    """Deterministic stand-in summary of a prompt."""
+    digest = hashlib.blake2b(prompt.encode('utf-8'), digest_size=8).hexdigest()
+    return f"Digest {digest}: sector activity across {len(prompt.split())} words of coverage."
+
+def mock_logprobs(prompt, labels=SENTIMENT_LABELS):
+    """Deterministic next-token (token, logprob) pairs for a prompt."""
+    seed = int.from_bytes(hashlib.blake2b(prompt.encode('utf-8'), digest_size=8).digest(), 'little')
+    weights = np.random.default_rng(seed).dirichlet(np.ones(len(labels))) * 0.9
+    return [(' ' + label, float(np.log(w))) for label, w in zip(labels, weights)] + [(' The', float(np.log(0.1)))]
+
+class MockBackend(LLMBackend):
+    """
+    Offline backend for throughput tests: each call sleeps latency + per_item * len(prompts)
+    (a batched server amortizing the fixed cost) and fails with TransientLLMError at
+    failure_rate. Outputs depend only on the prompt.
+    """
+    cache_id = 'mock'
+
+    def __init__(self, latency=0.05, per_item=0.002, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.per_item = per_item
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def call(self, prompts):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency + self.per_item * len(prompts))
+        finally:
+            self.in_flight -= 1
+        if self.rng.random() < self.failure_rate:
+            raise TransientLLMError("mock 429", retry_after=0.0)
+
+    async def complete(self, prompts, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.3):
+        await self.call(prompts)
+        return [mock_digest(p) for p in prompts]
+
+    async def classify(self, prompts, labels=SENTIMENT_LABELS):
+        await self.call(prompts)
+        return [label_probs(mock_logprobs(p, labels), labels) for p in prompts]
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Async Client ---------------------------------------
+# --------------------------------------------------------------------------------
+
+class TokenBucket:
+    """Allow `rate` prompts per second on average, bursts up to `burst`; rate None disables it."""
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate or 1.0, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, n=1):
+        if self.rate is None:
+            return
+        async with self.lock:
+            need = min(n, self.capacity)
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= need:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((need - self.tokens) / self.rate)
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP, rng=random):
+    """Full-jitter exponential backoff: uniform over [0, min(cap, base * 2**attempt)]."""
+    return rng.uniform(0.0, min(cap, base * 2 ** attempt))
+
+class AsyncLLMClient:
+    """
+    Drive many prompts through a backend at once.
+      - complete(prompt) / classify(prompt) queue the prompt and return its result (None if it
+        still fails after max_retries, like deepseek_summarize).
+      - Queued prompts with the same parameters are sent as one backend batch (batch_size at most,
+        after waiting batch_wait seconds for more to arrive).
+      - A semaphore bounds the batches in flight, a token bucket the prompts per second.
+      - Transient failures back off with full jitter (or the server's Retry-After); a batch
+        rejected outright is retried prompt by prompt so one bad prompt does not sink the rest.
+      - With length_key (e.g. a token count), up to pool_batches batches' worth of queued prompts
+        are sorted by length before being cut into batches, so padded batches waste less.
+      - With an LLMCache, prompts answered before are served from it without queueing, and new
+        responses are stored, so a rerun on unchanged inputs makes no model calls.
+    Use inside a running event loop, e.g. `async with AsyncLLMClient(backend) as client:`.
+    """
+
+    def __init__(self, backend, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, burst=None,
+                 batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP, seed=None, cache=None,
+                 length_key=None, pool_batches=1):
+        self.backend = backend
+        self.cache = cache
+        self.length_key = length_key
+        self.pool_batches = pool_batches if length_key is not None else 1
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.batch_size = max(1, min(batch_size, backend.max_batch))
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.rng = random.Random(seed)
+        self.pending = {}
+        self.timers = {}
+        self.tasks = set()
+        self.stats = {'prompts': 0, 'batches': 0, 'retries': 0, 'failures': 0, 'cache_hits': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.drain()
+        if self.cache is not None:
+            self.cache.commit()
+
+    async def complete(self, prompt, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.3):
+        return await self.request('complete', (('max_tokens', max_tokens), ('temperature', temperature)), prompt)
+
+    async def classify(self, prompt, labels=SENTIMENT_LABELS):
+        return await self.request('classify', (('labels', tuple(labels)),), prompt)
+
+    async def request(self, kind, params, prompt):
+        if self.cache is None:
+            return await self.submit(kind, params, prompt)
+        key = self.cache.key(self.backend.cache_id, kind, params, prompt)
+        result = self.cache.get(key)
+        if result is not None:
+            self.stats['cache_hits'] += 1
+            return result
+        result = await self.submit(kind, params, prompt)
+        if result is not None:
+            self.cache.put(key, result, kind)
+        return result
+
+    def submit(self, kind, params, prompt):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (kind, params)
+        pending = self.pending.setdefault(key, [])
+        pending.append((prompt, future))
+        self.stats['prompts'] += 1
+        if len(pending) >= self.batch_size * self.pool_batches:
+            self.flush(key)
+        elif len(pending) == 1:
+            self.timers[key] = loop.call_later(self.batch_wait, self.flush, key)
+        return future
+
+    def flush(self, key):
+        items = self.pending.pop(key, [])
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if self.length_key is not None:
+            items.sort(key=lambda item: self.length_key(item[0]))
+        for i in range(0, len(items), self.batch_size):
+            task = asyncio.ensure_future(self.run_batch(key, items[i:i + self.batch_size]))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def drain(self):
+        """Send whatever is still queued and wait for every batch to finish."""
+        for key in list(self.pending):
+            self.flush(key)
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+
+    async def run_batch(self, key, items):
+        kind, params = key
+        prompts = [prompt for prompt, _ in items]
+        error = None
+        for attempt in range(self.max_retries):
+            try:
+                await self.bucket.acquire(len(prompts))
+                async with self.semaphore:
+                    results = list(await getattr(self.backend, kind)(prompts, **dict(params)))
+                # zip would drop the unmatched prompts and leave their futures pending forever
+                if len(results) != len(prompts):
+                    raise LLMError(f"{kind} returned {len(results)} result(s) for {len(prompts)} prompt(s)")
+            except TransientLLMError as e:
+                error = e
+                if attempt < self.max_retries - 1:
+                    self.stats['retries'] += 1
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap, self.rng)
+                    await asyncio.sleep(max(delay, e.retry_after or 0.0))
+                continue
+            except Exception as e:
+                if len(items) > 1:
+                    await asyncio.gather(*(self.run_batch(key, [item]) for item in items))
+                    return
+                error = e
+                break
+            self.stats['batches'] += 1
+            for (_, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
+            return
+
+        print(f"[WARN] {kind} failed for {len(items)} prompt(s) after {attempt + 1} attempt(s): {error}")
+        self.stats['failures'] += len(items)
+        for _, future in items:
+            if not future.done():
+                future.set_result(None)
+
+# --------------------------------------------------------------------------------
+# ------------------------- 4. Summarization & Sentiment Stages -------------------
+# --------------------------------------------------------------------------------
+# Async versions of summarize_single_ticker (news_summarization.ipynb) and process_ticker
+# (fingpt_sentiments_from_summarization.ipynb): every day of every ticker is submitted at
+# once and the client decides what is in flight. Outputs keep the notebooks' file layout.
+
+def chunk_articles(articles, max_words=CHUNK_MAX_WORDS):
+    """Split articles into chunks without exceeding the word limit."""
+    chunks = []
+    current_chunk = []
+    current_word_count = 0
+
+    for article in articles:
+        article_words = len(article.split())
+        if current_word_count + article_words > max_words and current_chunk:
+            chunks.append(" ".join(current_chunk))
+            current_chunk = [article]
+            current_word_count = article_words
+        else:
+            current_chunk.append(article)
+            current_word_count += article_words
+
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+def summary_prompt(articles, ticker, industry, masked=True, word_limit=SUMMARY_WORD_LIMIT):
+    template = MASKED_SUMMARY_TEMPLATE if masked else UNMASKED_SUMMARY_TEMPLATE
+    return template.format(industry=industry, ticker=ticker, articles=articles, word_limit=word_limit)
+
+async def summarize_day(client, raw_articles, ticker, masked=True, max_words=CHUNK_MAX_WORDS, chunker=None):
+    """
+    One day's digest: chunk summaries in parallel, then a summary of the summaries if several.
+    chunker(articles) -> chunks replaces the max_words word-count chunking (see chunking.py).
+    """
+    if raw_articles is None or len(raw_articles) == 0:
+        return NO_NEWS
+    articles = [art for art in raw_articles if isinstance(art, str) and len(art) > 50]
+    if len(articles) == 0:
+        return NO_NEWS
+    industry = TICKER_INDUSTRY_MAP.get(ticker, "General Market")
+
+    chunk_summaries = await asyncio.gather(*(
+        client.complete(summary_prompt(chunk, ticker, industry, masked))
+        for chunk in (chunker(articles) if chunker is not None else chunk_articles(articles, max_words))
+    ))
+    chunk_summaries = [s for s in chunk_summaries if s]
+    if len(chunk_summaries) > 1:
+        final_summary = await client.complete(summary_prompt("\n".join(chunk_summaries), ticker, industry, masked))
+        return final_summary or ""
+    elif len(chunk_summaries) == 1:
+        return chunk_summaries[0]
+    return NO_NEWS
+
+def clean_digest(digest, max_words=DIGEST_MAX_WORDS):
+    """Digest text before the first (END) marker, truncated to max_words (None: not); "" when there is no news."""
+    if (not isinstance(digest, str) or len(digest.strip()) == 0 or
+            digest.strip().lower() == NO_NEWS.lower() or len(digest) <= 20):
+        return ""
+    cleaned = re.split(END_PATTERN, digest, maxsplit=1)[0]
+    words = cleaned.split()
+    if max_words is not None and len(words) > max_words:
+        cleaned = " ".join(words[:max_words])
+    return cleaned
+
+def sentiment_prompt(text, ticker, masked=True):
+    industry = SENTIMENT_INDUSTRY_OVERRIDES.get(ticker, TICKER_INDUSTRY_MAP.get(ticker, "General Market"))
+    if masked:
+        context = (f"Note: The input news digest has been anonymized. "
+                   f"Company names, dates, and products have been masked; only the industry is provided: {industry}.\n")
+    else:
+        context = f"Ticker: {ticker}. Industry: {industry}.\n"
+    return (
+        f"{context}"
+        "Instruction: Determine the sentiment of the news. Please choose one of the following options: [Positive, Negative, Neutral].\n"
+        f"Input: {text}\nAnswer: "
+    )
+
+async def sentiment_day(client, digest, ticker, masked=True, max_words=DIGEST_MAX_WORDS, truncate=None):
+    """
+    (sentiment, confidence, cleaned digest); (None, NaN, digest) if the model call failed.
+    truncate(text) -> text (e.g. a token budget) replaces the max_words cut.
+    """
+    cleaned = clean_digest(digest, max_words if truncate is None else None)
+    if cleaned and truncate is not None:
+        cleaned = truncate(cleaned)
+    if not cleaned:
+        return "Neutral", 1.0, cleaned
+    probs = await client.classify(sentiment_prompt(cleaned, ticker, masked))
+    if probs is None:
+        return None, float('nan'), cleaned
+    label = max(probs, key=probs.get)
+    return label, probs[label], cleaned
+
+async def summarize_ticker(client, ticker, input_path, output_path, masked=True, max_words=CHUNK_MAX_WORDS,
+                           chunker=None):
+    """summarize_single_ticker: the input frame with the ticker column replaced by daily digests."""
+    if not os.path.exists(input_path):
+        return None
+    df = pd.read_parquet(input_path)
+    if df.index.name != "trading_day":
+        df = df.set_index("trading_day", drop=False)
+    new_df = df.copy()
+    days = [list(a) if isinstance(a, np.ndarray) else a for a in new_df[ticker]]
+    new_df[ticker] = await asyncio.gather(*(summarize_day(client, a, ticker, masked, max_words, chunker) for a in days))
+    new_df.to_parquet(output_path)
+    return new_df
+
+async def sentiment_ticker(client, ticker, input_path, output_path, masked=True, max_words=DIGEST_MAX_WORDS,
+                           truncate=None):
+    """process_ticker: (date, sentiment, confidence, summary) per trading day of the digests."""
+    if not os.path.exists(input_path):
+        print(f"File not found for {ticker}, skipping...")
+        return None
+    df = pd.read_parquet(input_path)
+    if df.index.name == "trading_day":
+        df = df.reset_index()
+    df = df.drop_duplicates('trading_day')
+    results = await asyncio.gather(*(sentiment_day(client, d, ticker, masked, max_words, truncate) for d in df[ticker]))
+    out = pd.DataFrame({
+        'date': df['trading_day'].to_numpy(),
+        'sentiment': [r[0] for r in results],
+        'confidence': [r[1] for r in results],
+        'summary': [r[2] for r in results]
+    })
+    out.to_parquet(output_path, index=False)
+    return out
+
+async def run_stage(client, stage, tickers, input_dir, output_dir, masked=True, overwrite=False, tokenizer=None,
+                    context_tokens=8000):
+    """
+    Run 'summarize' or 'sentiment' for all tickers concurrently (masked=False reads and writes
+    the _unmasked files, so summarize feeds sentiment in both modes). Tickers whose output file
+    already exists are skipped unless overwrite. With a chunking.py tokenizer, articles are
+    chunked to the context's token budget and digests truncated to 512 tokens instead of words.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # The later notebooks' names: {ticker}[_unmasked].parquet -> {ticker}[_unmasked]_summaries.parquet
+    tag = "" if masked else "_unmasked"
+    jobs = []
+    for ticker in tickers:
+        if stage == 'summarize':
+            input_path = os.path.join(input_dir, f"{ticker}{tag}.parquet")
+            output_path = os.path.join(output_dir, f"{ticker}{tag}_summaries.parquet")
+            chunker = None
+            if tokenizer is not None:
+                industry = TICKER_INDUSTRY_MAP.get(ticker, "General Market")
+                budget = prompt_budget(tokenizer, MASKED_SUMMARY_TEMPLATE if masked else UNMASKED_SUMMARY_TEMPLATE,
+                                       context_tokens, SUMMARY_MAX_TOKENS, industry=industry, ticker=ticker,
+                                       word_limit=SUMMARY_WORD_LIMIT)
+                chunker = lambda articles, budget=budget: chunk_articles_tokens(articles, tokenizer, budget)
+            job = summarize_ticker(client, ticker, input_path, output_path, masked, chunker=chunker)
+        else:
+            input_path = os.path.join(input_dir, f"{ticker}{tag}_summaries.parquet")
+            output_path = os.path.join(output_dir, f"{ticker}_daily_sentiments.parquet")
+            truncate = None if tokenizer is None else (lambda text: truncate_tokens(text, tokenizer))
+            job = sentiment_ticker(client, ticker, input_path, output_path, masked, truncate=truncate)
+        if os.path.exists(output_path) and not overwrite:
+            job.close()
+            print(f"[INFO] {output_path} exists, skipping {ticker}.")
+            continue
+        jobs.append(job)
+    await asyncio.gather(*jobs)
+
+# --------------------------------------------------------------------------------
+# ------------------------- 5. Mock Server & Benchmark ----------------------------
+# --------------------------------------------------------------------------------
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """/v1/chat/completions and /v1/completions (with top logprobs) answered by the mock functions."""
+    latency = 0.05
+    per_item = 0.002
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.path.endswith('/chat/completions'):
+            prompts = [payload['messages'][-1]['content']]
+            choices = [{'index': 0, 'message': {'role': 'assistant', 'content': mock_digest(prompts[0])}}]
+        elif self.path.endswith('/completions'):
+            prompts = payload['prompt'] if isinstance(payload['prompt'], list) else [payload['prompt']]
+            if payload.get('logprobs'):
+                choices = [{'index': i, 'text': ' ', 'logprobs': {'top_logprobs': [dict(mock_logprobs(p))]}}
+                           for i, p in enumerate(prompts)]
+            else:
+                choices = [{'index': i, 'text': mock_digest(p)} for i, p in enumerate(prompts)]
+        else:
+            self.send_error(404)
+            return
+        time.sleep(self.latency + self.per_item * len(prompts))
+        body = json.dumps({'choices': choices}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve_mock(port=0, latency=0.05, per_item=0.002):
+    """Start the mock OpenAI-compatible server in a daemon thread; returns (server, base_url)."""
+    handler = type('Handler', (MockOpenAIHandler,), {'latency': latency, 'per_item': per_item})
+    server_class = type('Server', (ThreadingHTTPServer,), {'request_queue_size': 1024})
+    server = server_class(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def synthetic_news(n_tickers=4, n_days=60, seed=0):
+    """{ticker: [daily article lists]} with empty days, short (filtered) articles and multi-chunk days."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(2000)])
+    news = {}
+    for ticker in list(TICKER_INDUSTRY_MAP)[:n_tickers]:
+        days = []
+        for _ in range(n_days):
+            n_articles = rng.choice([0, 1, 3, 8, 30], p=[0.15, 0.3, 0.3, 0.2, 0.05])
+            days.append([" ".join(rng.choice(vocab, rng.integers(5, 600))) for _ in range(n_articles)])
+        news[ticker] = days
+    return news
+
+async def run_benchmark(make_backend, news, concurrency, batch_size, rate):
+    """
+    Summaries then sentiment for every (ticker, day): first one call at a time in notebook order,
+    then everything in flight through the client. Returns (sequential results, concurrent
+    results, timings, client stats), the last two keyed by run.
+    """
+    keys = [(ticker, i) for ticker, days in news.items() for i in range(len(days))]
+
+    async def run_all(coros, sequential):
+        if sequential:
+            return [await coro for coro in coros]
+        return list(await asyncio.gather(*coros))
+
+    async def run(client, sequential):
+        summaries = await run_all([summarize_day(client, news[t][i], t) for t, i in keys], sequential)
+        sentiments = await run_all([sentiment_day(client, s, t) for (t, _), s in zip(keys, summaries)], sequential)
+        return summaries, sentiments
+
+    timings, stats = {}, {}
+    t0 = time.perf_counter()
+    async with AsyncLLMClient(make_backend(), concurrency=1, batch_size=1, batch_wait=0.0,
+                              backoff_base=0.05, seed=0) as client:
+        sequential = await run(client, True)
+    timings['sequential'], stats['sequential'] = time.perf_counter() - t0, client.stats
+    t0 = time.perf_counter()
+    async with AsyncLLMClient(make_backend(), concurrency=concurrency, batch_size=batch_size, rate=rate,
+                              backoff_base=0.05, seed=0) as client:
+        concurrent = await run(client, False)
+    timings['concurrent'], stats['concurrent'] = time.perf_counter() - t0, client.stats
+    return sequential, concurrent, timings, stats
+
+def main():
+    """
+    Run the summarization or sentiment stage for a ticker universe through the async client, or
+    (--stage benchmark) compare one-call-at-a-time against the client on synthetic news with an
+    offline mock backend / mock HTTP server. The benchmark exits with status 1 if the outputs differ.
+    """
+    parser = argparse.ArgumentParser(
+        description="Async, rate-limited, batched LLM calls for news summarization and sentiment."
+    )
+    parser.add_argument("--stage", choices=['summarize', 'sentiment', 'benchmark'], default='benchmark')
+    parser.add_argument("--backend", choices=['openai', 'vllm', 'mock', 'mock_http'], default='mock',
+                        help="openai: any OpenAI-compatible server; vllm: in-process vllm.LLM; "
+                             "mock / mock_http: offline stand-ins.")
+    parser.add_argument("--base_url", default="https://api.deepseek.com", help="OpenAI-compatible API root.")
+    parser.add_argument("--model", default="deepseek-chat", help="Model name (or vLLM model path).")
+    parser.add_argument("--api_key_env", default="DEEPSEEK_API_KEY", help="Environment variable holding the API key.")
+    parser.add_argument("--no_chat", action="store_true", help="Use batched /completions instead of /chat/completions.")
+    parser.add_argument("--input_dir", default=None, help="Stage input directory.")
+    parser.add_argument("--output_dir", default=None, help="Stage output directory.")
+    parser.add_argument("--tickers", nargs="*", default=list(TICKER_INDUSTRY_MAP), help="Tickers to process.")
+    parser.add_argument("--unmasked", action="store_true", help="Use the unmasked prompts / file names.")
+    parser.add_argument("--overwrite", action="store_true", help="Redo tickers whose output already exists.")
+    parser.add_argument("--cache", default=None,
+                        help="SQLite response cache (e.g. llm_cache.sqlite); reruns only call the model for new prompts.")
+    parser.add_argument("--cache_max_mb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2,
+                        help="Bound on the cached responses (least recently used evicted first).")
+    parser.add_argument("--tokenizer", default=None,
+                        help="Chunk and truncate by tokens with this tokenizer ('approx' for an estimate) and "
+                             "length-bucket batches; default: the notebooks' word counts.")
+    parser.add_argument("--context_tokens", type=int, default=8000, help="Model context for --tokenizer chunking.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Backend calls in flight.")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Prompts per second (default: unlimited).")
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE, help="Prompts per backend call.")
+    parser.add_argument("--n_tickers", type=int, default=4, help="Benchmark: synthetic tickers.")
+    parser.add_argument("--n_days", type=int, default=60, help="Benchmark: synthetic days per ticker.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Benchmark: mock seconds per call.")
+    parser.add_argument("--failure_rate", type=float, default=0.0, help="Benchmark: mock transient failure rate.")
+    parser.add_argument("--profile", default=None,
+                        help="Write a stage profile (wall/CPU time, peak RSS, throughput) of this run to this JSON file.")
+    args = parser.parse_args()
+    if args.stage != 'benchmark' and (not args.input_dir or not args.output_dir):
+        parser.error("--input_dir and --output_dir are required for the summarize / sentiment stages.")
+
+    if args.profile:
+        # benchmarks/instrumentation.py, imported only when profiling
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+        from instrumentation import run_profiled
+        stage = 'llm_benchmark' if args.stage == 'benchmark' else args.stage
+        run_profiled(args.profile, stage, run_cli, args, unit='prompts', count=int)
+    else:
+        run_cli(args)
+
+def run_cli(args):
+    """Run the chosen stage (or the benchmark) for parsed command-line arguments. Returns the prompts sent."""
+    server = None
+    if args.backend in ('mock_http', 'openai'):
+        base_url, api_key = args.base_url, os.environ.get(args.api_key_env)
+        if args.backend == 'mock_http':
+            server, base_url = serve_mock(latency=args.latency)
+        make_backend = lambda: OpenAICompatibleBackend(base_url, args.model, api_key, chat=not args.no_chat,
+                                                       max_workers=args.concurrency * args.batch_size)
+    elif args.backend == 'vllm':
+        from vllm import LLM
+        llm = LLM(model=args.model, max_model_len=8000)
+        make_backend = lambda: VLLMBackend(llm, cache_id=args.model)
+    else:
+        make_backend = lambda: MockBackend(latency=args.latency, failure_rate=args.failure_rate)
+
+    if args.stage == 'benchmark':
+        news = synthetic_news(args.n_tickers, args.n_days)
+        n_days = sum(len(days) for days in news.values())
+        sequential, concurrent, timings, stats = asyncio.run(
+            run_benchmark(make_backend, news, args.concurrency, args.batch_size, args.rate))
+        n_failed = sum(run_stats['failures'] for run_stats in stats.values())
+        if n_failed:
+            print(f"[WARN] {n_failed} prompts failed after retries; results not compared.")
+        elif sequential != concurrent:
+            print("[ERROR] Concurrent results differ from the sequential run.")
+            raise SystemExit(1)
+        else:
+            print("[INFO] Concurrent results match the sequential run.")
+        print(f"[INFO] {n_days} ticker-days, {stats['concurrent']['prompts']} prompts.")
+        for name, seconds in timings.items():
+            run_stats = stats[name]
+            print(f"[INFO] {name:>10}: {seconds:.2f}s, {n_days / seconds:.1f} ticker-days/s, "
+                  f"{run_stats['prompts'] / seconds:.1f} prompts/s ({run_stats['batches']} batches, "
+                  f"{run_stats['retries']} retries, {run_stats['failures']} failures)")
+        print(f"[INFO] Speedup: {timings['sequential'] / timings['concurrent']:.1f}x")
+    else:
+        cache = LLMCache(args.cache, int(args.cache_max_mb * 1024 ** 2)) if args.cache else None
+        tokenizer = load_tokenizer(args.tokenizer) if args.tokenizer else None
+        length_key = None if tokenizer is None else (lambda prompt: len(tokenizer.encode(prompt)))
+
+        async def run():
+            async with AsyncLLMClient(make_backend(), concurrency=args.concurrency, rate=args.rate,
+                                      batch_size=args.batch_size, cache=cache, length_key=length_key,
+                                      pool_batches=4) as client:
+                await run_stage(client, args.stage, args.tickers, args.input_dir, args.output_dir,
+                                masked=not args.unmasked, overwrite=args.overwrite, tokenizer=tokenizer,
+                                context_tokens=args.context_tokens)
+                return client.stats
+
+        t0 = time.perf_counter()
+        stats = asyncio.run(run())
+        print(f"[INFO] {args.stage}: {stats['prompts']} prompts sent, {stats['cache_hits']} from the cache, "
+              f"{stats['failures']} failed, {time.perf_counter() - t0:.1f}s")
+        if cache is not None:
+            cache.report()
+            cache.close()
+    if server is not None:
+        server.shutdown()
+    return stats['concurrent']['prompts'] if args.stage == 'benchmark' else stats['prompts']
+
+if __name__ == "__main__":
+    main()
+
+#### python llm_client.py \
+#    --stage summarize --backend openai --input_dir stock_parquet --output_dir summarized_text/masked \
+#    --concurrency 32 --rate 20
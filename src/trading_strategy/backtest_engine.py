@@ -0,0 +1,257 @@
+#!/apps/anaconda3/bin/python
+# backtest_engine.py
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# Default one-way transaction cost rate (5 bps), as in rulebased.ipynb
+COST_RATE = 0.0005
+
+# Trading days per year, for annualizing
+TRADING_DAYS = 252
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Reference Version ----------------------------------
+# --------------------------------------------------------------------------------
+
+def backtest_longshort_reference(df, cost_rate=COST_RATE):
+    """
+    The per-date loop of backtest_longshort in rulebased.ipynb, kept to check the panel engine against.
+    df needs ['date','ticker','next_return','long_signal','short_signal'];
+    returns the net return series indexed by date.
+    """
+    df = df.copy().dropna(subset=['next_return'])
+    prev_w = None
+    dates, net_rets = [], []
+
+    for date, grp in df.groupby('date'):
+        grp = grp.set_index('ticker')
+        n_long  = grp['long_signal'].sum()
+        n_short = grp['short_signal'].sum()
+        w_long  = grp['long_signal'] / n_long if n_long > 0 else grp['long_signal'] * 0
+        w_short = grp['short_signal'] / n_short if n_short > 0 else grp['short_signal'] * 0
+        w_net   = w_long + w_short
+        gross_ret = (grp['next_return'] * w_long).sum() + (grp['next_return'] * w_short).sum()
+
+        if prev_w is None:
+            turnover = w_net.abs().sum()
+        else:
+            all_idx    = prev_w.index.union(w_net.index)
+            w_prev     = prev_w.reindex(all_idx, fill_value=0)
+            w_current  = w_net.reindex(all_idx, fill_value=0)
+            turnover   = (w_current - w_prev).abs().sum()
+
+        cost = turnover * cost_rate
+        net_ret = (gross_ret - cost)/2
+
+        dates.append(date)
+        net_rets.append(net_ret)
+        prev_w = w_net
+
+    return pd.Series(net_rets, index=pd.to_datetime(dates)).sort_index()
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Panel Construction ---------------------------------
+# --------------------------------------------------------------------------------
+
+def to_panel(df, value_cols, date_col='date', ticker_col='ticker', dates=None, tickers=None):
+    """
+    Pivot long-format rows into dense [T, N] float64 matrices, one per value column.
+    Returns (dates, tickers, panels, mask):
+      - dates / tickers: sorted unique values (or the ones passed in; rows outside them are dropped).
+      - panels: {col: [T, N] array}, NaN where a (date, ticker) has no row.
+      - mask: [T, N] bool, True where the (date, ticker) has a row.
+    Where a (date, ticker) repeats, the last row wins.
+    """
+    dates = np.sort(df[date_col].unique()) if dates is None else np.asarray(dates)
+    tickers = np.sort(df[ticker_col].unique()) if tickers is None else np.asarray(tickers)
+    date_idx = pd.Index(dates).get_indexer(df[date_col])
+    ticker_idx = pd.Index(tickers).get_indexer(df[ticker_col])
+    keep = (date_idx >= 0) & (ticker_idx >= 0)
+    date_idx, ticker_idx = date_idx[keep], ticker_idx[keep]
+
+    shape = (len(dates), len(tickers))
+    mask = np.zeros(shape, dtype=bool)
+    mask[date_idx, ticker_idx] = True
+    panels = {}
+    for col in value_cols:
+        panel = np.full(shape, np.nan)
+        panel[date_idx, ticker_idx] = df[col].to_numpy(dtype=np.float64)[keep]
+        panels[col] = panel
+    return dates, tickers, panels, mask
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Vectorized Engine ----------------------------------
+# --------------------------------------------------------------------------------
+
+def equal_weights(signal):
+    """
+    Spread each date's book equally over its flagged tickers: signal / signal.sum() along
+    the ticker axis, 0 on dates with no flagged ticker.
+    """
+    n = signal.sum(axis=-1, keepdims=True)
+    return np.where(n > 0, signal / np.where(n > 0, n, 1), 0.0)
+
+def held_weights(weights, active):
+    """
+    Weights held coming into each date: those of the last active date before it (0 before the
+    first). weights is [..., T, N], active [..., T]; dates with no rows keep the book unchanged.
+    """
+    T = weights.shape[-2]
+    last_active = np.maximum.accumulate(np.where(active, np.arange(T), -1), axis=-1)
+    prev_active = np.concatenate([np.full(last_active.shape[:-1] + (1,), -1), last_active[..., :-1]], axis=-1)
+    padded = np.concatenate([np.zeros(weights.shape[:-2] + (1,) + weights.shape[-1:]), weights], axis=-2)
+    return np.take_along_axis(padded, (prev_active + 1)[..., None], axis=-2)
+
+def backtest_longshort_panel(next_return, long_signal, short_signal, mask=None, cost_rate=COST_RATE):
+    """
+    backtest_longshort for the whole panel at once. Inputs are [..., T, N] arrays (leading axes,
+    e.g. parameter configurations, broadcast against each other, so one [T, N] return matrix
+    serves a [K, T, N] stack of signals):
+      - next_return: next-day returns; NaN counts as no row (the loop drops those rows).
+      - long_signal / short_signal: 0/1 (or nonnegative) flags.
+      - mask: optional, True where the (date, ticker) row exists.
+    Per date, longs and shorts are each equally weighted (w_net = w_long + w_short, shorts are an
+    underweight book, not negative weights), turnover is the L1 change from the previous date's
+    book, and net = (gross - turnover * cost_rate) / 2.
+    Returns a dict of arrays: 'weights' [..., T, N], 'gross', 'turnover', 'cost', 'net' and
+    'active' [..., T]; 'net' is NaN on dates with no rows (the loop has no entry for them).
+    """
+    present = ~np.isnan(next_return)
+    if mask is not None:
+        present = present & mask
+    returns = np.where(present, next_return, 0.0)
+    w_long = equal_weights(np.where(present, long_signal, 0.0))
+    w_short = equal_weights(np.where(present, short_signal, 0.0))
+    weights = w_long + w_short
+    active = present.any(axis=-1)
+    active = np.broadcast_to(active, weights.shape[:-1])
+
+    gross = (returns * w_long).sum(axis=-1) + (returns * w_short).sum(axis=-1)
+    turnover = np.abs(weights - held_weights(weights, active)).sum(axis=-1)
+    cost = turnover * cost_rate
+    net = np.where(active, (gross - cost) / 2, np.nan)
+    return {'weights': weights, 'gross': gross, 'turnover': turnover, 'cost': cost, 'net': net,
+            'active': active}
+
+def backtest_longshort(df, cost_rate=COST_RATE):
+    """
+    Drop-in replacement for backtest_longshort in rulebased.ipynb: same input columns
+    ['date','ticker','next_return','long_signal','short_signal'] and the same net return
+    series (up to floating-point summation order), computed on the dense panel.
+    """
+    df = df.dropna(subset=['next_return'])
+    dates, _, panels, mask = to_panel(df, ['next_return', 'long_signal', 'short_signal'])
+    result = backtest_longshort_panel(panels['next_return'], panels['long_signal'],
+                                      panels['short_signal'], mask=mask, cost_rate=cost_rate)
+    return pd.Series(result['net'], index=pd.to_datetime(dates))
+
+# --------------------------------------------------------------------------------
+# ------------------------- 4. Performance Summary --------------------------------
+# --------------------------------------------------------------------------------
+
+def summarize_performance(ret_series):
+    """
+    summarize_performance from rulebased.ipynb: one-row DataFrame of annualized return (CAGR),
+    volatility, Sharpe, Sortino and max drawdown of a daily return series indexed by date.
+    """
+    cumulative = (1 + ret_series.fillna(0)).cumprod()
+    total_days = (ret_series.index[-1] - ret_series.index[0]).days
+    years = total_days / 365
+    cagr = cumulative.iloc[-1]**(1/years) - 1
+    vol = ret_series.std() * np.sqrt(TRADING_DAYS)
+    sharpe = ret_series.mean() / ret_series.std() * np.sqrt(TRADING_DAYS)
+    downside = ret_series[ret_series < 0].std() * np.sqrt(TRADING_DAYS)
+    sortino = ret_series.mean() / downside * np.sqrt(TRADING_DAYS) if downside > 0 else np.nan
+    running_max = cumulative.cummax()
+    drawdown = (cumulative - running_max) / running_max
+    max_dd = drawdown.min()
+
+    perf = pd.DataFrame({
+        'Annualized Return': [cagr],
+        'Volatility': [vol],
+        'Sharpe Ratio': [sharpe],
+        'Sortino Ratio': [sortino],
+        'Max Drawdown': [max_dd]
+    })
+    return perf
+
+# --------------------------------------------------------------------------------
+# ------------------------- 5. Golden Check & Benchmark ---------------------------
+# --------------------------------------------------------------------------------
+
+def synthetic_signals(T=1750, n_tickers=45, n_configs=1, missing=0.02, seed=0):
+    """
+    Random next returns ([T, N], NaN for missing rows) and quintile long/short flags
+    for n_configs random scores ([n_configs, T, N]).
+    """
+    rng = np.random.default_rng(seed)
+    next_return = rng.standard_normal((T, n_tickers)) * 0.02
+    next_return[rng.random((T, n_tickers)) < missing] = np.nan
+    next_return[T // 2] = np.nan   # a date with no rows at all
+    scores = rng.standard_normal((n_configs, T, n_tickers))
+    ranks = scores.argsort(axis=-1).argsort(axis=-1)
+    long_signal = (ranks >= n_tickers - n_tickers // 5).astype(np.float64)
+    short_signal = (ranks < n_tickers // 5).astype(np.float64)
+    return next_return, long_signal, short_signal
+
+def panel_to_frame(next_return, long_signal, short_signal, start='2018-01-01'):
+    """Long-format frame (the notebook's input) for one configuration of a synthetic panel."""
+    T, N = next_return.shape
+    dates = pd.bdate_range(start, periods=T)
+    frame = pd.DataFrame({
+        'date': np.repeat(dates, N),
+        'ticker': np.tile([f'T{i:03d}' for i in range(N)], T),
+        'next_return': next_return.reshape(-1),
+        'long_signal': long_signal.reshape(-1).astype(int),
+        'short_signal': short_signal.reshape(-1).astype(int),
+    })
+    # Shuffle rows: the loop must not depend on the input order either
+    return frame.sample(frac=1.0, random_state=0).reset_index(drop=True)
+
+def main():
+    """
+    Check backtest_longshort against the notebook loop on a synthetic panel, then time the loop,
+    the drop-in wrapper and a batch of configurations through backtest_longshort_panel.
+    Exits with status 1 if the net return series differ.
+    """
+    parser = argparse.ArgumentParser(
+        description="Golden check and timing for the vectorized long/short backtest engine."
+    )
+    parser.add_argument("--T", type=int, default=1750, help="Trading days of synthetic data.")
+    parser.add_argument("--n_tickers", type=int, default=45, help="Number of tickers.")
+    parser.add_argument("--configs", type=int, default=200, help="Signal configurations in the batched run.")
+    parser.add_argument("--cost_rate", type=float, default=COST_RATE, help="One-way transaction cost rate.")
+    args = parser.parse_args()
+
+    next_return, long_signal, short_signal = synthetic_signals(args.T, args.n_tickers, args.configs)
+    frame = panel_to_frame(next_return, long_signal[0], short_signal[0])
+
+    t0 = time.perf_counter()
+    ref = backtest_longshort_reference(frame, args.cost_rate)
+    t_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = backtest_longshort(frame, args.cost_rate)
+    t_new = time.perf_counter() - t0
+
+    new = new.dropna()
+    same = ref.index.equals(new.index) and np.allclose(ref.to_numpy(), new.to_numpy(), rtol=1e-12, atol=1e-15)
+    if not same:
+        print("[ERROR] backtest_longshort differs from the reference loop.")
+        raise SystemExit(1)
+    print(f"[INFO] Golden check passed: {len(ref)} daily net returns match the reference loop.")
+    print(f"[INFO] reference loop: {t_ref:.3f}s, panel (from long format): {t_new:.3f}s ({t_ref / t_new:.1f}x)")
+
+    t0 = time.perf_counter()
+    result = backtest_longshort_panel(next_return, long_signal, short_signal, cost_rate=args.cost_rate)
+    t_batch = time.perf_counter() - t0
+    if not np.allclose(result['net'][0][~np.isnan(result['net'][0])], ref.to_numpy(), rtol=1e-12, atol=1e-15):
+        print("[ERROR] Batched panel run differs from the reference loop for configuration 0.")
+        raise SystemExit(1)
+    print(f"[INFO] {args.configs} configurations in one panel call: {t_batch:.3f}s "
+          f"({args.configs / t_batch:,.0f} configs/s vs {1 / t_ref:.2f} configs/s for the loop)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/apps/anaconda3/bin/python
+# cross_section.py
+
+import time
+import argparse
+import functools
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Panel Primitives -----------------------------------
+# --------------------------------------------------------------------------------
+# Cross-sectional (per-date) operations on [..., T, N] matrices: dates on axis -2,
+# tickers on axis -1, NaN for missing values. Nothing loops over dates.
+
+def nan_mean_std(x, ddof=1):
+    """Per-date mean and std over the non-NaN tickers (keepdims), as pandas' mean() / std(ddof)."""
+    valid = ~np.isnan(x)
+    count = valid.sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(valid, x, 0.0).sum(axis=-1, keepdims=True) / count
+        dev = np.where(valid, x - mean, 0.0)
+        std = np.sqrt((dev * dev).sum(axis=-1, keepdims=True) / (count - ddof))
+    return mean, std
+
+def zscore(x, ddof=1):
+    """
+    (x - mean) / std across tickers on each date, skipping NaN: the matrix form of
+    groupby('date')[col].transform(lambda x: (x - x.mean()) / x.std()).
+    NaN stays NaN; a date with fewer than two values (or zero spread) gives NaN.
+    """
+    mean, std = nan_mean_std(x, ddof)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (x - mean) / std
+
+def rank_first(x):
+    """
+    Per-date 1-based ranks with ties broken by ticker (column) order, i.e. rank(method='first');
+    NaN where x is NaN. Returns float64.
+    """
+    valid = ~np.isnan(x)
+    order = np.argsort(np.where(valid, x, np.inf), axis=-1, kind='stable')
+    ranks = np.empty(x.shape, dtype=np.float64)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(1, x.shape[-1] + 1, dtype=np.float64), x.shape),
+                      axis=-1)
+    return np.where(valid, ranks, np.nan)
+
+@functools.lru_cache(maxsize=None)
+def qcut_label_table(n_max, q):
+    """
+    table[m, k-1] = pd.qcut(ranks 1..m, q, labels=False, duplicates='drop') for rank k, so
+    bucketing first-ranks is a lookup that reproduces qcut's dropped-edge (small m) labels
+    exactly; NaN where qcut gives none (m = 1). Built once per (n_max, q) in each process.
+    """
+    table = np.full((n_max + 1, max(n_max, 1)), np.nan)
+    for m in range(1, n_max + 1):
+        table[m, :m] = pd.qcut(pd.Series(np.arange(1, m + 1, dtype=np.float64)), q,
+                               labels=False, duplicates='drop').to_numpy(dtype=np.float64)
+    return table
+
+def qcut_labels(x, q=5):
+    """
+    Per-date quantile buckets 0..q-1 of x: the matrix form of
+    groupby('date')[col].transform(lambda x: pd.qcut(x.rank(method='first'), q, labels=False,
+    duplicates='drop')). NaN where x is NaN.
+    """
+    valid = ~np.isnan(x)
+    ranks = rank_first(x)
+    table = qcut_label_table(x.shape[-1], q)
+    labels = table[valid.sum(axis=-1, keepdims=True), np.where(valid, ranks - 1, 0).astype(np.intp)]
+    return np.where(valid, labels, np.nan)
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Long-Format Versions -------------------------------
+# --------------------------------------------------------------------------------
+# The same operations on long-format frames (one row per date and ticker), with pandas'
+# built-in groupby kernels instead of a Python lambda per group.
+
+def zscore_by_group(df, col, by='date'):
+    """Vectorized groupby(by)[col].transform(lambda x: (x - x.mean()) / x.std())."""
+    grouped = df.groupby(by)[col]
+    return (df[col] - grouped.transform('mean')) / grouped.transform('std')
+
+def qcut_by_group(df, col, q=5, by='date'):
+    """
+    Vectorized groupby(by)[col].transform(lambda x: pd.qcut(x.rank(method='first'), q,
+    labels=False, duplicates='drop')): first-ranks within each group (row order breaks ties,
+    as in the lambda), looked up in qcut_label_table by the group's non-NaN count.
+    """
+    grouped = df.groupby(by)[col]
+    ranks = grouped.rank(method='first').to_numpy()
+    counts = grouped.transform('count').to_numpy()
+    valid = ~np.isnan(ranks)
+    n_max = int(counts.max()) if len(counts) else 0
+    table = qcut_label_table(n_max, q)
+    labels = table[counts.astype(np.intp), np.where(valid, ranks - 1, 0).astype(np.intp)]
+    return pd.Series(np.where(valid, labels, np.nan), index=df.index, name=col)
+
+# Signed features of the notebook's alpha_score ('-' subtracts the z-score)
+ALPHA_FEATURES = ['RSI_14', 'GKVol', 'volume_to_MA20', 'vol5_vol20', 'MACD_signal']
+ALPHA_TERMS = ['volume_to_MA20', 'MACD_signal']
+
+def build_alpha_score(df, features=ALPHA_FEATURES, terms=ALPHA_TERMS, q=5):
+    """
+    Drop-in build_alpha_score from rulebased.ipynb without per-date lambdas: adds '<feature>_z'
+    for every feature, alpha_score as the sum of the signed terms, its per-date quintile 'rank',
+    and long_signal (top bucket) / short_signal (bottom bucket).
+    """
+    df = df.copy()
+    for col in features:
+        df[col + '_z'] = zscore_by_group(df, col)
+    df['alpha_score'] = 0.0
+    for term in terms:
+        sign, name = (-1.0, term[1:]) if term.startswith('-') else (1.0, term)
+        df['alpha_score'] = df['alpha_score'] + sign * df[name + '_z']
+
+    df['rank'] = qcut_by_group(df, 'alpha_score', q)
+    df['long_signal'] = (df['rank'] >= q - 1).astype(int)
+    df['short_signal'] = (df['rank'] <= 0).astype(int)
+    return df
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Golden Check & Benchmark ---------------------------
+# --------------------------------------------------------------------------------
+
+def build_alpha_score_reference(df, features=ALPHA_FEATURES, terms=ALPHA_TERMS, q=5):
+    """The notebook's per-date lambda version, kept to check build_alpha_score against."""
+    df = df.copy()
+    for col in features:
+        df[col + '_z'] = df.groupby('date')[col].transform(lambda x: (x - x.mean()) / x.std())
+    df['alpha_score'] = 0.0
+    for term in terms:
+        sign, name = (-1.0, term[1:]) if term.startswith('-') else (1.0, term)
+        df['alpha_score'] = df['alpha_score'] + sign * df[name + '_z']
+
+    df['rank'] = df.groupby('date')['alpha_score'].transform(
+        lambda x: pd.qcut(x.rank(method='first'), q=q, labels=False, duplicates='drop')
+    )
+    df['long_signal'] = (df['rank'] >= q - 1).astype(int)
+    df['short_signal'] = (df['rank'] <= 0).astype(int)
+    return df
+
+def synthetic_features(T=1750, n_tickers=45, missing=0.05, seed=0):
+    """
+    Long-format frame of random features (shuffled rows, NaN values, missing rows, a few
+    dates with only one to six tickers and heavily tied values), as build_alpha_score sees it.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2018-01-01', periods=T)
+    frame = pd.DataFrame({
+        'date': np.repeat(dates, n_tickers),
+        'ticker': np.tile([f'T{i:03d}' for i in range(n_tickers)], T),
+    })
+    for col in ALPHA_FEATURES:
+        values = rng.standard_normal(len(frame))
+        values[rng.random(len(frame)) < missing] = np.nan
+        frame[col] = values
+    frame['MACD_signal'] = np.round(frame['MACD_signal'] * 2) / 2     # ties
+    keep = rng.random(len(frame)) >= missing
+    for t, n_left in zip(range(5, 5 + 6 * 3, 3), range(1, 7)):       # tiny cross-sections
+        day = frame['date'] == dates[t]
+        keep &= ~day | (frame['ticker'] < f'T{n_left:03d}')
+    return frame[keep].sample(frac=1.0, random_state=0).reset_index(drop=True)
+
+def compare_frames(ref, new, cols):
+    """Names of cols that differ (z-scores to rounding, buckets and signals exactly)."""
+    bad = []
+    for col in cols:
+        a, b = ref[col].to_numpy(dtype=np.float64), new[col].to_numpy(dtype=np.float64)
+        same = np.allclose(a, b, rtol=1e-9, atol=1e-12, equal_nan=True) if col.endswith(('_z', 'score')) \
+            else np.array_equal(a, b, equal_nan=True)
+        if not same:
+            bad.append(col)
+    return bad
+
+def main():
+    """
+    Check the vectorized build_alpha_score and the [T, N] primitives against the notebook's
+    per-date lambdas on synthetic features, and time both. Exits with status 1 on a mismatch.
+    """
+    parser = argparse.ArgumentParser(
+        description="Golden check and timing for cross-sectional z-score / qcut bucketing."
+    )
+    parser.add_argument("--T", type=int, default=1750, help="Trading days of synthetic data.")
+    parser.add_argument("--n_tickers", type=int, default=45, help="Number of tickers.")
+    parser.add_argument("--q", type=int, default=5, help="Quantile buckets.")
+    args = parser.parse_args()
+
+    frame = synthetic_features(args.T, args.n_tickers)
+    print(f"[INFO] {len(frame)} rows, {frame['date'].nunique()} dates.")
+
+    t0 = time.perf_counter()
+    ref = build_alpha_score_reference(frame, q=args.q)
+    t_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = build_alpha_score(frame, q=args.q)
+    t_new = time.perf_counter() - t0
+    cols = [c + '_z' for c in ALPHA_FEATURES] + ['alpha_score', 'rank', 'long_signal', 'short_signal']
+    bad = compare_frames(ref, new, cols)
+    if bad:
+        print(f"[ERROR] build_alpha_score differs from the reference in: {', '.join(bad)}")
+        raise SystemExit(1)
+    print("[INFO] Golden check passed: long-format build_alpha_score matches the per-date lambdas.")
+    print(f"[INFO] reference: {t_ref:.3f}s, vectorized: {t_new:.3f}s ({t_ref / t_new:.1f}x)")
+
+    # Same result from the [T, N] matrices (ticker order breaks ties there, so rank a sorted frame)
+    dates = np.sort(frame['date'].unique())
+    tickers = np.sort(frame['ticker'].unique())
+    d_idx = pd.Index(dates).get_indexer(frame['date'])
+    t_idx = pd.Index(tickers).get_indexer(frame['ticker'])
+    t0 = time.perf_counter()
+    alpha = 0.0
+    for term in ALPHA_TERMS:
+        panel = np.full((len(dates), len(tickers)), np.nan)
+        panel[d_idx, t_idx] = frame[term].to_numpy()
+        alpha = alpha + zscore(panel)
+    labels = qcut_labels(alpha, args.q)
+    t_panel = time.perf_counter() - t0
+    ordered = build_alpha_score_reference(frame.sort_values(['date', 'ticker']), q=args.q)
+    ordered_labels = np.full((len(dates), len(tickers)), np.nan)
+    ordered_labels[pd.Index(dates).get_indexer(ordered['date']), pd.Index(tickers).get_indexer(ordered['ticker'])] = \
+        ordered['rank'].to_numpy(dtype=np.float64)
+    if not np.array_equal(labels, ordered_labels, equal_nan=True):
+        print("[ERROR] qcut_labels on the [T, N] matrix differs from the reference buckets.")
+        raise SystemExit(1)
+    print(f"[INFO] Golden check passed: [T, N] zscore/qcut_labels match ({t_panel:.3f}s from the matrices).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+#!/apps/anaconda3/bin/python
+# param_sweep.py
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from backtest_engine import (COST_RATE, to_panel, backtest_longshort_panel, backtest_longshort_reference,
+                             summarize_performance)
+from cross_section import zscore, qcut_labels
+
+# Technical features build_alpha_score can combine (a leading '-' in a config flips the sign)
+FEATURES = ['RSI_14', 'GKVol', 'volume_to_MA20', 'vol5_vol20', 'MACD_signal']
+
+# FF5 + momentum factors regressed on, as in ff5_return_decomposition
+FF_FACTORS = ['mktrf', 'smb', 'hml', 'rmw', 'cma', 'umd']
+
+SENTIMENT_MAP = {'Positive': 1, 'Negative': -1, 'Neutral': 0}
+
+# Defaults of run_combined_sentiment_tech / build_alpha_score; a grid overrides any of them
+DEFAULT_CONFIG = {
+    'features': ['volume_to_MA20', 'MACD_signal'],
+    'sentiment_weight': 1.0,
+    'direction': False,
+    'quantiles': 5,
+    'long_rank': None,      # None -> quantiles - 1 (top bucket)
+    'short_rank': 0,
+    'cost_rate': COST_RATE,
+}
+
+DEFAULT_GRID = {
+    'sentiment_weight': [0.0, 0.25, 0.5, 0.75, 1.0],
+    'direction': [False, True],
+    'quantiles': [5, 10],
+    'cost_rate': [0.0005, 0.001],
+    'features': [['volume_to_MA20', 'MACD_signal'],
+                 ['volume_to_MA20', 'MACD_signal', '-RSI_14'],
+                 ['volume_to_MA20', 'MACD_signal', '-RSI_14', '-GKVol', 'vol5_vol20']],
+}
+
+# Configurations per pool task (amortizes the inter-process round trip)
+CHUNK_SIZE = 8
+
+# --------------------------------------------------------------------------------
+# ------------------------- 1. Inputs ---------------------------------------------
+# --------------------------------------------------------------------------------
+
+def load_technical(path, tickers=None, start_date=None):
+    """
+    Technical table with the derived features of rulebased.ipynb (next_return, volume_to_MA20,
+    vol5_vol20), computed on the full history before the ticker/start_date cut.
+    """
+    df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    df = df.rename(columns={'adj_prc': 'close'})
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values(['ticker', 'date']).reset_index(drop=True)
+    by_ticker = df.groupby('ticker')
+    df['next_return'] = by_ticker['close'].shift(-1) / df['close'] - 1
+
+    if 'adjfactor' in df.columns:
+        df['volume'] *= df['adjfactor']
+    df['volume_MA20'] = by_ticker['volume'].transform(lambda x: x.rolling(20).mean())
+    df['volume_to_MA20'] = df['volume'] / df['volume_MA20'] - 1
+    # Window lengths as in the notebook (vol_5 is the 20-day std, vol_20 the 5-day one)
+    df['vol_5'] = by_ticker['return'].transform(lambda x: x.rolling(20).std())
+    df['vol_20'] = by_ticker['return'].transform(lambda x: x.rolling(5).std())
+    df['vol5_vol20'] = df['vol_5'] / df['vol_20']
+
+    if start_date is not None:
+        df = df[df['date'] >= start_date]
+    if tickers:
+        df = df[df['ticker'].isin(tickers)]
+    return df.reset_index(drop=True)
+
+def load_sentiment(folder):
+    """
+    Per-ticker sentiment Parquet files ({ticker}_*.parquet with date, sentiment, confidence)
+    stacked into one frame with a signed sentiment_signal = +-1 * confidence.
+    """
+    frames = []
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith('.parquet'):
+            df = pd.read_parquet(os.path.join(folder, filename))
+            df['ticker'] = filename.split('_')[0]
+            frames.append(df)
+    sentiment_df = pd.concat(frames, ignore_index=True)
+    sentiment_df['date'] = pd.to_datetime(sentiment_df['date'])
+    sentiment_df['sentiment_signal'] = sentiment_df['sentiment'].map(SENTIMENT_MAP) * sentiment_df['confidence']
+    return sentiment_df
+
+def load_ff_factors(path):
+    """Daily factor table with 'date', FF_FACTORS and 'rf'."""
+    ff_df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    ff_df['date'] = pd.to_datetime(ff_df['date'])
+    return ff_df
+
+# --------------------------------------------------------------------------------
+# ------------------------- 2. Shared Panel ---------------------------------------
+# --------------------------------------------------------------------------------
+
+def build_panel(tech_df, sentiment_df=None, ff_df=None):
+    """
+    Dense [T, N] arrays for the sweep: next_return, mask (rows of tech_df), one per FEATURES
+    column, sentiment_signal (if sentiment_df) and the [T, k+1] factor matrix (if ff_df).
+    """
+    feature_cols = [c for c in FEATURES if c in tech_df.columns]
+    dates, tickers, panels, mask = to_panel(tech_df, ['next_return'] + feature_cols)
+    panel = {'dates': dates, 'tickers': np.asarray(tickers, dtype=str), 'mask': mask}
+    panel.update(panels)
+    if sentiment_df is not None:
+        # Left merge semantics: only technical rows carry a sentiment value
+        panel['sentiment_signal'] = np.where(
+            mask, to_panel(sentiment_df, ['sentiment_signal'], dates=dates, tickers=tickers)[2]['sentiment_signal'],
+            np.nan)
+    if ff_df is not None:
+        ff = ff_df.drop_duplicates('date', keep='last').set_index('date').reindex(pd.DatetimeIndex(dates))
+        panel['ff'] = ff[FF_FACTORS + ['rf']].to_numpy(dtype=np.float64)
+    return panel
+
+def save_panel(panel, panel_dir):
+    """
+    Write the panel as one .npy per array (temp directory renamed into place), so workers can
+    memory-map it instead of receiving a pickled copy.
+    """
+    tmp_dir = panel_dir.rstrip(os.sep) + f'.tmp{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, arr in panel.items():
+        np.save(os.path.join(tmp_dir, name + '.npy'), np.asarray(arr))
+    shutil.rmtree(panel_dir, ignore_errors=True)
+    os.replace(tmp_dir, panel_dir)
+
+def panel_fingerprint(panel):
+    """
+    Content hash of a panel (every array's name, dtype, shape and bytes), so results computed on
+    other inputs (tickers, start_date, sentiment or FF factors present, edited files) are not reused.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(panel):
+        arr = np.ascontiguousarray(panel[name])
+        digest.update(json.dumps([name, arr.dtype.str, arr.shape]).encode('utf-8'))
+        digest.update(arr.tobytes())
+    return digest.hexdigest()
+
+def load_panel(panel_dir, mmap=True):
+    """Load a saved panel; numeric arrays are memory-mapped read-only if mmap."""
+    panel = {}
+    for filename in os.listdir(panel_dir):
+        if filename.endswith('.npy'):
+            name = filename[:-4]
+            panel[name] = np.load(os.path.join(panel_dir, filename),
+                                  mmap_mode='r' if mmap and name not in ('dates', 'tickers') else None)
+    return panel
+
+# --------------------------------------------------------------------------------
+# ------------------------- 3. Configurations -------------------------------------
+# --------------------------------------------------------------------------------
+
+def normalize_config(config):
+    """Fill DEFAULT_CONFIG values and resolve long_rank, so equal configs hash equally."""
+    full = dict(DEFAULT_CONFIG)
+    full.update(config)
+    unknown = set(full) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown config keys: {sorted(unknown)}")
+    full['features'] = list(full['features'])
+    full['sentiment_weight'] = float(full['sentiment_weight'])
+    full['direction'] = bool(full['direction'])
+    full['quantiles'] = int(full['quantiles'])
+    full['long_rank'] = full['quantiles'] - 1 if full['long_rank'] is None else int(full['long_rank'])
+    full['short_rank'] = int(full['short_rank'])
+    full['cost_rate'] = float(full['cost_rate'])
+    return full
+
+def expand_grid(grid):
+    """Cartesian product of a {key: [values]} grid, as normalized configs (duplicates dropped)."""
+    keys = sorted(grid)
+    configs = {}
+    for values in itertools.product(*(grid[k] for k in keys)):
+        config = normalize_config(dict(zip(keys, values)))
+        configs.setdefault(config_hash(config), config)
+    return list(configs.values())
+
+def config_hash(config):
+    """Stable key of a normalized config, used to resume a sweep."""
+    return hashlib.blake2b(json.dumps(config, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest()
+
+# --------------------------------------------------------------------------------
+# ------------------------- 4. Signals & Evaluation -------------------------------
+# --------------------------------------------------------------------------------
+
+def alpha_score(panel, features):
+    """build_alpha_score: sum of the per-date z-scores of the features ('-name' subtracts)."""
+    score = 0.0
+    for feature in features:
+        sign, name = (-1.0, feature[1:]) if feature.startswith('-') else (1.0, feature)
+        score = score + sign * zscore(np.where(panel['mask'], panel[name], np.nan))
+    return score
+
+def config_signals(panel, config):
+    """
+    Long/short flags and row mask for one config, following run_combined_sentiment_tech
+    (or build_alpha_score alone when the panel has no sentiment):
+      - alpha and sentiment z-scored per date, optional same-direction filter,
+      - combined = (1 - w) * alpha + w * sentiment, bucketed per date into `quantiles`,
+      - long where bucket >= long_rank, short where bucket <= short_rank.
+    """
+    mask = np.asarray(panel['mask'])
+    alpha = alpha_score(panel, config['features'])
+    if 'sentiment_signal' in panel:
+        sentiment = zscore(np.asarray(panel['sentiment_signal']))
+        alpha = zscore(alpha)
+        if config['direction']:
+            with np.errstate(invalid='ignore'):
+                mask = mask & (alpha * sentiment > 0)
+        weight = config['sentiment_weight']
+        combined = (1 - weight) * alpha + weight * sentiment
+    else:
+        combined = alpha
+    labels = qcut_labels(np.where(mask, combined, np.nan), config['quantiles'])
+    with np.errstate(invalid='ignore'):
+        long_signal = (labels >= config['long_rank']).astype(np.float64)
+        short_signal = (labels <= config['short_rank']).astype(np.float64)
+    return long_signal, short_signal, mask
+
+def ff_loadings(net, ff):
+    """
+    OLS of the excess daily return (net - rf) on a constant and FF_FACTORS over the dates where
+    both exist; the coefficients of ff5_return_decomposition, via lstsq.
+    """
+    y = net - ff[:, -1]
+    X = np.column_stack([np.ones(len(ff)), ff[:, :-1]])
+    ok = np.isfinite(y) & np.isfinite(X).all(axis=1)
+    out = {'ff_nobs': int(ok.sum())}
+    names = ['ff_const'] + ['ff_' + f for f in FF_FACTORS]
+    if ok.sum() <= X.shape[1]:
+        out.update({name: np.nan for name in names + ['ff_r2']})
+        return out
+    coef = np.linalg.lstsq(X[ok], y[ok], rcond=None)[0]
+    resid = y[ok] - X[ok] @ coef
+    out.update(dict(zip(names, coef.tolist())))
+    out['ff_r2'] = float(1 - resid @ resid / ((y[ok] - y[ok].mean()) ** 2).sum())
+    return out
+
+def evaluate_config(panel, config):
+    """
+    Backtest one config on the panel. Returns the summarize_performance metrics, the mean
+    turnover, and FF loadings if the panel has factors.
+    """
+    long_signal, short_signal, mask = config_signals(panel, config)
+    result = backtest_longshort_panel(np.asarray(panel['next_return']), long_signal, short_signal,
+                                      mask=mask, cost_rate=config['cost_rate'])
+    active = result['active']
+    net = pd.Series(result['net'][active], index=pd.to_datetime(panel['dates'][active]))
+    metrics = summarize_performance(net).iloc[0].to_dict()
+    metrics = {k: float(v) for k, v in metrics.items()}
+    metrics['Mean Turnover'] = float(result['turnover'][active].mean())
+    metrics['Days'] = int(active.sum())
+    if 'ff' in panel:
+        metrics.update(ff_loadings(result['net'], np.asarray(panel['ff'])))
+    return metrics
+
+# --------------------------------------------------------------------------------
+# ------------------------- 5. Process Pool & Resume ------------------------------
+# --------------------------------------------------------------------------------
+
+# Panel of the worker process, memory-mapped once by init_worker
+WORKER_PANEL = None
+
+def init_worker(panel_dir):
+    global WORKER_PANEL
+    WORKER_PANEL = load_panel(panel_dir, mmap=True)
+
+def run_configs(configs, panel=None):
+    """Evaluate a chunk of configs (in a worker, on WORKER_PANEL). Failures are reported, not raised."""
+    panel = WORKER_PANEL if panel is None else panel
+    records = []
+    for config in configs:
+        t0 = time.perf_counter()
+        record = {'config_hash': config_hash(config), 'config': config}
+        try:
+            record['metrics'] = evaluate_config(panel, config)
+        except Exception as e:
+            record['error'] = repr(e)
+        record['seconds'] = round(time.perf_counter() - t0, 4)
+        records.append(record)
+    return records
+
+def results_fingerprint(results_path):
+    """The panel fingerprint in the header line of a results JSONL file (None if absent)."""
+    with open(results_path) as f:
+        try:
+            header = json.loads(f.readline())
+        except json.JSONDecodeError:
+            return None
+    return header.get('panel_fingerprint') if isinstance(header, dict) else None
+
+def load_results(results_path):
+    """{config_hash: record} of a results JSONL file; a torn last line (interrupted run) is ignored."""
+    results = {}
+    if not os.path.isfile(results_path):
+        return results
+    with open(results_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'metrics' in record:
+                results[record['config_hash']] = record
+    return results
+
+def run_sweep(configs, panel_dir, results_path, workers=1, chunk_size=CHUNK_SIZE, fingerprint=None):
+    """
+    Evaluate every config not already in results_path, appending one JSON line per config as it
+    finishes (in this parent process), so an interrupted sweep resumes where it stopped.
+    Failed configs are not recorded and run again next time.
+    The file's header line records the panel fingerprint (default: that of the panel in
+    panel_dir); a results file from another panel is moved aside and the sweep starts afresh.
+    """
+    if fingerprint is None:
+        fingerprint = panel_fingerprint(load_panel(panel_dir, mmap=True))
+    if os.path.isfile(results_path) and results_fingerprint(results_path) != fingerprint:
+        old_path = results_path[:-len('.jsonl')] + f".{results_fingerprint(results_path) or 'unknown'}.jsonl"
+        os.replace(results_path, old_path)
+        print(f"[WARN] {results_path} was computed on other inputs; moved to {old_path}, starting afresh.")
+    if not os.path.isfile(results_path):
+        with open(results_path, 'w') as f:
+            f.write(json.dumps({'panel_fingerprint': fingerprint}) + '\n')
+    done = load_results(results_path)
+    todo = [c for c in configs if config_hash(c) not in done]
+    print(f"[INFO] {len(configs)} configs: {len(configs) - len(todo)} already done, {len(todo)} to run.")
+    if not todo:
+        return
+
+    n_ok = n_failed = 0
+    t0 = time.perf_counter()
+    # An interrupted write can leave a torn last line; start the new records on a fresh line
+    torn = os.path.isfile(results_path) and os.path.getsize(results_path) > 0
+    if torn:
+        with open(results_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b'\n'
+    with open(results_path, 'a') as out:
+        if torn:
+            out.write('\n')
+        def record_results(records):
+            nonlocal n_ok, n_failed
+            for record in records:
+                if 'error' in record:
+                    n_failed += 1
+                    print(f"[WARN] Config {record['config_hash']} failed: {record['error']}")
+                    continue
+                n_ok += 1
+                out.write(json.dumps(record) + '\n')
+            out.flush()
+
+        chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+        if workers <= 1:
+            panel = load_panel(panel_dir, mmap=True)
+            for chunk in chunks:
+                record_results(run_configs(chunk, panel))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(panel_dir,)) as pool:
+                futures = [pool.submit(run_configs, chunk) for chunk in chunks]
+                for future in as_completed(futures):
+                    record_results(future.result())
+    wall = time.perf_counter() - t0
+    print(f"[INFO] {n_ok} ok, {n_failed} failed in {wall:.1f}s ({n_ok / wall:,.1f} configs/s).")
+
+def results_table(configs, results_path):
+    """One row per config (in grid order): config columns, then metrics and FF loadings."""
+    done = load_results(results_path)
+    rows = []
+    for config in configs:
+        record = done.get(config_hash(config))
+        if record is None:
+            continue
+        row = {'config_hash': record['config_hash']}
+        row.update({k: (','.join(v) if k == 'features' else v) for k, v in record['config'].items()})
+        row.update(record['metrics'])
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+# --------------------------------------------------------------------------------
+# ------------------------- 6. Reference Check ------------------------------------
+# --------------------------------------------------------------------------------
+
+def run_config_reference(tech_df, sentiment_df, config):
+    """
+    One config through the notebook's pandas code (build_alpha_score, run_combined_sentiment_tech
+    without the plots, backtest_longshort); the net return series, to check evaluate_config against.
+    """
+    df = tech_df.copy()
+    df['alpha_score'] = 0.0
+    for feature in config['features']:
+        sign, name = (-1.0, feature[1:]) if feature.startswith('-') else (1.0, feature)
+        df[name + '_z'] = df.groupby('date')[name].transform(lambda x: (x - x.mean()) / x.std())
+        df['alpha_score'] = df['alpha_score'] + sign * df[name + '_z']
+
+    if sentiment_df is None:
+        merged = df.sort_values(['ticker', 'date'])
+        merged['combined_score'] = merged['alpha_score']
+    else:
+        merged = pd.merge(df, sentiment_df[['date', 'ticker', 'sentiment_signal']], on=['date', 'ticker'], how='left')
+        merged = merged.sort_values(['ticker', 'date'])
+        merged['sentiment_signal'] = merged.groupby('date')['sentiment_signal'].transform(lambda x: (x - x.mean()) / x.std())
+        merged['alpha_score'] = merged.groupby('date')['alpha_score'].transform(lambda x: (x - x.mean()) / x.std())
+        if config['direction']:
+            merged['direction'] = (merged['alpha_score'] * merged['sentiment_signal']) > 0
+        else:
+            merged['direction'] = 1
+        merged = merged[merged['direction'] == 1]
+        weight = config['sentiment_weight']
+        merged['combined_score'] = (1 - weight) * merged['alpha_score'] + weight * merged['sentiment_signal']
+
+    merged['rank'] = merged.groupby('date')['combined_score'].transform(
+        lambda x: pd.qcut(x.rank(method='first'), q=config['quantiles'], labels=False, duplicates='drop')
+        if x.notna().any() else x
+    )
+    merged['long_signal'] = (merged['rank'] >= config['long_rank']).astype(int)
+    merged['short_signal'] = (merged['rank'] <= config['short_rank']).astype(int)
+    return backtest_longshort_reference(merged, config['cost_rate'])
+
+def check_configs(tech_df, sentiment_df, panel, configs):
+    """Number of configs whose panel net returns differ from run_config_reference."""
+    mismatches = 0
+    for config in configs:
+        ref = run_config_reference(tech_df, sentiment_df, config)
+        long_signal, short_signal, mask = config_signals(panel, config)
+        result = backtest_longshort_panel(panel['next_return'], long_signal, short_signal,
+                                          mask=mask, cost_rate=config['cost_rate'])
+        net = result['net'][result['active']]
+        if len(net) != len(ref) or not np.allclose(net, ref.to_numpy(), rtol=1e-9, atol=1e-12):
+            print(f"[WARN] Config {config_hash(config)} differs from the reference: {config}")
+            mismatches += 1
+    return mismatches
+
+def main():
+    """
+    Sweep a parameter grid of the rule-based long/short strategy over a process pool, resuming
+    from the results file, and write one table of performance metrics and FF loadings.
+    """
+    parser = argparse.ArgumentParser(
+        description="Parallel, resumable parameter sweep of the rule-based long/short strategy."
+    )
+    parser.add_argument("--technical", required=True,
+                        help="Technical table (.csv or .parquet), e.g. technical_data_cleaned_0321.csv.")
+    parser.add_argument("--sentiment_folder", default=None,
+                        help="Folder of per-ticker sentiment Parquet files (omit for the technical-only alpha).")
+    parser.add_argument("--ff_factors", default=None,
+                        help="Daily factor table (.csv or .parquet) with date, mktrf, smb, hml, rmw, cma, umd, rf.")
+    parser.add_argument("--grid", default=None,
+                        help="JSON file {param: [values]} over DEFAULT_CONFIG keys (default: DEFAULT_GRID).")
+    parser.add_argument("--tickers", nargs="*", default=None, help="Ticker universe (default: all).")
+    parser.add_argument("--start_date", default="2018-01-01", help="First signal date (YYYY-MM-DD).")
+    parser.add_argument("--output_dir", default="sweep", help="Directory for the panel, results and table.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes.")
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE, help="Configs per pool task.")
+    parser.add_argument("--check", type=int, default=0,
+                        help="Check the first N configs against the notebook's pandas code before sweeping.")
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    tech_df = load_technical(args.technical, args.tickers, args.start_date)
+    sentiment_df = load_sentiment(args.sentiment_folder) if args.sentiment_folder else None
+    ff_df = load_ff_factors(args.ff_factors) if args.ff_factors else None
+    if sentiment_df is None and ('sentiment_weight' in grid or 'direction' in grid):
+        print("[WARN] No --sentiment_folder: sentiment_weight and direction have no effect.")
+        grid = {k: v for k, v in grid.items() if k not in ('sentiment_weight', 'direction')}
+    configs = expand_grid(grid)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    panel_dir = os.path.join(args.output_dir, 'panel')
+    panel = build_panel(tech_df, sentiment_df, ff_df)
+    save_panel(panel, panel_dir)
+    fingerprint = panel_fingerprint(panel)
+    print(f"[INFO] Panel: {len(panel['dates'])} dates x {len(panel['tickers'])} tickers -> {panel_dir} "
+          f"(fingerprint {fingerprint})")
+
+    if args.check:
+        mismatches = check_configs(tech_df, sentiment_df, panel, configs[:args.check])
+        if mismatches:
+            print(f"[ERROR] {mismatches} of {min(args.check, len(configs))} configs differ from the reference.")
+            raise SystemExit(1)
+        print(f"[INFO] Reference check passed for {min(args.check, len(configs))} configs.")
+    del panel
+
+    results_path = os.path.join(args.output_dir, 'results.jsonl')
+    run_sweep(configs, panel_dir, results_path, workers=args.workers, chunk_size=args.chunk_size,
+              fingerprint=fingerprint)
+
+    table = results_table(configs, results_path)
+    table_path = os.path.join(args.output_dir, 'results.csv')
+    table.to_csv(table_path, index=False)
+    print(f"[INFO] Wrote {len(table)} rows to {table_path}")
+    if len(table):
+        print(table.sort_values('Sharpe Ratio', ascending=False).head(10).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
+
+
+
+#### python param_sweep.py \
+#    --technical technical_data_cleaned_0321.csv \
+#    --sentiment_folder sentiments_from_sum_masked \
+#    --ff_factors ff_factors_daily.csv \
+#    --grid grid.json --workers 8 --check 3
+#    (rerun the same command to resume an interrupted sweep; changed inputs start a fresh results file)